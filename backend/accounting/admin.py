@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChartOfAccounts, JournalEntry, Transaction
+from .models import ChartOfAccounts, JournalEntry, Transaction, AccountPeriodBalance, FiscalYear
 
 @admin.register(ChartOfAccounts)
 class ChartOfAccountsAdmin(admin.ModelAdmin):
@@ -25,3 +25,17 @@ class TransactionAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+@admin.register(AccountPeriodBalance)
+class AccountPeriodBalanceAdmin(admin.ModelAdmin):
+    list_display = ('id', '__str__', 'debit', 'credit', 'updated_at')
+    list_filter = ('period', 'updated_at')
+    search_fields = ('account__code', 'account__name')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(FiscalYear)
+class FiscalYearAdmin(admin.ModelAdmin):
+    list_display = ('id', '__str__', 'status', 'closed_at', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('closed_at', 'created_at', 'updated_at')
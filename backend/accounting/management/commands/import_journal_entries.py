@@ -0,0 +1,51 @@
+"""
+Management command to bulk import journal entries from a CSV or JSON lines file
+"""
+from django.core.management.base import BaseCommand
+from companies.models import Company
+from accounts.models import User
+from accounting.services import import_journal_entries, parse_journal_entry_csv, parse_journal_entry_jsonl
+
+
+class Command(BaseCommand):
+    help = 'Bulk import journal entries from a CSV or JSON lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON lines file to import')
+        parser.add_argument('--company-id', type=int, help='Company ID to import journal entries for')
+        parser.add_argument('--user-id', type=int, help='User recorded as the creator of the entries')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from file extension)')
+        parser.add_argument('--allow-partial', action='store_true', help='Save valid entries even if others fail')
+
+    def handle(self, *args, **options):
+        company_id = options.get('company_id')
+        if not company_id:
+            self.stdout.write(self.style.ERROR('Please provide --company-id'))
+            return
+
+        try:
+            company = Company.objects.get(id=company_id)
+        except Company.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f'Company with ID {company_id} does not exist'))
+            return
+
+        user = None
+        if options.get('user_id'):
+            user = User.objects.filter(id=options['user_id']).first()
+
+        path = options['path']
+        input_format = options.get('format') or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        with open(path, encoding='utf-8', newline='') as f:
+            if input_format == 'csv':
+                entries = parse_journal_entry_csv(f)
+            else:
+                entries = parse_journal_entry_jsonl(f)
+
+        created, errors = import_journal_entries(
+            company, entries, user=user, allow_partial=options['allow_partial']
+        )
+        for error in errors:
+            self.stdout.write(self.style.WARNING(
+                f"Entry {error['index']} ({error['entry_number']}): {'; '.join(error['errors'])}"
+            ))
+        self.stdout.write(self.style.SUCCESS(f'Imported {created} journal entries'))
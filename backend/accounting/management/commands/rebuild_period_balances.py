@@ -0,0 +1,29 @@
+"""
+Management command to rebuild the per-account, per-month balance store
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from companies.models import Company
+from accounting.services import rebuild_period_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild account period balances from posted journal entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, help='Only rebuild balances for this company')
+
+    def handle(self, *args, **options):
+        company_id = options.get('company_id')
+
+        companies = Company.objects.all()
+        if company_id:
+            companies = companies.filter(id=company_id)
+            if not companies.exists():
+                self.stdout.write(self.style.ERROR(f'Company with ID {company_id} does not exist'))
+                return
+
+        for company in companies:
+            with transaction.atomic():
+                count = rebuild_period_balances(company)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} period balances for {company.name}'))
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_period_balances(apps, schema_editor):
+    """
+    Build period balances for journal entries posted before the table existed
+    """
+    Transaction = apps.get_model('accounting', 'Transaction')
+    AccountPeriodBalance = apps.get_model('accounting', 'AccountPeriodBalance')
+
+    rows = Transaction.objects.filter(
+        journal_entry__status='posted',
+    ).order_by().annotate(
+        period=TruncMonth('journal_entry__date'),
+    ).values('journal_entry__company_id', 'account_id', 'period').annotate(
+        total_debit=Sum('debit'),
+        total_credit=Sum('credit'),
+    )
+    AccountPeriodBalance.objects.bulk_create([
+        AccountPeriodBalance(
+            company_id=row['journal_entry__company_id'],
+            account_id=row['account_id'],
+            period=row['period'],
+            debit=row['total_debit'] or 0,
+            credit=row['total_credit'] or 0,
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0001_initial'),
+        ('companies', '0003_create_memberships_for_existing_companies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountPeriodBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='دوره')),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='بدهکار')),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='بستانکار')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_balances', to='accounting.chartofaccounts', verbose_name='حساب')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='account_period_balances', to='companies.company', verbose_name='شرکت')),
+            ],
+            options={
+                'verbose_name': 'مانده دوره حساب',
+                'verbose_name_plural': 'مانده\u200cهای دوره حساب\u200cها',
+                'ordering': ['period'],
+                'unique_together': {('company', 'account', 'period')},
+            },
+        ),
+        migrations.RunPython(populate_period_balances, migrations.RunPython.noop),
+    ]
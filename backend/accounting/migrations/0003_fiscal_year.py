@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0002_accountperiodbalance'),
+        ('companies', '0003_create_memberships_for_existing_companies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalentry',
+            name='entry_type',
+            field=models.CharField(choices=[('regular', 'عادی'), ('closing', 'بستن حساب\u200cها'), ('opening', 'افتتاحیه')], default='regular', max_length=20, verbose_name='نوع سند'),
+        ),
+        migrations.CreateModel(
+            name='FiscalYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, verbose_name='عنوان')),
+                ('start_date', models.DateField(verbose_name='تاریخ شروع')),
+                ('end_date', models.DateField(verbose_name='تاریخ پایان')),
+                ('status', models.CharField(choices=[('open', 'باز'), ('closed', 'بسته شده')], default='open', max_length=20, verbose_name='وضعیت')),
+                ('closed_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ بستن')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='بسته شده توسط')),
+                ('closing_entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounting.journalentry', verbose_name='سند بستن حساب\u200cها')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fiscal_years', to='companies.company', verbose_name='شرکت')),
+                ('opening_entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounting.journalentry', verbose_name='سند افتتاحیه')),
+            ],
+            options={
+                'verbose_name': 'سال مالی',
+                'verbose_name_plural': 'سال\u200cهای مالی',
+                'ordering': ['-start_date'],
+                'unique_together': {('company', 'name')},
+            },
+        ),
+    ]
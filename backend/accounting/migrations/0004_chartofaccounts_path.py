@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    """
+    Build materialized paths for existing accounts, parents first
+    """
+    ChartOfAccounts = apps.get_model('accounting', 'ChartOfAccounts')
+
+    accounts = {account.id: account for account in ChartOfAccounts.objects.only('id', 'parent_id')}
+    paths = {}
+
+    def path_of(account_id, seen=()):
+        if account_id not in paths:
+            parent_id = accounts[account_id].parent_id
+            if parent_id in accounts and parent_id not in seen:
+                parent_path = path_of(parent_id, seen + (account_id,))
+            else:
+                parent_path = '/'
+            paths[account_id] = f"{parent_path}{account_id}/"
+        return paths[account_id]
+
+    for account in accounts.values():
+        account.path = path_of(account.id)
+    ChartOfAccounts.objects.bulk_update(accounts.values(), ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0003_fiscal_year'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chartofaccounts',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255, verbose_name='مسیر'),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
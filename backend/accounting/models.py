@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Replace
 from django.conf import settings
 from companies.models import Company
+from companies.sequences import NumberedDocumentMixin
 
 
 class ChartOfAccounts(models.Model):
@@ -17,6 +20,8 @@ class ChartOfAccounts(models.Model):
     name = models.CharField(max_length=255, verbose_name='نام حساب')
     account_type = models.CharField(max_length=20, choices=ACCOUNT_TYPE_CHOICES, verbose_name='نوع حساب')
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='children', verbose_name='حساب والد')
+    # Materialized path of ancestor ids, e.g. "/1/5/12/" for account 12 under 5 under 1
+    path = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False, verbose_name='مسیر')
     is_active = models.BooleanField(default=True, verbose_name='فعال')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
@@ -30,20 +35,62 @@ class ChartOfAccounts(models.Model):
     def __str__(self):
         return f"{self.code} - {self.name}"
 
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        old_path = self.path
+        super().save(*args, **kwargs)
 
-class JournalEntry(models.Model):
+        # Keep the path of this account and of its whole subtree in sync
+        parent_path = self.parent.path if self.parent_id else '/'
+        new_path = f"{parent_path}{self.pk}/"
+        if new_path != old_path:
+            ChartOfAccounts.objects.filter(pk=self.pk).update(path=new_path)
+            if old_path:
+                ChartOfAccounts.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Replace('path', Value(old_path), Value(new_path))
+                )
+            self.path = new_path
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        # Children become root accounts (parent is SET_NULL), so drop this
+        # account's prefix from every path in its subtree
+        if self.path:
+            ChartOfAccounts.objects.filter(path__startswith=self.path).exclude(pk=self.pk).update(
+                path=Replace('path', Value(self.path), Value('/'))
+            )
+        return super().delete(*args, **kwargs)
+
+    def get_descendants(self, include_self=False):
+        descendants = ChartOfAccounts.objects.filter(company_id=self.company_id, path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+
+class JournalEntry(NumberedDocumentMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'پیش‌نویس'),
         ('posted', 'ثبت شده'),
         ('cancelled', 'لغو شده'),
     ]
 
+    ENTRY_TYPE_CHOICES = [
+        ('regular', 'عادی'),
+        ('closing', 'بستن حساب‌ها'),
+        ('opening', 'افتتاحیه'),
+    ]
+
+    document_type = 'journal_entry'
+    number_field = 'entry_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='journal_entries', verbose_name='شرکت')
-    entry_number = models.CharField(max_length=100, verbose_name='شماره سند')
+    entry_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره سند')
     date = models.DateField(verbose_name='تاریخ')
     description = models.TextField(verbose_name='شرح')
     reference = models.CharField(max_length=255, blank=True, null=True, verbose_name='مرجع')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name='وضعیت')
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES, default='regular', verbose_name='نوع سند')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, verbose_name='ایجاد شده توسط')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
@@ -73,3 +120,50 @@ class Transaction(models.Model):
 
     def __str__(self):
         return f"{self.account.name} - بدهکار: {self.debit} - بستانکار: {self.credit}"
+
+
+class AccountPeriodBalance(models.Model):
+    """Posted debit/credit totals of an account for one calendar month"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='account_period_balances', verbose_name='شرکت')
+    account = models.ForeignKey(ChartOfAccounts, on_delete=models.CASCADE, related_name='period_balances', verbose_name='حساب')
+    period = models.DateField(verbose_name='دوره')
+    debit = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name='بدهکار')
+    credit = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name='بستانکار')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+
+    class Meta:
+        verbose_name = 'مانده دوره حساب'
+        verbose_name_plural = 'مانده‌های دوره حساب‌ها'
+        ordering = ['period']
+        unique_together = [('company', 'account', 'period')]
+
+    def __str__(self):
+        return f"{self.account} - {self.period:%Y-%m}"
+
+
+class FiscalYear(models.Model):
+    STATUS_CHOICES = [
+        ('open', 'باز'),
+        ('closed', 'بسته شده'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='fiscal_years', verbose_name='شرکت')
+    name = models.CharField(max_length=50, verbose_name='عنوان')
+    start_date = models.DateField(verbose_name='تاریخ شروع')
+    end_date = models.DateField(verbose_name='تاریخ پایان')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open', verbose_name='وضعیت')
+    closing_entry = models.ForeignKey(JournalEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='سند بستن حساب‌ها')
+    opening_entry = models.ForeignKey(JournalEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='سند افتتاحیه')
+    closed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='بسته شده توسط')
+    closed_at = models.DateTimeField(blank=True, null=True, verbose_name='تاریخ بستن')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+
+    class Meta:
+        verbose_name = 'سال مالی'
+        verbose_name_plural = 'سال‌های مالی'
+        ordering = ['-start_date']
+        unique_together = [('company', 'name')]
+
+    def __str__(self):
+        return f"{self.name} ({self.start_date} - {self.end_date})"
@@ -1,11 +1,24 @@
 from rest_framework import serializers
-from .models import ChartOfAccounts, JournalEntry, Transaction
+from django.db import transaction
+from .models import ChartOfAccounts, JournalEntry, Transaction, FiscalYear
+from .services import post_entry_balances, unpost_entry_balances, get_locked_until
 
 class ChartOfAccountsSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChartOfAccounts
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'company')
+        read_only_fields = ('created_at', 'updated_at', 'company', 'path')
+
+    def validate_parent(self, parent):
+        if parent is None:
+            return parent
+
+        company = self.instance.company if self.instance else self.context['request'].user.active_company
+        if not company or parent.company_id != company.id:
+            raise serializers.ValidationError("Parent account does not belong to your company")
+        if self.instance and parent.path.startswith(self.instance.path):
+            raise serializers.ValidationError("An account cannot be moved under itself or its descendants")
+        return parent
 
 
 class TransactionSerializer(serializers.ModelSerializer):
@@ -20,8 +33,8 @@ class JournalEntrySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = JournalEntry
-        fields = ['id', 'entry_number', 'date', 'description', 'reference', 'status', 'transactions', 'created_at', 'updated_at']
-        read_only_fields = ('created_at', 'updated_at', 'company', 'created_by')
+        fields = ['id', 'entry_number', 'date', 'description', 'reference', 'status', 'entry_type', 'transactions', 'created_at', 'updated_at']
+        read_only_fields = ('created_at', 'updated_at', 'company', 'created_by', 'entry_type')
 
     def validate(self, data):
         transactions_data = data.get('transactions', [])
@@ -30,18 +43,42 @@ class JournalEntrySerializer(serializers.ModelSerializer):
 
         if total_debit != total_credit:
             raise serializers.ValidationError(f"Journal entry must be balanced. Total Debit: {total_debit}, Total Credit: {total_credit}")
+
+        if self.instance:
+            if self.instance.entry_type != 'regular':
+                raise serializers.ValidationError("Closing and opening entries cannot be edited")
+            company = self.instance.company
+        else:
+            company = self.context['request'].user.active_company
+
+        locked_until = get_locked_until(company) if company else None
+        if locked_until:
+            dates = [data.get('date'), self.instance.date if self.instance else None]
+            if any(date and date <= locked_until for date in dates):
+                raise serializers.ValidationError(f"Fiscal period is closed up to {locked_until}")
         
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         transactions_data = validated_data.pop('transactions')
         journal_entry = JournalEntry.objects.create(**validated_data)
-        for transaction_data in transactions_data:
-            Transaction.objects.create(journal_entry=journal_entry, **transaction_data)
+        Transaction.objects.bulk_create([
+            Transaction(journal_entry=journal_entry, **transaction_data)
+            for transaction_data in transactions_data
+        ])
+        if journal_entry.status == 'posted':
+            post_entry_balances(journal_entry)
         return journal_entry
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         transactions_data = validated_data.pop('transactions', None)
+
+        # Take the entry out of the period balances with its old date and
+        # transactions, and add it back below if it is still posted
+        if instance.status == 'posted':
+            unpost_entry_balances(instance)
         
         # Update JournalEntry fields
         for attr, value in validated_data.items():
@@ -52,9 +89,37 @@ class JournalEntrySerializer(serializers.ModelSerializer):
             # For simplicity, we'll remove existing transactions and re-create them
             # In a more complex scenario, we might want to update existing ones
             instance.transactions.all().delete()
-            for transaction_data in transactions_data:
-                Transaction.objects.create(journal_entry=instance, **transaction_data)
+            Transaction.objects.bulk_create([
+                Transaction(journal_entry=instance, **transaction_data)
+                for transaction_data in transactions_data
+            ])
+
+        if instance.status == 'posted':
+            post_entry_balances(instance)
         
         return instance
 
 
+class FiscalYearSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FiscalYear
+        fields = '__all__'
+        read_only_fields = ('company', 'status', 'closing_entry', 'opening_entry', 'closed_by', 'closed_at', 'created_at', 'updated_at')
+
+    def validate(self, data):
+        if self.instance and self.instance.status == 'closed':
+            raise serializers.ValidationError("Closed fiscal years cannot be changed")
+
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and start_date > end_date:
+            raise serializers.ValidationError("Start date must be before end date")
+
+        company = self.instance.company if self.instance else self.context['request'].user.active_company
+        overlapping = FiscalYear.objects.filter(company=company, start_date__lte=end_date, end_date__gte=start_date)
+        if self.instance:
+            overlapping = overlapping.exclude(pk=self.instance.pk)
+        if overlapping.exists():
+            raise serializers.ValidationError("Fiscal year overlaps an existing fiscal year")
+
+        return data
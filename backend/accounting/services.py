@@ -0,0 +1,741 @@
+"""
+Ledger balance calculations shared by the accounting reports
+"""
+import calendar
+import csv
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import ChartOfAccounts, JournalEntry, Transaction, AccountPeriodBalance, FiscalYear
+
+
+ZERO = Decimal('0')
+
+# Asset and expense accounts carry a debit balance, the rest a credit balance
+DEBIT_NORMAL_TYPES = ('asset', 'expense')
+INCOME_STATEMENT_TYPES = ('revenue', 'expense')
+
+# Retained earnings account of the default chart of accounts
+RETAINED_EARNINGS_CODE = '3020'
+
+
+class PeriodCloseError(Exception):
+    """Raised when a fiscal year cannot be closed"""
+
+
+def normal_balance(account_type, debit, credit):
+    """Balance of an account on its normal side"""
+    if account_type in DEBIT_NORMAL_TYPES:
+        return debit - credit
+    return credit - debit
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def get_account_totals(company, start_date=None, end_date=None, statuses=None):
+    """
+    Sum debit and credit per account of a company in a single grouped query.
+    Returns a dict of {account_id: (debit, credit)}.
+    """
+    transactions = Transaction.objects.filter(journal_entry__company=company)
+    if start_date:
+        transactions = transactions.filter(journal_entry__date__gte=start_date)
+    if end_date:
+        transactions = transactions.filter(journal_entry__date__lte=end_date)
+    if statuses:
+        transactions = transactions.filter(journal_entry__status__in=statuses)
+
+    rows = transactions.order_by().values('account_id').annotate(
+        total_debit=Sum('debit'),
+        total_credit=Sum('credit'),
+    )
+    return {
+        row['account_id']: (row['total_debit'] or ZERO, row['total_credit'] or ZERO)
+        for row in rows
+    }
+
+
+def add_months(day, months):
+    """Same day of month `months` later (or earlier), clamped to the month end"""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    first = day.replace(year=year, month=month + 1, day=1)
+    return first.replace(day=min(day.day, month_end(first).day))
+
+
+def split_range(start_date, end_date):
+    """
+    Split a date range into the whole months it covers and the partial
+    months at its edges. Returns ((full_start, full_end) or None, edges)
+    where edges is a list of (start, end) tuples. Open bounds stay None.
+    """
+    full_start = start_date
+    if start_date and start_date.day != 1:
+        full_start = month_end(start_date) + timedelta(days=1)
+    full_end = end_date
+    if end_date and end_date != month_end(end_date):
+        full_end = month_start(end_date) - timedelta(days=1)
+
+    if full_start and full_end and full_start > full_end:
+        # The range does not cover a single whole month
+        return None, [(start_date, end_date)]
+
+    edges = []
+    if start_date and start_date != full_start:
+        edges.append((start_date, full_start - timedelta(days=1)))
+    if end_date and end_date != full_end:
+        edges.append((full_end + timedelta(days=1), end_date))
+    return (full_start, full_end), edges
+
+
+def _in_range(day, start_date, end_date):
+    return (start_date is None or day >= start_date) and (end_date is None or day <= end_date)
+
+
+def get_posted_totals_by_range(company, ranges):
+    """
+    Posted debit/credit per account for each (start_date, end_date) in
+    `ranges`, returned as a list of {account_id: (debit, credit)} dicts.
+
+    Whole months are read from AccountPeriodBalance and only the partial
+    months at the range edges from Transaction, so this runs at most two
+    queries however many ranges are asked for.
+    """
+    splits = [split_range(start_date, end_date) for start_date, end_date in ranges]
+    full_ranges = [full for full, edges in splits if full]
+    edge_ranges = [edge for full, edges in splits for edge in edges]
+
+    period_rows = []
+    if full_ranges:
+        periods = AccountPeriodBalance.objects.filter(company=company)
+        starts = [full_start for full_start, full_end in full_ranges]
+        ends = [full_end for full_start, full_end in full_ranges]
+        if None not in starts:
+            periods = periods.filter(period__gte=min(starts))
+        if None not in ends:
+            periods = periods.filter(period__lte=max(ends))
+        period_rows = list(periods.order_by().values_list('account_id', 'period', 'debit', 'credit'))
+
+    edge_rows = []
+    if edge_ranges:
+        edges = Q()
+        for edge_start, edge_end in edge_ranges:
+            edges |= Q(journal_entry__date__gte=edge_start, journal_entry__date__lte=edge_end)
+        edge_rows = list(
+            Transaction.objects.filter(
+                edges,
+                journal_entry__company=company,
+                journal_entry__status='posted',
+            ).order_by().values_list('account_id', 'journal_entry__date').annotate(
+                total_debit=Sum('debit'),
+                total_credit=Sum('credit'),
+            )
+        )
+
+    results = []
+    for full, edges in splits:
+        totals = {}
+        matched = []
+        if full:
+            matched += [row for row in period_rows if _in_range(row[1], *full)]
+        for edge in edges:
+            matched += [row for row in edge_rows if _in_range(row[1], *edge)]
+        for account_id, day, debit, credit in matched:
+            old_debit, old_credit = totals.get(account_id, (ZERO, ZERO))
+            totals[account_id] = (old_debit + (debit or ZERO), old_credit + (credit or ZERO))
+        results.append(totals)
+    return results
+
+
+def get_posted_totals(company, start_date=None, end_date=None):
+    """Posted debit/credit per account for a single date range"""
+    return get_posted_totals_by_range(company, [(start_date, end_date)])[0]
+
+
+def add_period_deltas(deltas, date, lines, sign=1):
+    """
+    Accumulate transaction lines into `deltas`, a dict of
+    {(account_id, month): (debit, credit)}.
+    `lines` is an iterable of (account_id, debit, credit).
+    """
+    period = month_start(date)
+    for account_id, debit, credit in lines:
+        old_debit, old_credit = deltas.get((account_id, period), (ZERO, ZERO))
+        deltas[(account_id, period)] = (old_debit + debit * sign, old_credit + credit * sign)
+    return deltas
+
+
+def apply_period_deltas(company_id, deltas):
+    """
+    Add accumulated {(account_id, month): (debit, credit)} deltas to the
+    period balances with one locking read, one bulk update and one bulk
+    insert, however many accounts and months are touched.
+    """
+    deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+    if not deltas:
+        return
+
+    existing = {
+        (balance.account_id, balance.period): balance
+        for balance in AccountPeriodBalance.objects.select_for_update().filter(
+            company_id=company_id,
+            account_id__in={account_id for account_id, period in deltas},
+            period__in={period for account_id, period in deltas},
+        )
+    }
+    now = timezone.now()
+    to_update = []
+    to_create = []
+    for (account_id, period), (debit, credit) in deltas.items():
+        balance = existing.get((account_id, period))
+        if balance:
+            balance.debit = F('debit') + debit
+            balance.credit = F('credit') + credit
+            balance.updated_at = now
+            to_update.append(balance)
+        else:
+            to_create.append(AccountPeriodBalance(
+                company_id=company_id, account_id=account_id, period=period, debit=debit, credit=credit
+            ))
+    if to_update:
+        AccountPeriodBalance.objects.bulk_update(to_update, ['debit', 'credit', 'updated_at'], batch_size=500)
+    if to_create:
+        AccountPeriodBalance.objects.bulk_create(to_create, batch_size=500)
+
+
+def update_period_balances(company_id, date, lines, sign=1):
+    """Add (or with sign=-1 remove) transaction lines to the month of `date`"""
+    apply_period_deltas(company_id, add_period_deltas({}, date, lines, sign=sign))
+
+
+def post_entry_balances(entry, sign=1):
+    """Apply a posted journal entry's transactions to the period balances"""
+    lines = entry.transactions.values_list('account_id', 'debit', 'credit')
+    update_period_balances(entry.company_id, entry.date, lines, sign=sign)
+
+
+def unpost_entry_balances(entry):
+    post_entry_balances(entry, sign=-1)
+
+
+def rebuild_period_balances(company):
+    """Recompute a company's period balances from posted transactions"""
+    AccountPeriodBalance.objects.filter(company=company).delete()
+    rows = Transaction.objects.filter(
+        journal_entry__company=company,
+        journal_entry__status='posted',
+    ).order_by().annotate(
+        period=TruncMonth('journal_entry__date'),
+    ).values('account_id', 'period').annotate(
+        total_debit=Sum('debit'),
+        total_credit=Sum('credit'),
+    )
+    balances = [
+        AccountPeriodBalance(
+            company=company,
+            account_id=row['account_id'],
+            period=row['period'],
+            debit=row['total_debit'] or ZERO,
+            credit=row['total_credit'] or ZERO,
+        )
+        for row in rows
+    ]
+    AccountPeriodBalance.objects.bulk_create(balances, batch_size=1000)
+    return len(balances)
+
+
+def rollup_balances(accounts, totals):
+    """
+    Build balance rows for the given accounts and roll each account's totals
+    up along ChartOfAccounts.parent.
+
+    `accounts` is an iterable of dicts with id, code, name, account_type and
+    parent_id; `totals` maps account id to a (debit, credit) tuple.
+    """
+    rows = {}
+    for account in accounts:
+        debit, credit = totals.get(account['id'], (ZERO, ZERO))
+        rows[account['id']] = {
+            'id': account['id'],
+            'code': account['code'],
+            'name': account['name'],
+            'account_type': account['account_type'],
+            'parent': account['parent_id'],
+            'debit': debit,
+            'credit': credit,
+            'total_debit': debit,
+            'total_credit': credit,
+        }
+
+    for row in rows.values():
+        debit, credit = row['debit'], row['credit']
+        if not debit and not credit:
+            continue
+        seen = {row['id']}
+        parent_id = row['parent']
+        # Guard against cycles in a hand-edited chart
+        while parent_id in rows and parent_id not in seen:
+            parent = rows[parent_id]
+            parent['total_debit'] += debit
+            parent['total_credit'] += credit
+            seen.add(parent_id)
+            parent_id = parent['parent']
+
+    for row in rows.values():
+        row['balance'] = normal_balance(row['account_type'], row['debit'], row['credit'])
+        row['total_balance'] = normal_balance(row['account_type'], row['total_debit'], row['total_credit'])
+
+    return sorted(rows.values(), key=lambda row: row['code'])
+
+
+def build_account_tree(accounts):
+    """
+    Nest account dicts (with id and parent_id) under their parents. Accounts
+    whose parent is not in `accounts` become roots. Order is preserved.
+    """
+    nodes = {account['id']: dict(account, children=[]) for account in accounts}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent_id'])
+        if parent:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def get_account_balances(company, start_date=None, end_date=None, statuses=('posted',), exclude_entry_types=()):
+    """
+    Debit, credit and normal-side balance of every account of a company,
+    both for the account itself and rolled up with its descendants.
+    Posted-only balances come from the period store; any other status
+    filter sums Transaction directly. Query count does not depend on the
+    size of the chart.
+    """
+    if statuses and list(statuses) == ['posted']:
+        return get_comparative_balances(
+            company, [(start_date, end_date)], exclude_entry_types=exclude_entry_types
+        )[0]
+
+    totals = get_account_totals(company, start_date=start_date, end_date=end_date, statuses=statuses)
+    return rollup_balances(_chart_values(company), totals)
+
+
+def get_comparative_balances(company, ranges, exclude_entry_types=()):
+    """
+    Posted account balances for several (start_date, end_date) ranges side
+    by side, one list of balance rows per range, in at most three queries
+    (one more when entry types are excluded, e.g. closing entries for the
+    income statement).
+    """
+    accounts = list(_chart_values(company))
+    totals_list = get_posted_totals_by_range(company, ranges)
+    if exclude_entry_types:
+        _subtract_entry_types(company, ranges, totals_list, exclude_entry_types)
+    return [rollup_balances(accounts, totals) for totals in totals_list]
+
+
+def _subtract_entry_types(company, ranges, totals_list, entry_types):
+    transactions = Transaction.objects.filter(
+        journal_entry__company=company,
+        journal_entry__status='posted',
+        journal_entry__entry_type__in=entry_types,
+    )
+    starts = [start_date for start_date, end_date in ranges]
+    ends = [end_date for start_date, end_date in ranges]
+    if None not in starts:
+        transactions = transactions.filter(journal_entry__date__gte=min(starts))
+    if None not in ends:
+        transactions = transactions.filter(journal_entry__date__lte=max(ends))
+    rows = list(
+        transactions.order_by().values_list('account_id', 'journal_entry__date').annotate(
+            total_debit=Sum('debit'),
+            total_credit=Sum('credit'),
+        )
+    )
+    for (start_date, end_date), totals in zip(ranges, totals_list):
+        for account_id, day, debit, credit in rows:
+            if _in_range(day, start_date, end_date):
+                old_debit, old_credit = totals.get(account_id, (ZERO, ZERO))
+                totals[account_id] = (old_debit - debit, old_credit - credit)
+
+
+def _chart_values(company):
+    return ChartOfAccounts.objects.filter(company=company).values(
+        'id', 'code', 'name', 'account_type', 'parent_id'
+    )
+
+
+def get_closed_year_ends(company):
+    """End dates of a company's closed fiscal years, oldest first"""
+    return list(
+        FiscalYear.objects.filter(company=company, status='closed')
+        .order_by('end_date').values_list('end_date', flat=True)
+    )
+
+
+def opening_date_for(closed_year_ends, day=None):
+    """
+    Date of the opening entry that balances on `day` can start from: the
+    day after the last fiscal year closed before it, or None if there is none.
+    """
+    ends = [end for end in closed_year_ends if day is None or end < day]
+    return max(ends) + timedelta(days=1) if ends else None
+
+
+def get_opening_date(company, day=None):
+    return opening_date_for(get_closed_year_ends(company), day)
+
+
+def get_locked_until(company):
+    """Last day of the latest closed fiscal year; entries up to it are locked"""
+    return FiscalYear.objects.filter(company=company, status='closed').order_by(
+        '-end_date'
+    ).values_list('end_date', flat=True).first()
+
+
+def is_date_locked(company, day):
+    locked_until = get_locked_until(company)
+    return bool(locked_until and day <= locked_until)
+
+
+def _create_posted_entry(company, entry_type, entry_number, date, description, lines, user=None):
+    if not lines:
+        return None
+    if JournalEntry.objects.filter(company=company, entry_number=entry_number).exists():
+        raise PeriodCloseError(f"Journal entry {entry_number} already exists")
+
+    entry = JournalEntry.objects.create(
+        company=company,
+        entry_number=entry_number,
+        date=date,
+        description=description,
+        status='posted',
+        entry_type=entry_type,
+        created_by=user,
+    )
+    Transaction.objects.bulk_create([
+        Transaction(journal_entry=entry, account_id=account_id, debit=debit, credit=credit)
+        for account_id, debit, credit in lines
+    ])
+    post_entry_balances(entry)
+    return entry
+
+
+def _balancing_line(account_id, amount):
+    """Line that moves `amount` (debit minus credit) onto an account"""
+    if amount > 0:
+        return (account_id, amount, ZERO)
+    return (account_id, ZERO, -amount)
+
+
+@transaction.atomic
+def close_fiscal_year(fiscal_year, user=None):
+    """
+    Close a fiscal year: post a closing entry moving revenue and expense
+    balances into retained earnings, post an opening entry with the balance
+    sheet accounts on the next day, and lock the year against changes.
+    Reports after the close start from that opening entry.
+    """
+    fiscal_year = FiscalYear.objects.select_for_update().get(pk=fiscal_year.pk)
+    company = fiscal_year.company
+
+    if fiscal_year.status == 'closed':
+        raise PeriodCloseError("Fiscal year is already closed")
+    if FiscalYear.objects.filter(company=company, status='open', end_date__lt=fiscal_year.start_date).exists():
+        raise PeriodCloseError("Earlier fiscal years must be closed first")
+    drafts = JournalEntry.objects.filter(company=company, status='draft', date__lte=fiscal_year.end_date).count()
+    if drafts:
+        raise PeriodCloseError(f"{drafts} draft journal entries in this period must be posted or cancelled first")
+    retained_earnings = ChartOfAccounts.objects.filter(company=company, code=RETAINED_EARNINGS_CODE).first()
+    if not retained_earnings:
+        raise PeriodCloseError(f"Retained earnings account {RETAINED_EARNINGS_CODE} does not exist")
+
+    opening_date = get_opening_date(company, fiscal_year.start_date)
+
+    closing_lines = []
+    net_amount = ZERO
+    balances = get_account_balances(company, start_date=opening_date, end_date=fiscal_year.end_date)
+    for row in balances:
+        amount = row['debit'] - row['credit']
+        if row['account_type'] in INCOME_STATEMENT_TYPES and amount:
+            closing_lines.append(_balancing_line(row['id'], -amount))
+            net_amount += amount
+    if net_amount:
+        closing_lines.append(_balancing_line(retained_earnings.id, net_amount))
+
+    closing_entry = _create_posted_entry(
+        company, 'closing', f"CLOSE-{fiscal_year.name}", fiscal_year.end_date,
+        f"Closing entry for fiscal year {fiscal_year.name}", closing_lines, user,
+    )
+
+    opening_lines = []
+    balances = get_account_balances(company, start_date=opening_date, end_date=fiscal_year.end_date)
+    for row in balances:
+        amount = row['debit'] - row['credit']
+        if row['account_type'] not in INCOME_STATEMENT_TYPES and amount:
+            opening_lines.append(_balancing_line(row['id'], amount))
+
+    opening_entry = _create_posted_entry(
+        company, 'opening', f"OPEN-{fiscal_year.name}", fiscal_year.end_date + timedelta(days=1),
+        f"Opening balances after fiscal year {fiscal_year.name}", opening_lines, user,
+    )
+
+    fiscal_year.status = 'closed'
+    fiscal_year.closing_entry = closing_entry
+    fiscal_year.opening_entry = opening_entry
+    fiscal_year.closed_by = user
+    fiscal_year.closed_at = timezone.now()
+    fiscal_year.save()
+    return fiscal_year
+
+
+def iter_ledger_rows(company, start_date=None, end_date=None, account_ids=None, chunk_size=2000):
+    """
+    Yield posted general-ledger lines ordered by account and date, each with
+    the account's running balance on its normal side. Rows are read with a
+    server-side cursor so memory use does not grow with the ledger.
+
+    The running balance starts from the account balance on the day before
+    `start_date`. Opening entries are skipped because they restate balances
+    that are already carried in the running total.
+    """
+    opening = {}
+    if start_date:
+        day_before = start_date - timedelta(days=1)
+        before = get_account_balances(
+            company, start_date=get_opening_date(company, day_before), end_date=day_before
+        )
+        opening = {row['id']: row['balance'] for row in before}
+
+    transactions = Transaction.objects.filter(
+        journal_entry__company=company,
+        journal_entry__status='posted',
+    ).exclude(journal_entry__entry_type='opening')
+    if start_date:
+        transactions = transactions.filter(journal_entry__date__gte=start_date)
+    if end_date:
+        transactions = transactions.filter(journal_entry__date__lte=end_date)
+    if account_ids:
+        transactions = transactions.filter(account_id__in=account_ids)
+
+    rows = transactions.order_by(
+        'account__code', 'journal_entry__date', 'journal_entry_id', 'id'
+    ).values_list(
+        'journal_entry__entry_number', 'journal_entry__date', 'journal_entry__description',
+        'account_id', 'account__code', 'account__name', 'account__account_type',
+        'debit', 'credit',
+    )
+
+    current_account = None
+    balance = ZERO
+    for entry_number, date, description, account_id, code, name, account_type, debit, credit in rows.iterator(chunk_size=chunk_size):
+        if account_id != current_account:
+            current_account = account_id
+            balance = opening.get(account_id, ZERO)
+        balance += normal_balance(account_type, debit, credit)
+        yield {
+            'entry_number': entry_number,
+            'date': date,
+            'account_code': code,
+            'account_name': name,
+            'description': description,
+            'debit': debit,
+            'credit': credit,
+            'balance': balance,
+        }
+
+
+IMPORT_STATUSES = ('draft', 'posted')
+IMPORT_BATCH_SIZE = 500
+
+
+def parse_journal_entry_jsonl(lines):
+    """
+    Parse JSON lines, one journal entry per line:
+    {"entry_number", "date", "description", "reference", "status",
+     "transactions": [{"account_code" or "account", "debit", "credit", "description"}]}
+    Lines that are not valid JSON objects come back as {"_error": message}.
+    """
+    entries = []
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError as e:
+            entry = {'_error': f"Line {number} is not valid JSON: {e}"}
+        if not isinstance(entry, dict):
+            entry = {'_error': f"Line {number} is not a JSON object"}
+        entries.append(entry)
+    return entries
+
+
+def parse_journal_entry_csv(lines):
+    """
+    Parse CSV with one row per transaction line and the columns
+    entry_number, date, description, reference, status, account_code,
+    debit, credit, line_description. Rows are grouped by entry_number and
+    entry fields are taken from the first row of each entry.
+    """
+    entries = {}
+    lines = (line.decode('utf-8') if isinstance(line, bytes) else line for line in lines)
+    for row in csv.DictReader(lines):
+        number = (row.get('entry_number') or '').strip()
+        entry = entries.setdefault(number, {
+            'entry_number': number,
+            'date': row.get('date'),
+            'description': row.get('description'),
+            'reference': row.get('reference'),
+            'status': row.get('status') or 'draft',
+            'transactions': [],
+        })
+        entry['transactions'].append({
+            'account_code': row.get('account_code'),
+            'debit': row.get('debit'),
+            'credit': row.get('credit'),
+            'description': row.get('line_description'),
+        })
+    return list(entries.values())
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(str(value)) if value not in (None, '') else ZERO
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount < 0 or amount != amount.quantize(Decimal('0.01')):
+        return None
+    return amount
+
+
+def import_journal_entries(company, entries, user=None, allow_partial=False):
+    """
+    Validate and insert a batch of journal entries.
+
+    Validation runs a fixed number of queries for the whole batch (chart of
+    accounts, existing entry numbers, period lock) and entries and
+    transactions are written with bulk_create in one atomic transaction.
+    Unless `allow_partial` is set, any invalid entry aborts the whole batch.
+    Returns (created_count, errors) where errors is a list of
+    {"index", "entry_number", "errors"} dicts.
+    """
+    accounts = dict(ChartOfAccounts.objects.filter(company=company).values_list('code', 'id'))
+    account_ids = set(accounts.values())
+
+    numbers = [str(entry.get('entry_number') or '') for entry in entries]
+    existing_numbers = set()
+    for start in range(0, len(numbers), IMPORT_BATCH_SIZE):
+        existing_numbers.update(
+            JournalEntry.objects.filter(
+                company=company, entry_number__in=numbers[start:start + IMPORT_BATCH_SIZE]
+            ).values_list('entry_number', flat=True)
+        )
+    locked_until = get_locked_until(company)
+
+    errors = []
+    valid = []
+    seen_numbers = set()
+    for index, entry in enumerate(entries):
+        entry_errors = []
+        number = numbers[index]
+        if '_error' in entry:
+            errors.append({'index': index, 'entry_number': number, 'errors': [entry['_error']]})
+            continue
+        if not number:
+            entry_errors.append("entry_number is required")
+        elif number in existing_numbers or number in seen_numbers:
+            entry_errors.append(f"Entry number {number} already exists")
+        seen_numbers.add(number)
+
+        date = entry.get('date')
+        try:
+            date = parse_date(str(date)) if date else None
+        except ValueError:
+            date = None
+        if not date:
+            entry_errors.append("date must be YYYY-MM-DD")
+        elif locked_until and date <= locked_until:
+            entry_errors.append(f"Fiscal period is closed up to {locked_until}")
+
+        status = entry.get('status') or 'draft'
+        if status not in IMPORT_STATUSES:
+            entry_errors.append(f"status must be one of {', '.join(IMPORT_STATUSES)}")
+
+        lines = []
+        transactions_data = entry.get('transactions') or []
+        if not transactions_data:
+            entry_errors.append("Journal entry must have transactions")
+        for line_number, line in enumerate(transactions_data, start=1):
+            if not isinstance(line, dict):
+                entry_errors.append(f"Line {line_number}: transaction must be an object")
+                continue
+            account_id = None
+            if line.get('account_code'):
+                account_id = accounts.get(str(line['account_code']).strip())
+            elif str(line.get('account', '')).isdigit() and int(line['account']) in account_ids:
+                account_id = int(line['account'])
+            if account_id is None:
+                entry_errors.append(f"Line {line_number}: account does not belong to your company")
+            debit, credit = _parse_amount(line.get('debit')), _parse_amount(line.get('credit'))
+            if debit is None or credit is None:
+                entry_errors.append(f"Line {line_number}: debit and credit must be non-negative amounts")
+            lines.append((account_id, debit or ZERO, credit or ZERO, line.get('description')))
+
+        total_debit = sum(line[1] for line in lines)
+        total_credit = sum(line[2] for line in lines)
+        if total_debit != total_credit:
+            entry_errors.append(f"Journal entry must be balanced. Total Debit: {total_debit}, Total Credit: {total_credit}")
+
+        if entry_errors:
+            errors.append({'index': index, 'entry_number': number, 'errors': entry_errors})
+            continue
+        valid.append((
+            JournalEntry(
+                company=company,
+                entry_number=number,
+                date=date,
+                description=entry.get('description') or '',
+                reference=entry.get('reference') or None,
+                status=status,
+                created_by=user,
+            ),
+            lines,
+        ))
+
+    if errors and not allow_partial:
+        return 0, errors
+
+    with transaction.atomic():
+        journal_entries = JournalEntry.objects.bulk_create(
+            [journal_entry for journal_entry, lines in valid], batch_size=IMPORT_BATCH_SIZE
+        )
+        transactions = []
+        deltas = {}
+        for journal_entry, (_, lines) in zip(journal_entries, valid):
+            transactions.extend(
+                Transaction(
+                    journal_entry=journal_entry, account_id=account_id,
+                    debit=debit, credit=credit, description=description,
+                )
+                for account_id, debit, credit, description in lines
+            )
+            if journal_entry.status == 'posted':
+                add_period_deltas(deltas, journal_entry.date, [line[:3] for line in lines])
+        Transaction.objects.bulk_create(transactions, batch_size=IMPORT_BATCH_SIZE)
+        apply_period_deltas(company.id, deltas)
+
+    return len(journal_entries), errors
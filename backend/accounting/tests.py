@@ -1,3 +1,300 @@
+import csv
+import datetime
+import json
+from decimal import Decimal
 from django.test import TestCase
+from rest_framework.test import APIClient
+from accounts.models import User
+from companies.models import Company
+from .models import AccountPeriodBalance, ChartOfAccounts, FiscalYear, JournalEntry, Transaction
+from .services import PeriodCloseError, close_fiscal_year, get_account_balances, post_entry_balances
 
-# Create your tests here.
+
+class AccountingTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('accountant', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.user.active_company = self.company
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cash = self.account('1010', 'Cash', 'asset')
+        self.sales = self.account('4010', 'Sales', 'revenue')
+
+    def account(self, code, name, account_type, **fields):
+        return ChartOfAccounts.objects.create(
+            company=self.company, code=code, name=name, account_type=account_type, **fields
+        )
+
+    def entry(self, date, amount, status='posted'):
+        entry = JournalEntry.objects.create(company=self.company, date=date, description='Sale', status=status)
+        Transaction.objects.bulk_create([
+            Transaction(journal_entry=entry, account=self.cash, debit=amount),
+            Transaction(journal_entry=entry, account=self.sales, credit=amount),
+        ])
+        if status == 'posted':
+            post_entry_balances(entry)
+        return entry
+
+    def period_balance(self, account, period):
+        balance = AccountPeriodBalance.objects.filter(account=account, period=period).first()
+        return (balance.debit, balance.credit) if balance else (Decimal('0'), Decimal('0'))
+
+
+class ReportTests(AccountingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = self.account('1020', 'Bank', 'asset', parent=self.cash)
+        self.rent = self.account('5010', 'Rent', 'expense')
+        self.entry(datetime.date(2026, 1, 10), Decimal('100'))
+        self.entry(datetime.date(2026, 2, 15), Decimal('50'))
+        rent = JournalEntry.objects.create(company=self.company, date=datetime.date(2026, 2, 20), description='Rent', status='posted')
+        Transaction.objects.bulk_create([
+            Transaction(journal_entry=rent, account=self.rent, debit=Decimal('30')),
+            Transaction(journal_entry=rent, account=self.bank, credit=Decimal('30')),
+        ])
+        post_entry_balances(rent)
+        self.entry(datetime.date(2026, 2, 25), Decimal('999'), status='draft')
+
+    def test_balance_sheet_and_income_statement(self):
+        sheet = self.client.get('/api/accounting/reports/balance-sheet/').json()
+        self.assertEqual(
+            [(row['code'], row['balance']) for row in sheet['assets']], [('1010', 150.0), ('1020', -30.0)]
+        )
+        self.assertEqual(sheet['total_assets'], 120.0)
+
+        income = self.client.get('/api/accounting/reports/income-statement/').json()
+        self.assertEqual((income['total_revenue'], income['total_expenses'], income['net_income']), (150.0, 30.0, 120.0))
+
+    def test_trial_balance_rolls_up_children(self):
+        accounts = {row['code']: row for row in self.client.get('/api/accounting/reports/trial-balance/').json()['accounts']}
+        self.assertEqual((accounts['1010']['balance'], accounts['1010']['total_balance']), (150.0, 120.0))
+
+        accounts = {
+            row['code']: row
+            for row in self.client.get('/api/accounting/reports/trial-balance/?status=draft,posted').json()['accounts']
+        }
+        self.assertEqual(accounts['4010']['credit'], 1149.0)
+
+    def test_balance_sheet_as_of(self):
+        sheet = self.client.get('/api/accounting/reports/balance-sheet/?as_of=2026-01-31').json()
+        self.assertEqual([(row['code'], row['balance']) for row in sheet['assets']], [('1010', 100.0)])
+
+    def test_comparative_columns(self):
+        sheet = self.client.get('/api/accounting/reports/balance-sheet/?as_of=2026-02-28&periods=2').json()
+        self.assertEqual([column['as_of'] for column in sheet['columns']], ['2026-02-28', '2026-01-31'])
+        self.assertEqual(sheet['total_assets'], [120.0, 100.0])
+
+        income = self.client.get('/api/accounting/reports/income-statement/?end_date=2026-02-28&periods=2').json()
+        self.assertEqual(
+            [(column['start_date'], column['end_date']) for column in income['columns']],
+            [('2026-02-01', '2026-02-28'), ('2026-01-01', '2026-01-31')],
+        )
+        self.assertEqual([row['balances'] for row in income['revenue']], [[50.0, 100.0]])
+        self.assertEqual(income['net_income'], [20.0, 100.0])
+
+        quarters = self.client.get('/api/accounting/reports/income-statement/?end_date=2026-03-31&periods=1&interval=quarter')
+        self.assertEqual(quarters.json()['net_income'], [120.0])
+        for query in ('periods=0', 'periods=2&interval=week', 'as_of=2026-13-01'):
+            self.assertEqual(self.client.get(f'/api/accounting/reports/balance-sheet/?{query}').status_code, 400, query)
+
+    def test_balances_take_three_queries(self):
+        for number in range(20):
+            self.account(f'6{number:03}', f'Expense {number}', 'expense')
+        # Whole February from the period store, the edges of January and March from the ledger
+        with self.assertNumQueries(3):
+            balances = get_account_balances(self.company, datetime.date(2026, 1, 5), datetime.date(2026, 3, 10))
+        self.assertEqual(len(balances), 24)
+
+
+class TransactionCreateTests(AccountingTestCase):
+    def add_line(self, entry, **line):
+        return self.client.post('/api/accounting/transactions/', {'journal_entry': entry.id, **line}, format='json')
+
+    def test_line_of_posted_entry_updates_period_balances(self):
+        entry = self.entry(datetime.date(2026, 2, 10), Decimal('100'))
+        response = self.add_line(entry, account=self.cash.id, debit='25')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.period_balance(self.cash, datetime.date(2026, 2, 1)), (Decimal('125'), Decimal('0')))
+
+    def test_line_of_draft_entry_leaves_period_balances(self):
+        entry = self.entry(datetime.date(2026, 2, 10), Decimal('100'), status='draft')
+        self.assertEqual(self.add_line(entry, account=self.cash.id, debit='25').status_code, 201)
+        self.assertFalse(AccountPeriodBalance.objects.exists())
+
+    def test_line_in_closed_year_is_rejected(self):
+        self.account('3020', 'Retained earnings', 'equity')
+        entry = self.entry(datetime.date(2025, 6, 1), Decimal('100'))
+        year = FiscalYear.objects.create(
+            company=self.company, name='2025', start_date=datetime.date(2025, 1, 1), end_date=datetime.date(2025, 12, 31)
+        )
+        close_fiscal_year(year, self.user)
+
+        response = self.add_line(entry, account=self.cash.id, debit='25')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(entry.transactions.count(), 2)
+
+    def test_entry_of_another_company_is_rejected(self):
+        owner = User.objects.create_user('other', password='secret')
+        other = Company.objects.create(owner=owner, name='Other')
+        entry = JournalEntry.objects.create(company=other, date=datetime.date(2026, 2, 10), description='Other')
+        response = self.add_line(entry, account=self.cash.id, debit='25')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(entry.transactions.exists())
+
+
+class FiscalYearCloseTests(AccountingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.retained = self.account('3020', 'Retained earnings', 'equity')
+        self.rent = self.account('5010', 'Rent', 'expense')
+        self.year = FiscalYear.objects.create(
+            company=self.company, name='2025', start_date=datetime.date(2025, 1, 1), end_date=datetime.date(2025, 12, 31)
+        )
+        self.entry(datetime.date(2025, 3, 1), Decimal('100'))
+        rent = JournalEntry.objects.create(company=self.company, date=datetime.date(2025, 4, 1), description='Rent', status='posted')
+        Transaction.objects.bulk_create([
+            Transaction(journal_entry=rent, account=self.rent, debit=Decimal('30')),
+            Transaction(journal_entry=rent, account=self.cash, credit=Decimal('30')),
+        ])
+        post_entry_balances(rent)
+
+    def balances(self, start_date=None, end_date=None):
+        return {
+            row['code']: row['debit'] - row['credit']
+            for row in get_account_balances(self.company, start_date, end_date)
+            if row['debit'] - row['credit']
+        }
+
+    def test_close_moves_profit_to_retained_earnings(self):
+        close_fiscal_year(self.year, self.user)
+        self.year.refresh_from_db()
+        self.assertEqual(self.year.status, 'closed')
+
+        self.assertEqual(self.balances(datetime.date(2026, 1, 1)), {'1010': Decimal('70'), '3020': Decimal('-70')})
+        opening = self.year.opening_entry
+        self.assertEqual(opening.date, datetime.date(2026, 1, 1))
+        self.assertEqual(self.period_balance(self.retained, datetime.date(2025, 12, 1)), (Decimal('0'), Decimal('70')))
+
+    def test_closed_year_is_locked(self):
+        close_fiscal_year(self.year, self.user)
+        response = self.client.post('/api/accounting/journal-entries/', {
+            'date': '2025-06-01', 'description': 'Late', 'status': 'posted', 'transactions': [
+                {'account': self.cash.id, 'debit': '5'}, {'account': self.sales.id, 'credit': '5'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(PeriodCloseError):
+            close_fiscal_year(self.year, self.user)
+
+    def test_drafts_block_close(self):
+        self.entry(datetime.date(2025, 5, 1), Decimal('10'), status='draft')
+        with self.assertRaises(PeriodCloseError):
+            close_fiscal_year(self.year, self.user)
+        self.year.refresh_from_db()
+        self.assertEqual(self.year.status, 'open')
+
+
+class LedgerExportTests(AccountingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.entry(datetime.date(2026, 1, 10), Decimal('100'))
+        self.entry(datetime.date(2026, 2, 15), Decimal('50'))
+        self.entry(datetime.date(2026, 2, 20), Decimal('7'), status='draft')
+
+    def export(self, query):
+        response = self.client.get(f'/api/accounting/ledger/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_carries_balance_from_before_start_date(self):
+        rows = list(csv.DictReader(self.export('start_date=2026-02-01').splitlines()))
+        self.assertEqual(
+            [(row['account_code'], row['date'], row['balance']) for row in rows],
+            [('1010', '2026-02-15', '150.00'), ('4010', '2026-02-15', '150.00')],
+        )
+
+    def test_ndjson_filtered_by_account(self):
+        rows = [json.loads(line) for line in self.export(f'output=ndjson&account={self.sales.id}').splitlines()]
+        self.assertEqual([(row['credit'], row['balance']) for row in rows], [('100.00', '100.00'), ('50.00', '150.00')])
+        self.assertEqual(self.client.get('/api/accounting/ledger/export/?output=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/accounting/ledger/export/?account=x').status_code, 400)
+
+
+class JournalEntryImportTests(AccountingTestCase):
+    def import_entries(self, entries, query=''):
+        return self.client.post(f'/api/accounting/journal-entries/bulk/{query}', entries, format='json')
+
+    def sale(self, number, amount='10', status='posted', **fields):
+        return {
+            'entry_number': number, 'date': '2026-02-10', 'description': 'Sale', 'status': status,
+            'transactions': [
+                {'account_code': '1010', 'debit': amount}, {'account': self.sales.id, 'credit': amount},
+            ],
+            **fields,
+        }
+
+    def test_import_posts_balances(self):
+        response = self.import_entries([self.sale('JE-1'), self.sale('JE-2', '5', status='draft')])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 2, 'errors': []})
+        self.assertEqual(self.period_balance(self.cash, datetime.date(2026, 2, 1)), (Decimal('10'), Decimal('0')))
+
+    def test_invalid_entry_aborts_batch(self):
+        entries = [
+            self.sale('JE-1'),
+            self.sale('JE-1'),
+            self.sale('JE-3', transactions=[{'account_code': '1010', 'debit': '5'}, {'account_code': '9999', 'credit': '4'}]),
+        ]
+        response = self.import_entries(entries)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2])
+        self.assertEqual(len(response.json()['errors'][1]['errors']), 2)
+        self.assertFalse(JournalEntry.objects.exists())
+
+        response = self.import_entries(entries, '?partial=true')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(JournalEntry.objects.values_list('entry_number', flat=True)), ['JE-1'])
+
+    def test_csv_import(self):
+        body = (
+            'entry_number,date,description,reference,status,account_code,debit,credit,line_description\n'
+            'JE-1,2026-02-10,Sale,,posted,1010,12.50,,Till\n'
+            'JE-1,2026-02-10,Sale,,posted,4010,,12.50,Till\n'
+        )
+        response = self.client.post('/api/accounting/journal-entries/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(JournalEntry.objects.get().transactions.count(), 2)
+        self.assertEqual(self.period_balance(self.sales, datetime.date(2026, 2, 1)), (Decimal('0'), Decimal('12.50')))
+
+
+class ChartOfAccountsTreeTests(AccountingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = self.account('1020', 'Bank', 'asset', parent=self.cash)
+        self.savings = self.account('1021', 'Savings', 'asset', parent=self.bank)
+
+    def codes(self, accounts):
+        return sorted(account.code for account in accounts)
+
+    def test_paths_follow_moves(self):
+        self.assertEqual(self.savings.path, f'/{self.cash.id}/{self.bank.id}/{self.savings.id}/')
+        self.assertEqual(self.codes(self.cash.get_descendants()), ['1020', '1021'])
+
+        self.bank.parent = self.sales
+        self.bank.save()
+        self.savings.refresh_from_db()
+        self.assertEqual(self.savings.path, f'/{self.sales.id}/{self.bank.id}/{self.savings.id}/')
+        self.assertEqual(self.codes(self.cash.get_descendants()), [])
+
+        self.bank.delete()
+        self.savings.refresh_from_db()
+        self.assertEqual(self.savings.path, f'/{self.savings.id}/')
+
+    def test_tree_view(self):
+        with self.assertNumQueries(2):
+            tree = self.client.get('/api/accounting/accounts/tree/?root=1010').json()
+        self.assertEqual(len(tree), 1)
+        self.assertEqual(tree[0]['children'][0]['children'][0]['code'], '1021')
+        listed = self.client.get('/api/accounting/accounts/?descendants_of=1020').json()
+        self.assertEqual([account['code'] for account in listed], ['1021'])
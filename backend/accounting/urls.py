@@ -1,19 +1,28 @@
 from django.urls import path
 from .views import (
-    ChartOfAccountsListCreateView, ChartOfAccountsDetailView,
+    ChartOfAccountsListCreateView, ChartOfAccountsDetailView, ChartOfAccountsTreeView,
     JournalEntryListCreateView, JournalEntryDetailView,
     TransactionListCreateView, TransactionDetailView,
-    BalanceSheetView, IncomeStatementView, CreateDefaultChartView
+    BalanceSheetView, IncomeStatementView, TrialBalanceView, CreateDefaultChartView,
+    FiscalYearListCreateView, FiscalYearDetailView, FiscalYearCloseView, LedgerExportView,
+    JournalEntryBulkImportView
 )
 
 urlpatterns = [
     path('accounts/', ChartOfAccountsListCreateView.as_view(), name='account-list-create'),
     path('accounts/<int:pk>/', ChartOfAccountsDetailView.as_view(), name='account-detail'),
+    path('accounts/tree/', ChartOfAccountsTreeView.as_view(), name='account-tree'),
     path('accounts/create-default/', CreateDefaultChartView.as_view(), name='create-default-chart'),
     path('journal-entries/', JournalEntryListCreateView.as_view(), name='journal-entry-list-create'),
+    path('journal-entries/bulk/', JournalEntryBulkImportView.as_view(), name='journal-entry-bulk-import'),
     path('journal-entries/<int:pk>/', JournalEntryDetailView.as_view(), name='journal-entry-detail'),
     path('transactions/', TransactionListCreateView.as_view(), name='transaction-list-create'),
     path('transactions/<int:pk>/', TransactionDetailView.as_view(), name='transaction-detail'),
+    path('ledger/export/', LedgerExportView.as_view(), name='ledger-export'),
+    path('fiscal-years/', FiscalYearListCreateView.as_view(), name='fiscal-year-list-create'),
+    path('fiscal-years/<int:pk>/', FiscalYearDetailView.as_view(), name='fiscal-year-detail'),
+    path('fiscal-years/<int:pk>/close/', FiscalYearCloseView.as_view(), name='fiscal-year-close'),
     path('reports/balance-sheet/', BalanceSheetView.as_view(), name='balance-sheet'),
     path('reports/income-statement/', IncomeStatementView.as_view(), name='income-statement'),
+    path('reports/trial-balance/', TrialBalanceView.as_view(), name='trial-balance'),
 ]
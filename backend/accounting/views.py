@@ -1,17 +1,38 @@
 from rest_framework import generics, permissions
-from .models import ChartOfAccounts, JournalEntry, Transaction
-from .serializers import ChartOfAccountsSerializer, JournalEntrySerializer, TransactionSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.db import transaction
+from .models import ChartOfAccounts, JournalEntry, Transaction, FiscalYear
+from .serializers import ChartOfAccountsSerializer, JournalEntrySerializer, TransactionSerializer, FiscalYearSerializer
+from .services import unpost_entry_balances, update_period_balances, is_date_locked, build_account_tree
+
+
+def check_entry_editable(entry):
+    if entry.entry_type != 'regular':
+        raise ValidationError({"error": "Closing and opening entries cannot be changed"})
+    if is_date_locked(entry.company, entry.date):
+        raise ValidationError({"error": "Journal entry belongs to a closed fiscal period"})
 
 
 class ChartOfAccountsListCreateView(generics.ListCreateAPIView):
+    """Accounts of the active company; `descendants_of=<code>` limits the list to a subtree"""
     serializer_class = ChartOfAccountsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user_company = self.request.user.active_company
-        if user_company:
-            return ChartOfAccounts.objects.filter(company=user_company)
-        return ChartOfAccounts.objects.none()
+        if not user_company:
+            return ChartOfAccounts.objects.none()
+
+        queryset = ChartOfAccounts.objects.filter(company=user_company)
+        ancestor_code = self.request.query_params.get('descendants_of')
+        if ancestor_code:
+            ancestor = queryset.filter(code=ancestor_code).first()
+            if not ancestor:
+                return ChartOfAccounts.objects.none()
+            queryset = ancestor.get_descendants()
+        return queryset
 
     def perform_create(self, serializer):
         user_company = self.request.user.active_company
@@ -30,6 +51,30 @@ class ChartOfAccountsDetailView(generics.RetrieveUpdateDestroyAPIView):
         return ChartOfAccounts.objects.none()
 
 
+class ChartOfAccountsTreeView(APIView):
+    """
+    The whole chart of accounts as a nested tree, read in a single query.
+    `root=<code>` returns only that account and its descendants.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+
+        accounts = ChartOfAccounts.objects.filter(company=user_company)
+        root_code = request.query_params.get('root')
+        if root_code:
+            root = accounts.filter(code=root_code).first()
+            if not root:
+                return Response({"error": "Account not found"}, status=404)
+            accounts = root.get_descendants(include_self=True)
+
+        accounts = accounts.values('id', 'code', 'name', 'account_type', 'parent_id', 'is_active')
+        return Response(build_account_tree(accounts))
+
+
 class JournalEntryListCreateView(generics.ListCreateAPIView):
     serializer_class = JournalEntrySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -56,6 +101,13 @@ class JournalEntryDetailView(generics.RetrieveUpdateDestroyAPIView):
             return JournalEntry.objects.filter(company=user_company)
         return JournalEntry.objects.none()
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        check_entry_editable(instance)
+        if instance.status == 'posted':
+            unpost_entry_balances(instance)
+        instance.delete()
+
 
 class TransactionListCreateView(generics.ListCreateAPIView):
     serializer_class = TransactionSerializer
@@ -67,11 +119,21 @@ class TransactionListCreateView(generics.ListCreateAPIView):
             return Transaction.objects.filter(journal_entry__company=user_company)
         return Transaction.objects.none()
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        # Transactions should ideally be created via JournalEntry, but if created directly,
-        # we need to ensure the journal_entry belongs to the user's company.
-        # For now, we'll assume the serializer validation handles the journal_entry validity.
-        serializer.save()
+        """Add a line to the `journal_entry` of the request, keeping the period balances of posted entries"""
+        try:
+            entry = JournalEntry.objects.filter(
+                company=self.request.user.active_company, pk=self.request.data.get('journal_entry') or None
+            ).first()
+        except (TypeError, ValueError):
+            entry = None
+        if entry is None:
+            raise ValidationError({"journal_entry": "Journal entry not found in your company"})
+        check_entry_editable(entry)
+        instance = serializer.save(journal_entry=entry)
+        if entry.status == 'posted':
+            update_period_balances(entry.company_id, entry.date, [(instance.account_id, instance.debit, instance.credit)])
 
 
 class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -84,12 +146,122 @@ class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
             return Transaction.objects.filter(journal_entry__company=user_company)
         return Transaction.objects.none()
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        entry = serializer.instance.journal_entry
+        check_entry_editable(entry)
+        old_line = (serializer.instance.account_id, serializer.instance.debit, serializer.instance.credit)
+        instance = serializer.save()
+        if entry.status == 'posted':
+            update_period_balances(entry.company_id, entry.date, [old_line], sign=-1)
+            update_period_balances(entry.company_id, entry.date, [(instance.account_id, instance.debit, instance.credit)])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        entry = instance.journal_entry
+        check_entry_editable(entry)
+        if entry.status == 'posted':
+            update_period_balances(entry.company_id, entry.date, [(instance.account_id, instance.debit, instance.credit)], sign=-1)
+        instance.delete()
+
+
+import csv
+import json
+from itertools import chain
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .services import (
+    get_account_balances, get_comparative_balances, add_months, month_start, month_end,
+    get_closed_year_ends, get_opening_date, opening_date_for, close_fiscal_year, PeriodCloseError,
+    iter_ledger_rows, import_journal_entries, parse_journal_entry_csv, parse_journal_entry_jsonl
+)
+
+
+REPORT_INTERVAL_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+MAX_REPORT_PERIODS = 36
+
+
+def get_date_param(request, name):
+    """Optional YYYY-MM-DD query parameter"""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({"error": f"Invalid {name}, expected YYYY-MM-DD"})
+    return parsed
+
+
+def get_periods_param(request):
+    """
+    Number of comparative columns and months per column, read from the
+    `periods` and `interval` (month, quarter or year) query parameters.
+    Returns None when no comparison was asked for.
+    """
+    periods = request.query_params.get('periods')
+    if not periods:
+        return None
+    try:
+        periods = int(periods)
+    except ValueError:
+        periods = 0
+    if not 1 <= periods <= MAX_REPORT_PERIODS:
+        raise ValidationError({"error": f"periods must be between 1 and {MAX_REPORT_PERIODS}"})
+
+    interval = request.query_params.get('interval', 'month')
+    if interval not in REPORT_INTERVAL_MONTHS:
+        raise ValidationError({"error": f"interval must be one of {', '.join(REPORT_INTERVAL_MONTHS)}"})
+    return periods, REPORT_INTERVAL_MONTHS[interval]
+
+
+def report_section(balances, account_type):
+    """Non-zero balances of one account type and their total"""
+    data = []
+    total = 0
+    for row in balances:
+        if row['account_type'] != account_type or row['balance'] == 0:
+            continue
+        data.append({
+            "name": row['name'],
+            "code": row['code'],
+            "balance": row['balance']
+        })
+        total += row['balance']
+    return data, total
+
+
+def comparative_section(columns, account_type):
+    """
+    Balances of one account type side by side, one value per column, for
+    accounts that are non-zero in at least one column
+    """
+    rows = {}
+    totals = [0] * len(columns)
+    for index, balances in enumerate(columns):
+        for row in balances:
+            if row['account_type'] != account_type or row['balance'] == 0:
+                continue
+            data = rows.setdefault(row['code'], {
+                "name": row['name'],
+                "code": row['code'],
+                "balances": [0] * len(columns)
+            })
+            data['balances'][index] = row['balance']
+            totals[index] += row['balance']
+    return [rows[code] for code in sorted(rows)], totals
 
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from django.db.models import Sum
 
 class BalanceSheetView(APIView):
+    """
+    Balance sheet of posted entries up to `as_of` (default: all entries).
+    With `periods` (and optional `interval`), returns that many columns
+    ending at `as_of` (default: today), each at the end of an earlier interval.
+    Each column starts from the opening entry of the last closed fiscal year.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
@@ -97,39 +269,42 @@ class BalanceSheetView(APIView):
         if not user_company:
             return Response({"error": "No active company"}, status=400)
 
-        accounts = ChartOfAccounts.objects.filter(company=user_company)
-        assets = accounts.filter(account_type='asset')
-        liabilities = accounts.filter(account_type='liability')
-        equity = accounts.filter(account_type='equity')
-
-        def get_balance(account_qs):
-            data = []
-            total = 0
-            for account in account_qs:
-                debit = Transaction.objects.filter(account=account).aggregate(Sum('debit'))['debit__sum'] or 0
-                credit = Transaction.objects.filter(account=account).aggregate(Sum('credit'))['credit__sum'] or 0
-                # For assets, normal balance is debit. For others, it depends, but let's simplify:
-                # Asset: Debit - Credit
-                # Liability/Equity: Credit - Debit
-                if account.account_type == 'asset':
-                    balance = debit - credit
-                else:
-                    balance = credit - debit
-                
-                if balance != 0:
-                    data.append({
-                        "name": account.name,
-                        "code": account.code,
-                        "balance": balance
-                    })
-                    total += balance
-            return data, total
-
-        assets_data, total_assets = get_balance(assets)
-        liabilities_data, total_liabilities = get_balance(liabilities)
-        equity_data, total_equity = get_balance(equity)
+        as_of = get_date_param(request, 'as_of')
+        comparison = get_periods_param(request)
+
+        if comparison is None:
+            opening_date = get_opening_date(user_company, as_of)
+            balances = get_account_balances(user_company, start_date=opening_date, end_date=as_of)
+            assets_data, total_assets = report_section(balances, 'asset')
+            liabilities_data, total_liabilities = report_section(balances, 'liability')
+            equity_data, total_equity = report_section(balances, 'equity')
+
+            return Response({
+                "as_of": as_of,
+                "assets": assets_data,
+                "total_assets": total_assets,
+                "liabilities": liabilities_data,
+                "total_liabilities": total_liabilities,
+                "equity": equity_data,
+                "total_equity": total_equity,
+            })
+
+        periods, months = comparison
+        as_of = as_of or timezone.localdate()
+        dates = [as_of] + [
+            month_end(add_months(month_start(as_of), -months * index))
+            for index in range(1, periods)
+        ]
+        closed_year_ends = get_closed_year_ends(user_company)
+        columns = get_comparative_balances(
+            user_company, [(opening_date_for(closed_year_ends, day), day) for day in dates]
+        )
+        assets_data, total_assets = comparative_section(columns, 'asset')
+        liabilities_data, total_liabilities = comparative_section(columns, 'liability')
+        equity_data, total_equity = comparative_section(columns, 'equity')
 
         return Response({
+            "columns": [{"as_of": day} for day in dates],
             "assets": assets_data,
             "total_assets": total_assets,
             "liabilities": liabilities_data,
@@ -139,6 +314,12 @@ class BalanceSheetView(APIView):
         })
 
 class IncomeStatementView(APIView):
+    """
+    Income statement of posted entries between `start_date` and `end_date`
+    (both optional). With `periods` (and optional `interval`), returns that
+    many consecutive intervals ending at `end_date` (default: today).
+    Fiscal year closing entries are left out.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
@@ -146,46 +327,243 @@ class IncomeStatementView(APIView):
         if not user_company:
             return Response({"error": "No active company"}, status=400)
 
-        accounts = ChartOfAccounts.objects.filter(company=user_company)
-        revenue = accounts.filter(account_type='revenue')
-        expenses = accounts.filter(account_type='expense')
-
-        def get_balance(account_qs):
-            data = []
-            total = 0
-            for account in account_qs:
-                debit = Transaction.objects.filter(account=account).aggregate(Sum('debit'))['debit__sum'] or 0
-                credit = Transaction.objects.filter(account=account).aggregate(Sum('credit'))['credit__sum'] or 0
-                
-                # Revenue: Credit - Debit
-                # Expense: Debit - Credit
-                if account.account_type == 'revenue':
-                    balance = credit - debit
-                else:
-                    balance = debit - credit
-                
-                if balance != 0:
-                    data.append({
-                        "name": account.name,
-                        "code": account.code,
-                        "balance": balance
-                    })
-                    total += balance
-            return data, total
-
-        revenue_data, total_revenue = get_balance(revenue)
-        expenses_data, total_expenses = get_balance(expenses)
-        net_income = total_revenue - total_expenses
+        start_date = get_date_param(request, 'start_date')
+        end_date = get_date_param(request, 'end_date')
+        comparison = get_periods_param(request)
+
+        if comparison is None:
+            balances = get_account_balances(
+                user_company, start_date=start_date, end_date=end_date, exclude_entry_types=('closing',)
+            )
+            revenue_data, total_revenue = report_section(balances, 'revenue')
+            expenses_data, total_expenses = report_section(balances, 'expense')
+            net_income = total_revenue - total_expenses
+
+            return Response({
+                "start_date": start_date,
+                "end_date": end_date,
+                "revenue": revenue_data,
+                "total_revenue": total_revenue,
+                "expenses": expenses_data,
+                "total_expenses": total_expenses,
+                "net_income": net_income
+            })
+
+        periods, months = comparison
+        end_date = end_date or timezone.localdate()
+        ranges = []
+        for index in range(periods):
+            last_month = add_months(month_start(end_date), -months * index)
+            ranges.append((
+                add_months(last_month, -(months - 1)),
+                end_date if index == 0 else month_end(last_month),
+            ))
+        columns = get_comparative_balances(user_company, ranges, exclude_entry_types=('closing',))
+        revenue_data, total_revenue = comparative_section(columns, 'revenue')
+        expenses_data, total_expenses = comparative_section(columns, 'expense')
 
         return Response({
+            "columns": [{"start_date": start, "end_date": end} for start, end in ranges],
             "revenue": revenue_data,
             "total_revenue": total_revenue,
             "expenses": expenses_data,
             "total_expenses": total_expenses,
-            "net_income": net_income
+            "net_income": [revenue - expense for revenue, expense in zip(total_revenue, total_expenses)]
+        })
+
+
+class TrialBalanceView(APIView):
+    """
+    Debit/credit totals of every account, with parent accounts rolled up.
+    Optional filters: start_date, end_date and status (comma separated,
+    defaults to posted entries only). Without start_date, balances start
+    from the opening entry of the last closed fiscal year.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+
+        filters = {
+            'start_date': get_date_param(request, 'start_date'),
+            'end_date': get_date_param(request, 'end_date'),
+        }
+        if not filters['start_date']:
+            filters['start_date'] = get_opening_date(user_company, filters['end_date'])
+        statuses = request.query_params.get('status')
+        if statuses:
+            filters['statuses'] = [s for s in statuses.split(',') if s]
+
+        balances = get_account_balances(user_company, **filters)
+
+        return Response({
+            "accounts": balances,
+            "total_debit": sum(row['debit'] for row in balances),
+            "total_credit": sum(row['credit'] for row in balances),
         })
 
 
+class JournalEntryBulkImportView(APIView):
+    """
+    Import a batch of journal entries. The batch is either a JSON array,
+    a JSON lines body (application/x-ndjson), a CSV body (text/csv) or an
+    uploaded `file`; `input=csv|jsonl` overrides the detected format.
+    With `partial=true` valid entries are saved even if others fail.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+
+        content_type = request.content_type.split(';')[0].strip()
+        input_format = request.query_params.get('input')
+        if content_type == 'application/json':
+            data = request.data
+            entries = data if isinstance(data, list) else data.get('entries')
+            if not isinstance(entries, list):
+                return Response({"error": "Expected a list of journal entries"}, status=400)
+        else:
+            if content_type.startswith('multipart/'):
+                lines = request.FILES.get('file')
+                if not lines:
+                    return Response({"error": "No file uploaded"}, status=400)
+                detected = 'csv' if lines.name.lower().endswith('.csv') else 'jsonl'
+            else:
+                lines = request.body.splitlines()
+                detected = 'csv' if content_type == 'text/csv' else 'jsonl'
+            input_format = input_format or detected
+            if input_format == 'csv':
+                entries = parse_journal_entry_csv(lines)
+            elif input_format == 'jsonl':
+                entries = parse_journal_entry_jsonl(lines)
+            else:
+                return Response({"error": "input must be csv or jsonl"}, status=400)
+
+        allow_partial = request.query_params.get('partial') in ('1', 'true')
+        created, errors = import_journal_entries(
+            user_company, entries, user=request.user, allow_partial=allow_partial
+        )
+        return Response({
+            "created": created,
+            "errors": errors,
+        }, status=400 if errors and not created else 201)
+
+
+LEDGER_EXPORT_FIELDS = [
+    'entry_number', 'date', 'account_code', 'account_name', 'description', 'debit', 'credit', 'balance'
+]
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+    def write(self, value):
+        return value
+
+
+class LedgerExportView(APIView):
+    """
+    Stream the posted general ledger as CSV (default) or NDJSON, selected
+    with `output`. Optional filters: start_date, end_date and account
+    (comma separated account ids).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+
+        output = request.query_params.get('output', 'csv')
+        if output not in ('csv', 'ndjson'):
+            return Response({"error": "output must be csv or ndjson"}, status=400)
+
+        account_ids = request.query_params.get('account')
+        if account_ids:
+            try:
+                account_ids = [int(value) for value in account_ids.split(',') if value]
+            except ValueError:
+                return Response({"error": "account must be a comma separated list of ids"}, status=400)
+
+        rows = iter_ledger_rows(
+            user_company,
+            start_date=get_date_param(request, 'start_date'),
+            end_date=get_date_param(request, 'end_date'),
+            account_ids=account_ids,
+        )
+
+        if output == 'csv':
+            writer = csv.writer(Echo())
+            lines = chain(
+                [writer.writerow(LEDGER_EXPORT_FIELDS)],
+                (writer.writerow([row[field] for field in LEDGER_EXPORT_FIELDS]) for row in rows),
+            )
+            response = StreamingHttpResponse(lines, content_type='text/csv; charset=utf-8')
+        else:
+            response = StreamingHttpResponse(
+                (json.dumps(row, default=str, ensure_ascii=False) + '\n' for row in rows),
+                content_type='application/x-ndjson; charset=utf-8'
+            )
+        response['Content-Disposition'] = f'attachment; filename="ledger.{output}"'
+        return response
+
+
+class FiscalYearListCreateView(generics.ListCreateAPIView):
+    serializer_class = FiscalYearSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if user_company:
+            return FiscalYear.objects.filter(company=user_company)
+        return FiscalYear.objects.none()
+
+    def perform_create(self, serializer):
+        user_company = self.request.user.active_company
+        if user_company:
+            serializer.save(company=user_company)
+
+
+class FiscalYearDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = FiscalYearSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if user_company:
+            return FiscalYear.objects.filter(company=user_company)
+        return FiscalYear.objects.none()
+
+    def perform_destroy(self, instance):
+        if instance.status == 'closed':
+            raise ValidationError({"error": "Closed fiscal years cannot be deleted"})
+        instance.delete()
+
+
+class FiscalYearCloseView(APIView):
+    """Close a fiscal year, posting its closing and opening entries"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+
+        fiscal_year = FiscalYear.objects.filter(company=user_company, pk=pk).first()
+        if not fiscal_year:
+            return Response({"error": "Fiscal year not found"}, status=404)
+
+        try:
+            fiscal_year = close_fiscal_year(fiscal_year, user=request.user)
+        except PeriodCloseError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response(FiscalYearSerializer(fiscal_year).data)
+
+
 class CreateDefaultChartView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
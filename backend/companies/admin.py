@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Company, CompanyMembership
+from .models import Company, CompanyMembership, DocumentSequence
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
@@ -15,3 +15,9 @@ class CompanyMembershipAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'company__name')
     readonly_fields = ('joined_at',)
 
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ('company', 'document_type', 'prefix', 'format', 'next_number')
+    list_filter = ('document_type',)
+    search_fields = ('company__name', 'prefix')
+    readonly_fields = ('created_at', 'updated_at')
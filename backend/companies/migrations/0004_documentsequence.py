@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_create_memberships_for_existing_companies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_type', models.CharField(choices=[('pos_sale', 'فروش صندوق'), ('quotation', 'پیش\u200cفاکتور'), ('sales_order', 'سفارش فروش'), ('invoice', 'فاکتور'), ('payment', 'پرداخت'), ('purchase_order', 'سفارش خرید'), ('purchase_receipt', 'رسید خرید'), ('delivery', 'حواله'), ('journal_entry', 'سند حسابداری'), ('ecommerce_order', 'سفارش فروشگاه')], max_length=30, verbose_name='نوع سند')),
+                ('prefix', models.CharField(blank=True, default='', max_length=20, verbose_name='پیشوند')),
+                ('format', models.CharField(default='{prefix}-{number}', help_text='متغیرها: {prefix}، {number}، {year}، {date:%Y%m%d}', max_length=100, verbose_name='قالب')),
+                ('padding', models.PositiveSmallIntegerField(default=5, verbose_name='تعداد ارقام')),
+                ('next_number', models.PositiveBigIntegerField(default=1, verbose_name='شماره بعدی')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_sequences', to='companies.company', verbose_name='شرکت')),
+            ],
+            options={
+                'verbose_name': 'شماره\u200cگذاری اسناد',
+                'verbose_name_plural': 'شماره\u200cگذاری اسناد',
+                'ordering': ['document_type'],
+                'unique_together': {('company', 'document_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='costing_method',
+            field=models.CharField(choices=[('fifo', 'اولین ورود، اولین خروج'), ('average', 'میانگین موزون')], default='fifo', max_length=20, verbose_name='روش ارزیابی موجودی'),
+        ),
+    ]
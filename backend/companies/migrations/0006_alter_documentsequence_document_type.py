@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0005_company_costing_method'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentsequence',
+            name='document_type',
+            field=models.CharField(choices=[('pos_sale', 'فروش صندوق'), ('quotation', 'پیش\u200cفاکتور'), ('sales_order', 'سفارش فروش'), ('invoice', 'فاکتور'), ('payment', 'پرداخت'), ('purchase_order', 'سفارش خرید'), ('purchase_receipt', 'رسید خرید'), ('delivery', 'حواله'), ('journal_entry', 'سند حسابداری'), ('ecommerce_order', 'سفارش فروشگاه'), ('stock_count', 'شمارش انبار')], max_length=30, verbose_name='نوع سند'),
+        ),
+    ]
@@ -27,6 +27,18 @@ class Company(models.Model):
         verbose_name='شماره ثبت'
     )
     
+    # Inventory
+    COSTING_METHOD_CHOICES = [
+        ('fifo', 'اولین ورود، اولین خروج'),
+        ('average', 'میانگین موزون'),
+    ]
+    costing_method = models.CharField(
+        max_length=20,
+        choices=COSTING_METHOD_CHOICES,
+        default='fifo',
+        verbose_name='روش ارزیابی موجودی'
+    )
+
     # Status
     is_active = models.BooleanField(default=True, verbose_name='فعال')
     
@@ -95,3 +107,60 @@ class CompanyMembership(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.company.name} ({self.get_role_display()})"
 
+
+
+class DocumentSequence(models.Model):
+    """
+    Per-company counter used to number documents (sales, invoices, orders, ...)
+    """
+    DOCUMENT_TYPE_CHOICES = [
+        ('pos_sale', 'فروش صندوق'),
+        ('quotation', 'پیش‌فاکتور'),
+        ('sales_order', 'سفارش فروش'),
+        ('invoice', 'فاکتور'),
+        ('payment', 'پرداخت'),
+        ('purchase_order', 'سفارش خرید'),
+        ('purchase_receipt', 'رسید خرید'),
+        ('delivery', 'حواله'),
+        ('journal_entry', 'سند حسابداری'),
+        ('ecommerce_order', 'سفارش فروشگاه'),
+        ('stock_count', 'شمارش انبار'),
+        ('stock_transfer', 'انتقال بین انبارها'),
+    ]
+
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='document_sequences',
+        verbose_name='شرکت'
+    )
+    document_type = models.CharField(max_length=30, choices=DOCUMENT_TYPE_CHOICES, verbose_name='نوع سند')
+    prefix = models.CharField(max_length=20, blank=True, default='', verbose_name='پیشوند')
+    format = models.CharField(
+        max_length=100,
+        default='{prefix}-{number}',
+        verbose_name='قالب',
+        help_text='متغیرها: {prefix}، {number}، {year}، {date:%Y%m%d}'
+    )
+    padding = models.PositiveSmallIntegerField(default=5, verbose_name='تعداد ارقام')
+    next_number = models.PositiveBigIntegerField(default=1, verbose_name='شماره بعدی')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+
+    class Meta:
+        verbose_name = 'شماره‌گذاری اسناد'
+        verbose_name_plural = 'شماره‌گذاری اسناد'
+        ordering = ['document_type']
+        unique_together = [('company', 'document_type')]
+
+    def __str__(self):
+        return f"{self.company.name} - {self.get_document_type_display()}"
+
+    def render(self, number, date):
+        """Format a sequence number for a document dated `date`"""
+        return self.format.format(
+            prefix=self.prefix,
+            number=str(number).zfill(self.padding),
+            year=date.year,
+            date=date,
+        )
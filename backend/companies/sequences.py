@@ -0,0 +1,95 @@
+"""
+Gap-free document numbering backed by DocumentSequence rows
+"""
+import datetime
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import DocumentSequence
+
+
+# Prefix and format of sequences created on first use
+SEQUENCE_DEFAULTS = {
+    'pos_sale': ('POS', '{prefix}-{date:%Y%m%d}-{number}', 4),
+    'quotation': ('QT', '{prefix}-{number}', 5),
+    'sales_order': ('SO', '{prefix}-{number}', 5),
+    'invoice': ('INV', '{prefix}-{number}', 5),
+    'payment': ('PAY', '{prefix}-{number}', 5),
+    'purchase_order': ('PO', '{prefix}-{number}', 5),
+    'purchase_receipt': ('GRN', '{prefix}-{number}', 5),
+    'delivery': ('DLV', '{prefix}-{number}', 5),
+    'journal_entry': ('JE', '{prefix}-{number}', 5),
+    'ecommerce_order': ('ORD', '{prefix}-{number}', 5),
+    'stock_count': ('CNT', '{prefix}-{number}', 5),
+    'stock_transfer': ('TRF', '{prefix}-{number}', 5),
+}
+
+
+def get_sequence_defaults(document_type):
+    prefix, format, padding = SEQUENCE_DEFAULTS[document_type]
+    return {'prefix': prefix, 'format': format, 'padding': padding}
+
+
+def lock_sequence(company_id, document_type):
+    """Fetch the sequence row with a row lock, creating it on first use"""
+    sequences = DocumentSequence.objects.select_for_update()
+    try:
+        return sequences.get(company_id=company_id, document_type=document_type)
+    except DocumentSequence.DoesNotExist:
+        pass
+    try:
+        with transaction.atomic():
+            DocumentSequence.objects.create(
+                company_id=company_id,
+                document_type=document_type,
+                **get_sequence_defaults(document_type)
+            )
+    except IntegrityError:
+        # Created concurrently by another transaction
+        pass
+    return sequences.get(company_id=company_id, document_type=document_type)
+
+
+@transaction.atomic
+def reserve_numbers_for(company_id, document_type, dates):
+    """
+    Take one number per entry of `dates` from a sequence and return them
+    formatted for those dates. The sequence row stays locked until the
+    caller's transaction ends, so numbers are only consumed if the
+    documents are saved.
+    """
+    sequence = lock_sequence(company_id, document_type)
+    first = sequence.next_number
+    DocumentSequence.objects.filter(pk=sequence.pk).update(next_number=F('next_number') + len(dates))
+    today = timezone.localdate()
+    return [sequence.render(first + offset, date or today) for offset, date in enumerate(dates)]
+
+
+def reserve_numbers(company_id, document_type, count=1, date=None):
+    """Take `count` consecutive numbers from a sequence, formatted for `date`"""
+    return reserve_numbers_for(company_id, document_type, [date] * count)
+
+
+def next_document_number(company_id, document_type, date=None):
+    return reserve_numbers(company_id, document_type, 1, date)[0]
+
+
+class NumberedDocumentMixin:
+    """
+    Model mixin assigning the next number of `document_type` to
+    `number_field` when a document is saved without one. Numbering and the
+    insert share one transaction so a failed save does not leave a gap.
+    """
+    document_type = None
+    number_field = None
+
+    def save(self, *args, **kwargs):
+        if getattr(self, self.number_field):
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            date = getattr(self, 'date', None)
+            if not isinstance(date, datetime.date):
+                date = None
+            setattr(self, self.number_field, next_document_number(self.company_id, self.document_type, date))
+            super().save(*args, **kwargs)
@@ -1,5 +1,6 @@
+from datetime import date
 from rest_framework import serializers
-from .models import Company, CompanyMembership
+from .models import Company, CompanyMembership, DocumentSequence
 
 class CompanySerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,3 +18,38 @@ class CompanyMembershipSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('joined_at',)
 
+
+class DocumentSequenceSerializer(serializers.ModelSerializer):
+    document_type_display = serializers.CharField(source='get_document_type_display', read_only=True)
+    preview = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DocumentSequence
+        fields = '__all__'
+        read_only_fields = ('company', 'created_at', 'updated_at')
+
+    def get_preview(self, obj):
+        return obj.render(obj.next_number, date.today())
+
+    def validate_document_type(self, value):
+        company = self.instance.company if self.instance else self.context['request'].user.active_company
+        sequences = DocumentSequence.objects.filter(company=company, document_type=value)
+        if self.instance:
+            sequences = sequences.exclude(pk=self.instance.pk)
+        if sequences.exists():
+            raise serializers.ValidationError("A sequence for this document type already exists")
+        return value
+
+    def validate_format(self, value):
+        try:
+            value.format(prefix='', number='1', year=2000, date=date(2000, 1, 1))
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+            raise serializers.ValidationError(f"Invalid format: {e}")
+        if '{number' not in value:
+            raise serializers.ValidationError("Format must contain {number}")
+        return value
+
+    def validate_next_number(self, value):
+        if self.instance and value < self.instance.next_number:
+            raise serializers.ValidationError("Sequences cannot be moved backwards")
+        return value
@@ -1,3 +1,44 @@
+import datetime
+from django.db import transaction
 from django.test import TestCase
+from rest_framework.test import APIClient
+from accounts.models import User
+from inventory.models import StockCount
+from .models import Company
+from .sequences import next_document_number, reserve_numbers
 
-# Create your tests here.
+
+class DocumentSequenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.user.active_company = self.company
+        self.user.save()
+
+    def test_numbers_are_consecutive(self):
+        self.assertEqual(reserve_numbers(self.company.id, 'invoice', 2), ['INV-00001', 'INV-00002'])
+        self.assertEqual(next_document_number(self.company.id, 'invoice'), 'INV-00003')
+        self.assertEqual(
+            next_document_number(self.company.id, 'pos_sale', datetime.date(2026, 1, 31)), 'POS-20260131-0001'
+        )
+
+    def test_rolled_back_numbers_are_reused(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                next_document_number(self.company.id, 'invoice')
+                raise RuntimeError('document not saved')
+        self.assertEqual(next_document_number(self.company.id, 'invoice'), 'INV-00001')
+
+    def test_documents_are_numbered_on_save(self):
+        first = StockCount.objects.create(company=self.company, date=datetime.date(2026, 1, 31))
+        second = StockCount.objects.create(company=self.company, date=datetime.date(2026, 1, 31), count_number='MANUAL-1')
+        third = StockCount.objects.create(company=self.company, date=datetime.date(2026, 1, 31))
+        self.assertEqual([first.count_number, second.count_number, third.count_number], ['CNT-00001', 'MANUAL-1', 'CNT-00002'])
+
+    def test_invalid_formats_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for value in ('{date.foo}-{number}', '{prefix[x]}-{number}', '{year:%Y}-{number}', '{missing}-{number}', '{prefix}'):
+            response = client.post('/api/companies/sequences/', {'document_type': 'invoice', 'format': value}, format='json')
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('format', response.json())
@@ -4,7 +4,10 @@ from .views import (
     CompanyDetailView,
     set_active_company,
     get_active_company,
-    CompanyUsersView
+    CompanyUsersView,
+    DocumentSequenceListCreateView,
+    DocumentSequenceDetailView,
+    reserve_document_numbers,
 )
 
 urlpatterns = [
@@ -13,5 +16,8 @@ urlpatterns = [
     path('<int:pk>/set-active/', set_active_company, name='company-set-active'),
     path('active/', get_active_company, name='company-get-active'),
     path('active/users/', CompanyUsersView.as_view(), name='company-active-users'),
+    path('sequences/', DocumentSequenceListCreateView.as_view(), name='document-sequence-list-create'),
+    path('sequences/<int:pk>/', DocumentSequenceDetailView.as_view(), name='document-sequence-detail'),
+    path('sequences/<str:document_type>/reserve/', reserve_document_numbers, name='document-sequence-reserve'),
 ]
 
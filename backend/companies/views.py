@@ -1,8 +1,9 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from .models import Company, CompanyMembership
-from .serializers import CompanySerializer, CompanyMembershipSerializer
+from .models import Company, CompanyMembership, DocumentSequence
+from .serializers import CompanySerializer, CompanyMembershipSerializer, DocumentSequenceSerializer
+from .sequences import get_sequence_defaults, reserve_numbers
 
 class CompanyListCreateView(generics.ListCreateAPIView):
     serializer_class = CompanySerializer
@@ -108,3 +109,54 @@ class CompanyUsersView(generics.ListAPIView):
             company_memberships__is_active=True
         ).distinct()
 
+
+class DocumentSequenceListCreateView(generics.ListCreateAPIView):
+    serializer_class = DocumentSequenceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if user_company:
+            return DocumentSequence.objects.filter(company=user_company)
+        return DocumentSequence.objects.none()
+
+    def perform_create(self, serializer):
+        user_company = self.request.user.active_company
+        if user_company:
+            defaults = get_sequence_defaults(serializer.validated_data['document_type'])
+            defaults.update(serializer.validated_data)
+            serializer.save(company=user_company, **defaults)
+
+
+class DocumentSequenceDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = DocumentSequenceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if user_company:
+            return DocumentSequence.objects.filter(company=user_company)
+        return DocumentSequence.objects.none()
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def reserve_document_numbers(request, document_type):
+    """
+    Pre-allocate a block of document numbers, e.g. for a register that
+    numbers its sales while offline
+    """
+    if not request.user.active_company:
+        return Response({'error': 'No active company'}, status=status.HTTP_400_BAD_REQUEST)
+    if document_type not in dict(DocumentSequence.DOCUMENT_TYPE_CHOICES):
+        return Response({'error': f'Unknown document type: {document_type}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        count = int(request.data.get('count', 1))
+    except (TypeError, ValueError):
+        count = 0
+    if not 1 <= count <= 1000:
+        return Response({'error': 'count must be between 1 and 1000'}, status=status.HTTP_400_BAD_REQUEST)
+
+    numbers = reserve_numbers(request.user.active_company.id, document_type, count)
+    return Response({'document_type': document_type, 'numbers': numbers})
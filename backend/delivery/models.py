@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from companies.models import Company
+from companies.sequences import NumberedDocumentMixin
 from contacts.models import Contact
 from sales.models import SalesOrder
 from inventory.models import Item
@@ -36,7 +37,7 @@ class Driver(models.Model):
         return f"{self.name} - {self.phone}"
 
 
-class Delivery(models.Model):
+class Delivery(NumberedDocumentMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'در انتظار'),
         ('assigned', 'تخصیص داده شده'),
@@ -47,8 +48,11 @@ class Delivery(models.Model):
         ('failed', 'ناموفق'),
     ]
 
+    document_type = 'delivery'
+    number_field = 'delivery_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='deliveries', verbose_name='شرکت')
-    delivery_number = models.CharField(max_length=100, verbose_name='شماره حواله')
+    delivery_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره حواله')
     sales_order = models.ForeignKey(SalesOrder, on_delete=models.SET_NULL, null=True, blank=True, related_name='deliveries', verbose_name='سفارش فروش')
     customer = models.ForeignKey(Contact, on_delete=models.PROTECT, related_name='deliveries', verbose_name='مشتری')
     driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, blank=True, related_name='deliveries', verbose_name='راننده')
@@ -1,7 +1,10 @@
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
+from inventory.services import InsufficientStockError
+from sales.services import sync_sales_order_reservations
 from .models import Driver, Delivery, DeliveryItem, DeliveryRoute, RouteDelivery
 from .serializers import (
     DriverSerializer, 
@@ -73,12 +76,23 @@ class DeliveryViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
-        """Update delivery status"""
+        """Update delivery status; delivering completes the linked sales order"""
         delivery = self.get_object()
         new_status = request.data.get('status')
         if new_status in dict(Delivery.STATUS_CHOICES):
-            delivery.status = new_status
-            delivery.save()
+            try:
+                with transaction.atomic():
+                    delivery.status = new_status
+                    delivery.save()
+                    # Delivering the goods consumes the sales order's stock reservations
+                    order = delivery.sales_order
+                    if new_status == 'delivered' and order and order.status != 'delivered':
+                        previous_status = order.status
+                        order.status = 'delivered'
+                        order.save(update_fields=['status', 'updated_at'])
+                        sync_sales_order_reservations(order, previous_status, request.user)
+            except InsufficientStockError as e:
+                return Response({'error': str(e)}, status=400)
             return Response({'status': 'updated'})
         return Response({'error': 'invalid status'}, status=400)
 
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0003_alter_order_order_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_held',
+            field=models.BooleanField(default=False, verbose_name='موجودی کسر شده'),
+        ),
+    ]
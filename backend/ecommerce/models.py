@@ -1,5 +1,6 @@
 from django.db import models
 from companies.models import Company
+from companies.sequences import NumberedDocumentMixin
 from contacts.models import Contact
 
 
@@ -50,7 +51,7 @@ class Product(models.Model):
         return self.name
 
 
-class Order(models.Model):
+class Order(NumberedDocumentMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'در انتظار'),
         ('processing', 'در حال پردازش'),
@@ -59,8 +60,11 @@ class Order(models.Model):
         ('cancelled', 'لغو شده'),
     ]
 
+    document_type = 'ecommerce_order'
+    number_field = 'order_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='ecommerce_orders', verbose_name='شرکت')
-    order_number = models.CharField(max_length=100, verbose_name='شماره سفارش')
+    order_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره سفارش')
     customer = models.ForeignKey(Contact, on_delete=models.PROTECT, related_name='ecommerce_orders', verbose_name='مشتری')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='وضعیت')
     subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='جمع جزء')
@@ -70,6 +74,7 @@ class Order(models.Model):
     shipping_address = models.JSONField(blank=True, null=True, verbose_name='آدرس ارسال')
     billing_address = models.JSONField(blank=True, null=True, verbose_name='آدرس صورتحساب')
     notes = models.TextField(blank=True, null=True, verbose_name='یادداشت‌ها')
+    stock_held = models.BooleanField(default=False, verbose_name='موجودی کسر شده')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
 
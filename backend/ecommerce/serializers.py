@@ -30,7 +30,7 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('stock_held', 'created_at', 'updated_at')
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -39,4 +39,17 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
 
+    def validate(self, data):
+        company = self.context['request'].user.active_company
+        order = data.get('order')
+        if order is not None:
+            if not company or order.company_id != company.id:
+                raise serializers.ValidationError({'order': "Order does not belong to your company"})
+            if self.instance and order.pk != self.instance.order_id:
+                raise serializers.ValidationError({'order': "Lines cannot be moved to another order"})
+        product = data.get('product')
+        if product is not None and (not company or product.company_id != company.id):
+            raise serializers.ValidationError({'product': "Product does not belong to your company"})
+        return data
+
 
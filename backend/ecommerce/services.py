@@ -0,0 +1,91 @@
+"""
+Stock handling for online orders
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from .models import Order, OrderItem, Product
+
+
+# Orders in these statuses have taken their products out of stock
+STOCK_HOLDING_STATUSES = ('processing', 'shipped', 'delivered')
+
+
+class OutOfStockError(Exception):
+    def __init__(self, product_id, required):
+        self.product_id = product_id
+        self.required = required
+        super().__init__(f"Product {product_id} does not have {required} in stock")
+
+
+def _order_quantities(order):
+    return dict(
+        OrderItem.objects.filter(order=order).order_by()
+        .values('product_id').annotate(total_quantity=Sum('quantity')).values_list('product_id', 'total_quantity')
+    )
+
+
+def _take_stock(quantities):
+    # Ascending product order keeps row locks in the same order across checkouts
+    for product_id, quantity in sorted(quantities.items()):
+        taken = Product.objects.filter(pk=product_id, stock_quantity__gte=quantity).update(
+            stock_quantity=F('stock_quantity') - quantity
+        )
+        if not taken:
+            raise OutOfStockError(product_id, quantity)
+
+
+def _give_back_stock(quantities):
+    if quantities:
+        Product.objects.filter(pk__in=quantities).update(
+            stock_quantity=F('stock_quantity') + Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                output_field=IntegerField(),
+            )
+        )
+
+
+@transaction.atomic
+def sync_order_stock(order):
+    """
+    Take an order's products out of Product.stock_quantity when it is
+    confirmed (moves to processing) and put them back when it is cancelled
+    or returned to pending. Each product is decremented with a conditional
+    UPDATE (stock_quantity >= n), so concurrent checkouts cannot oversell
+    and only contend on the products they share. Raises OutOfStockError,
+    undoing the order's decrements, when a product runs out.
+    """
+    holds = order.status in STOCK_HOLDING_STATUSES
+    if holds == order.stock_held:
+        return
+
+    quantities = _order_quantities(order)
+    if holds:
+        _take_stock(quantities)
+    else:
+        _give_back_stock(quantities)
+
+    order.stock_held = holds
+    Order.objects.filter(pk=order.pk).update(stock_held=holds)
+
+
+def held_quantities(order):
+    """{product_id: quantity} an order has taken out of stock; lock the order first"""
+    return _order_quantities(order) if order.stock_held else {}
+
+
+@transaction.atomic
+def refresh_order_stock(order, previous):
+    """
+    After the lines of an order holding stock changed, take or give back
+    the difference to `previous`, its held_quantities() before the change.
+    Raises OutOfStockError when a product runs out.
+    """
+    if not order.stock_held:
+        return
+    current = _order_quantities(order)
+    deltas = {
+        product_id: current.get(product_id, 0) - previous.get(product_id, 0)
+        for product_id in current.keys() | previous.keys()
+    }
+    _take_stock({product_id: delta for product_id, delta in deltas.items() if delta > 0})
+    _give_back_stock({product_id: -delta for product_id, delta in deltas.items() if delta < 0})
@@ -1,3 +1,77 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
+from accounts.models import User
+from companies.models import Company
+from contacts.models import Contact
+from .models import Order, OrderItem, Product
 
-# Create your tests here.
+
+class OrderStockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('seller', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.user.active_company = self.company
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Contact.objects.create(company=self.company, name='Buyer')
+        self.product = Product.objects.create(
+            company=self.company, name='Mug', slug='mug', sku='MUG', price=10, stock_quantity=10
+        )
+        self.order = Order.objects.create(company=self.company, customer=self.customer)
+        self.line = OrderItem.objects.create(order=self.order, product=self.product, quantity=3, unit_price=10, total=30)
+
+    def set_status(self, status):
+        return self.client.patch(f'/api/ecommerce/orders/{self.order.id}/', {'status': status}, format='json')
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity
+
+    def test_line_changes_follow_held_stock(self):
+        self.set_status('processing')
+        self.assertEqual(self.stock(), 7)
+
+        response = self.client.post('/api/ecommerce/order-items/', {
+            'order': self.order.id, 'product': self.product.id, 'quantity': 2, 'unit_price': '10', 'total': '20',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(), 5)
+
+        self.client.patch(f'/api/ecommerce/order-items/{self.line.id}/', {'quantity': 1}, format='json')
+        self.assertEqual(self.stock(), 7)
+
+        self.client.delete(f"/api/ecommerce/order-items/{response.json()['id']}/")
+        self.assertEqual(self.stock(), 9)
+
+        self.set_status('cancelled')
+        self.assertEqual(self.stock(), 10)
+
+    def test_line_change_cannot_oversell(self):
+        self.set_status('processing')
+        response = self.client.patch(f'/api/ecommerce/order-items/{self.line.id}/', {'quantity': 20}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.line.refresh_from_db()
+        self.assertEqual(self.line.quantity, 3)
+        self.assertEqual(self.stock(), 7)
+
+    def test_pending_order_lines_do_not_touch_stock(self):
+        self.client.patch(f'/api/ecommerce/order-items/{self.line.id}/', {'quantity': 5}, format='json')
+        self.assertEqual(self.stock(), 10)
+
+    def test_lines_are_scoped_to_company(self):
+        other_owner = User.objects.create_user('other', password='secret')
+        other = Company.objects.create(owner=other_owner, name='Other')
+        other_order = Order.objects.create(
+            company=other, customer=Contact.objects.create(company=other, name='Someone')
+        )
+        self.assertEqual(self.client.get(f'/api/ecommerce/order-items/{self.line.id}/').status_code, 200)
+        response = self.client.post('/api/ecommerce/order-items/', {
+            'order': other_order.id, 'product': self.product.id, 'quantity': 1, 'unit_price': '10', 'total': '10',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        other_owner.active_company = other
+        other_owner.save()
+        self.client.force_authenticate(other_owner)
+        self.assertEqual(self.client.get(f'/api/ecommerce/order-items/{self.line.id}/').status_code, 404)
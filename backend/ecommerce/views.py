@@ -1,9 +1,30 @@
-from rest_framework import generics, permissions
+from django.db import transaction
+from rest_framework import generics, permissions, serializers
 from .models import Category, Product, Order, OrderItem
 from .serializers import (
     CategorySerializer, ProductSerializer, OrderSerializer, 
     OrderItemSerializer, MarketplaceProductSerializer
 )
+from .services import OutOfStockError, held_quantities, refresh_order_stock, sync_order_stock
+
+
+def sync_stock(order):
+    try:
+        sync_order_stock(order)
+    except OutOfStockError as e:
+        raise serializers.ValidationError({'non_field_errors': [str(e)]})
+
+
+def refresh_stock(order_id, change):
+    """Apply `change()` to an order's lines, keeping the stock it holds in line with them"""
+    order = Order.objects.select_for_update().get(pk=order_id)
+    previous = held_quantities(order)
+    result = change()
+    try:
+        refresh_order_stock(order, previous)
+    except OutOfStockError as e:
+        raise serializers.ValidationError({'non_field_errors': [str(e)]})
+    return result
 
 
 class CategoryListCreateView(generics.ListCreateAPIView):
@@ -70,10 +91,11 @@ class OrderListCreateView(generics.ListCreateAPIView):
             return Order.objects.filter(company=user_company)
         return Order.objects.none()
 
+    @transaction.atomic
     def perform_create(self, serializer):
         user_company = self.request.user.active_company
         if user_company:
-            serializer.save(company=user_company)
+            sync_stock(serializer.save(company=user_company))
 
 
 class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -86,14 +108,28 @@ class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
             return Order.objects.filter(company=user_company)
         return Order.objects.none()
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """Confirming an order takes its stock; cancelling it gives the stock back"""
+        sync_stock(serializer.save())
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.status = 'cancelled'
+        sync_order_stock(instance)
+        instance.delete()
+
 
 class OrderItemListCreateView(generics.ListCreateAPIView):
     serializer_class = OrderItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return OrderItem.objects.all()
+        return OrderItem.objects.filter(order__company=self.request.user.active_company)
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        refresh_stock(serializer.validated_data['order'].pk, serializer.save)
 
 
 class OrderItemDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -101,7 +137,15 @@ class OrderItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return OrderItem.objects.all()
+        return OrderItem.objects.filter(order__company=self.request.user.active_company)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        refresh_stock(serializer.instance.order_id, serializer.save)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        refresh_stock(instance.order_id, instance.delete)
 
 
 class MarketplaceProductListView(generics.ListAPIView):
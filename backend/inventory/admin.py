@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Warehouse, Item, Stock, StockMovement
+from .models import (
+    Warehouse, Item, ItemTombstone, Stock, StockMovement, StockReservation, CostLayer, CostLayerConsumption,
+    StockCount, StockCountLine, StockTransfer, StockTransferLine, StockMovementArchive, StockArchiveRun,
+)
 
 
 @admin.register(Warehouse)
@@ -20,7 +23,7 @@ class ItemAdmin(admin.ModelAdmin):
 
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
-    list_display = ('item', 'warehouse', 'quantity', 'reserved', 'available', 'updated_at')
+    list_display = ('item', 'warehouse', 'quantity', 'reserved', 'in_transit', 'available', 'updated_at')
     list_filter = ('warehouse', 'updated_at')
     search_fields = ('item__name', 'item__sku', 'warehouse__name')
     readonly_fields = ('created_at', 'updated_at')
@@ -28,7 +31,82 @@ class StockAdmin(admin.ModelAdmin):
 
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
-    list_display = ('item', 'warehouse', 'movement_type', 'quantity', 'date', 'created_by')
+    list_display = ('item', 'warehouse', 'movement_type', 'quantity', 'unit_cost', 'date', 'created_by')
     list_filter = ('movement_type', 'warehouse', 'date')
     search_fields = ('item__name', 'reference_number', 'notes')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('stock', 'quantity', 'reference_type', 'reference_id', 'status', 'expires_at')
+    list_filter = ('status', 'reference_type', 'company')
+    search_fields = ('stock__item__name', 'stock__item__sku')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(ItemTombstone)
+class ItemTombstoneAdmin(admin.ModelAdmin):
+    list_display = ('item_id', 'company', 'deleted_at')
+    list_filter = ('company', 'deleted_at')
+    readonly_fields = ('deleted_at',)
+
+
+@admin.register(CostLayer)
+class CostLayerAdmin(admin.ModelAdmin):
+    list_display = ('item', 'warehouse', 'date', 'quantity', 'remaining_quantity', 'unit_cost')
+    list_filter = ('company', 'warehouse', 'date')
+    search_fields = ('item__name', 'item__sku')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(CostLayerConsumption)
+class CostLayerConsumptionAdmin(admin.ModelAdmin):
+    list_display = ('layer', 'movement', 'date', 'quantity', 'unit_cost')
+    list_filter = ('company', 'date')
+    readonly_fields = ('created_at',)
+
+
+class StockCountLineInline(admin.TabularInline):
+    model = StockCountLine
+    extra = 0
+    raw_id_fields = ('item',)
+
+
+@admin.register(StockCount)
+class StockCountAdmin(admin.ModelAdmin):
+    list_display = ('count_number', 'company', 'date', 'status', 'posted_at', 'created_by')
+    list_filter = ('status', 'company', 'date')
+    search_fields = ('count_number', 'notes')
+    readonly_fields = ('posted_at', 'created_at', 'updated_at')
+    inlines = [StockCountLineInline]
+
+
+class StockTransferLineInline(admin.TabularInline):
+    model = StockTransferLine
+    extra = 0
+    raw_id_fields = ('item',)
+
+
+@admin.register(StockTransfer)
+class StockTransferAdmin(admin.ModelAdmin):
+    list_display = ('transfer_number', 'source_warehouse', 'destination_warehouse', 'date', 'status', 'shipped_at', 'received_at')
+    list_filter = ('status', 'company', 'date')
+    search_fields = ('transfer_number', 'notes')
+    readonly_fields = ('shipped_at', 'received_at', 'cancelled_at', 'created_at', 'updated_at')
+    inlines = [StockTransferLineInline]
+
+
+@admin.register(StockMovementArchive)
+class StockMovementArchiveAdmin(admin.ModelAdmin):
+    list_display = ('item', 'warehouse', 'movement_type', 'quantity', 'date', 'archived_at')
+    list_filter = ('movement_type', 'company', 'date')
+    search_fields = ('item__name', 'reference_number')
+    readonly_fields = ('archived_at',)
+
+
+@admin.register(StockArchiveRun)
+class StockArchiveRunAdmin(admin.ModelAdmin):
+    list_display = ('company', 'cutoff', 'archived_count', 'archived_until', 'started_at', 'finished_at')
+    list_filter = ('company',)
+    readonly_fields = ('started_at',)
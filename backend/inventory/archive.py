@@ -0,0 +1,110 @@
+"""
+Archival of old stock movements: detail moves to StockMovementArchive and
+each warehouse and item keeps one opening-balance movement in the hot
+table, so Stock still equals the sum of StockMovement
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import StockArchiveRun, StockMovement, StockMovementArchive
+from .services import archived_until, movement_delta
+
+
+ARCHIVE_OPENING = 'archive_opening'
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVE_COPY_FIELDS = [
+    'company_id', 'warehouse_id', 'item_id', 'movement_type', 'quantity', 'reference_type', 'reference_number',
+    'date', 'unit_cost', 'notes', 'created_by_id', 'created_at',
+]
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archivable_movements(company, cutoff):
+    return StockMovement.objects.filter(company=company, date__lt=cutoff).exclude(reference_type=ARCHIVE_OPENING)
+
+
+def _add_to_openings(company, deltas, date):
+    openings = StockMovement.objects.filter(
+        company=company,
+        reference_type=ARCHIVE_OPENING,
+        warehouse_id__in={warehouse_id for warehouse_id, item_id in deltas},
+        item_id__in={item_id for warehouse_id, item_id in deltas},
+    )
+    existing = {(opening.warehouse_id, opening.item_id): opening for opening in openings}
+    changed = []
+    created = []
+    for (warehouse_id, item_id), delta in deltas.items():
+        opening = existing.get((warehouse_id, item_id))
+        if opening is not None:
+            opening.quantity += delta
+            changed.append(opening)
+        else:
+            created.append(StockMovement(
+                company=company,
+                warehouse_id=warehouse_id,
+                item_id=item_id,
+                movement_type='adjustment',
+                quantity=delta,
+                reference_type=ARCHIVE_OPENING,
+                date=date,
+                notes='Opening balance of archived movements',
+            ))
+    StockMovement.objects.bulk_update(changed, ['quantity'], batch_size=500)
+    StockMovement.objects.bulk_create(created)
+
+
+def _move_openings(company, run, date):
+    StockMovement.objects.filter(company=company, reference_type=ARCHIVE_OPENING).update(date=date)
+    run.archived_until = date
+    run.save(update_fields=['archived_count', 'archived_until'])
+
+
+def archive_stock_movements(company, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move a company's movements dated before `cutoff` to the archive, oldest
+    first, in batches that each commit on their own: copy the batch,
+    delete it, add its net quantities to the opening-balance rows and date
+    those at the batch's last movement. An interrupted run loses nothing,
+    ledger_balances() stays correct at every commit and the next run
+    carries on. Opening rows end up dated just before the cutoff.
+    Returns the run.
+    """
+    last_cutoff = StockArchiveRun.objects.filter(
+        company=company, finished_at__isnull=False
+    ).aggregate(cutoff=Max('cutoff'))['cutoff']
+    if last_cutoff and cutoff < last_cutoff:
+        raise ArchiveError(f"Movements before {last_cutoff:%Y-%m-%d %H:%M} are already archived")
+
+    run = StockArchiveRun.objects.create(company=company, cutoff=cutoff)
+    while True:
+        with transaction.atomic():
+            batch = list(archivable_movements(company, cutoff).order_by('date', 'id')[:batch_size])
+            if not batch:
+                break
+            StockMovementArchive.objects.bulk_create([
+                StockMovementArchive(movement_id=movement.pk, **{
+                    field: getattr(movement, field) for field in ARCHIVE_COPY_FIELDS
+                })
+                for movement in batch
+            ])
+            deltas = defaultdict(Decimal)
+            for movement in batch:
+                deltas[movement.warehouse_id, movement.item_id] += movement_delta(movement)
+            StockMovement.objects.filter(pk__in=[movement.pk for movement in batch]).delete()
+            # Never move the openings back, e.g. for a movement backdated below an earlier cutoff
+            opening_date = max(filter(None, [archived_until(company), batch[-1].date]))
+            _add_to_openings(company, deltas, opening_date)
+            run.archived_count += len(batch)
+            _move_openings(company, run, opening_date)
+
+    with transaction.atomic():
+        _move_openings(company, run, cutoff - datetime.timedelta(microseconds=1))
+        run.finished_at = timezone.now()
+        run.save(update_fields=['finished_at'])
+    return run
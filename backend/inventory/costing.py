@@ -0,0 +1,173 @@
+"""
+Cost layers: incoming movements open layers at their unit cost and
+outgoing movements consume them, first-in first-out or at the moving
+average depending on the company's costing method
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from companies.models import Company
+from .models import CostLayer, CostLayerConsumption, Item
+
+
+COST_PLACES = Decimal('0.0001')
+VALUE_FIELD = DecimalField(max_digits=24, decimal_places=6)
+
+
+def _cost(value):
+    return value.quantize(COST_PLACES)
+
+
+def _average(layers, fallback):
+    quantity = sum(layer.remaining_quantity for layer in layers)
+    if quantity <= 0:
+        return fallback
+    return _cost(sum(layer.remaining_quantity * layer.unit_cost for layer in layers) / quantity)
+
+
+class CostPosting:
+    """
+    Cost layers opened and consumed by a batch of movements, computed in
+    memory from the open layers of the warehouses and items involved,
+    loaded with one query. Call save() once the movements are written.
+
+    Incoming quantity (an 'in' movement or a positive adjustment or
+    transfer) opens a layer at the movement's unit_cost, or at the current
+    average when it has none, e.g. returns. Outgoing quantity takes the
+    oldest open layers; quantity no layer covers is costed at Item.cost.
+    Each movement's unit_cost is set to the cost it was posted at.
+    """
+
+    def __init__(self, movements):
+        self.movements = [movement for movement in movements if movement.quantity]
+        self.layers = []
+        self.changed = {}
+        self.consumptions = []
+        if not self.movements:
+            return
+
+        methods = dict(Company.objects.filter(
+            pk__in={movement.company_id for movement in self.movements}
+        ).values_list('pk', 'costing_method'))
+        item_costs = dict(Item.objects.filter(
+            pk__in={movement.item_id for movement in self.movements}
+        ).values_list('pk', 'cost'))
+
+        keys = {(movement.warehouse_id, movement.item_id) for movement in self.movements}
+        self.open_layers = defaultdict(list)
+        layers = CostLayer.objects.select_for_update().filter(
+            warehouse_id__in={warehouse_id for warehouse_id, item_id in keys},
+            item_id__in={item_id for warehouse_id, item_id in keys},
+            remaining_quantity__gt=0,
+        ).order_by('date', 'id')
+        for layer in layers:
+            if (layer.warehouse_id, layer.item_id) in keys:
+                self.open_layers[layer.warehouse_id, layer.item_id].append(layer)
+
+        for movement in self.movements:
+            fallback = item_costs[movement.item_id]
+            if movement.movement_type == 'out' or movement.quantity < 0:
+                self._consume(movement, abs(movement.quantity), fallback)
+            else:
+                self._receive(movement, methods[movement.company_id], fallback)
+
+    def _take(self, layer, quantity, movement, date):
+        layer.remaining_quantity -= quantity
+        if layer.pk:
+            self.changed[layer.pk] = layer
+        self.consumptions.append(CostLayerConsumption(
+            company_id=layer.company_id, layer=layer, movement=movement,
+            date=date, quantity=quantity, unit_cost=layer.unit_cost,
+        ))
+
+    def _receive(self, movement, method, fallback):
+        layers = self.open_layers[movement.warehouse_id, movement.item_id]
+        if movement.unit_cost is None:
+            movement.unit_cost = _average(layers, _cost(fallback))
+        quantity = movement.quantity
+        unit_cost = movement.unit_cost
+
+        if method == 'average' and layers:
+            # Fold the open layers into the new one; the consumptions
+            # without a movement keep the valuation history intact
+            value = quantity * unit_cost
+            for layer in layers:
+                quantity += layer.remaining_quantity
+                value += layer.remaining_quantity * layer.unit_cost
+                self._take(layer, layer.remaining_quantity, None, movement.date)
+            unit_cost = _cost(value / quantity)
+            layers.clear()
+
+        layer = CostLayer(
+            company_id=movement.company_id, warehouse_id=movement.warehouse_id, item_id=movement.item_id,
+            movement=movement, date=movement.date, quantity=quantity, remaining_quantity=quantity,
+            unit_cost=unit_cost,
+        )
+        self.layers.append(layer)
+        layers.append(layer)
+
+    def _consume(self, movement, quantity, fallback):
+        layers = self.open_layers[movement.warehouse_id, movement.item_id]
+        remaining = quantity
+        value = Decimal('0')
+        while remaining > 0 and layers:
+            layer = layers[0]
+            take = min(layer.remaining_quantity, remaining)
+            self._take(layer, take, movement, movement.date)
+            value += take * layer.unit_cost
+            remaining -= take
+            if layer.remaining_quantity <= 0:
+                layers.pop(0)
+        if remaining > 0:
+            self.consumptions.append(CostLayerConsumption(
+                company_id=movement.company_id, layer=None, movement=movement,
+                date=movement.date, quantity=remaining, unit_cost=fallback,
+            ))
+            value += remaining * fallback
+        movement.unit_cost = _cost(value / quantity)
+
+    def save(self):
+        if not self.movements:
+            return
+        CostLayer.objects.bulk_create(self.layers, batch_size=1000)
+        CostLayer.objects.bulk_update(list(self.changed.values()), ['remaining_quantity'], batch_size=500)
+        CostLayerConsumption.objects.bulk_create(self.consumptions, batch_size=1000)
+
+
+def inventory_valuation(company, as_of=None, warehouse_id=None, item_id=None):
+    """
+    Quantity and value on hand per warehouse and item, as
+    {(warehouse_id, item_id): (quantity, value)}. The current valuation
+    is one grouped query over the open layers; as of a past point it is
+    the layers opened by then minus what was taken from them by then.
+    """
+    layers = CostLayer.objects.filter(company=company)
+    if warehouse_id:
+        layers = layers.filter(warehouse_id=warehouse_id)
+    if item_id:
+        layers = layers.filter(item_id=item_id)
+
+    def grouped(queryset, prefix, quantity):
+        value = ExpressionWrapper(F(quantity) * F('unit_cost'), output_field=VALUE_FIELD)
+        rows = queryset.order_by().values(f'{prefix}warehouse_id', f'{prefix}item_id').annotate(
+            total_quantity=Sum(quantity), total_value=Sum(value)
+        )
+        return {
+            (row[f'{prefix}warehouse_id'], row[f'{prefix}item_id']): (row['total_quantity'], row['total_value'])
+            for row in rows
+        }
+
+    if as_of is None:
+        return grouped(layers.filter(remaining_quantity__gt=0), '', 'remaining_quantity')
+
+    opened = grouped(layers.filter(date__lte=as_of), '', 'quantity')
+    taken = grouped(
+        CostLayerConsumption.objects.filter(layer__in=layers.filter(date__lte=as_of), date__lte=as_of),
+        'layer__', 'quantity',
+    )
+    valuation = {}
+    for key, (quantity, value) in opened.items():
+        taken_quantity, taken_value = taken.get(key, (0, 0))
+        if quantity - taken_quantity:
+            valuation[key] = (quantity - taken_quantity, value - taken_value)
+    return valuation
@@ -0,0 +1,197 @@
+"""
+Stock count sessions: streamed CSV import of counted quantities, preview
+against the stock balances and posting of the differences as adjustments
+"""
+import csv
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Item, Stock, StockCount, StockCountLine, StockMovement, Warehouse
+from .services import record_movements
+
+
+COUNT_BATCH_SIZE = 1000
+MAX_COUNT_ERRORS = 200
+
+
+class StockCountError(Exception):
+    pass
+
+
+def read_count_csv(lines):
+    """
+    Yield (line_number, warehouse_code, code, quantity) from CSV lines
+    (str or bytes) with the columns warehouse, sku (or barcode) and
+    quantity, without reading the whole file into memory
+    """
+    lines = (line.decode('utf-8-sig') if isinstance(line, bytes) else line for line in lines)
+    for number, row in enumerate(csv.DictReader(lines), start=2):
+        code = row.get('sku') or row.get('barcode') or ''
+        yield number, (row.get('warehouse') or '').strip(), code.strip(), (row.get('quantity') or '').strip()
+
+
+def _check_draft(count):
+    if count.status != 'draft':
+        raise StockCountError(f"Count {count.count_number} is {count.status}, only draft counts can be changed")
+
+
+def import_count_lines(count, rows):
+    """
+    Store counted quantities from `rows` (see read_count_csv) on a draft
+    count. Warehouse codes and SKUs/barcodes are resolved with one lookup
+    map each, a barcode match winning over a SKU match. Rows for the same
+    warehouse and item are added up and replace what an earlier import
+    counted for them. Invalid rows are skipped and reported.
+    Returns (lines_imported, errors).
+    """
+    _check_draft(count)
+    warehouses = dict(Warehouse.objects.filter(company_id=count.company_id).values_list('code', 'id'))
+    items = {}
+    barcodes = {}
+    for item_id, sku, barcode in Item.objects.filter(company_id=count.company_id).values_list('id', 'sku', 'barcode'):
+        items.setdefault(sku, item_id)
+        if barcode:
+            barcodes.setdefault(barcode, item_id)
+    items.update(barcodes)
+
+    counted = defaultdict(Decimal)
+    errors = []
+
+    def error(number, message):
+        if len(errors) < MAX_COUNT_ERRORS:
+            errors.append({'line': number, 'error': message})
+
+    for number, warehouse_code, code, quantity in rows:
+        warehouse_id = warehouses.get(warehouse_code)
+        if warehouse_id is None:
+            error(number, f"Unknown warehouse '{warehouse_code}'")
+            continue
+        item_id = items.get(code)
+        if item_id is None:
+            error(number, f"Unknown SKU or barcode '{code}'")
+            continue
+        try:
+            quantity = Decimal(quantity)
+        except InvalidOperation:
+            error(number, f"Invalid quantity '{quantity}'")
+            continue
+        if not quantity.is_finite() or quantity < 0 or quantity != quantity.quantize(Decimal('0.01')):
+            error(number, f"Invalid quantity '{quantity}'")
+            continue
+        counted[warehouse_id, item_id] += quantity
+
+    with transaction.atomic():
+        existing = {
+            (line.warehouse_id, line.item_id): line
+            for line in count.lines.only('id', 'count_id', 'warehouse_id', 'item_id', 'counted_quantity')
+        }
+        changed = []
+        created = []
+        for (warehouse_id, item_id), quantity in counted.items():
+            line = existing.get((warehouse_id, item_id))
+            if line is None:
+                created.append(StockCountLine(
+                    count=count, warehouse_id=warehouse_id, item_id=item_id, counted_quantity=quantity
+                ))
+            elif line.counted_quantity != quantity:
+                line.counted_quantity = quantity
+                changed.append(line)
+        StockCountLine.objects.bulk_update(changed, ['counted_quantity'], batch_size=COUNT_BATCH_SIZE)
+        StockCountLine.objects.bulk_create(created, batch_size=COUNT_BATCH_SIZE)
+        StockCount.objects.filter(pk=count.pk).update(updated_at=timezone.now())
+    return len(counted), errors
+
+
+def _stock_balances(count, lines):
+    stocks = Stock.objects.filter(
+        warehouse__company_id=count.company_id,
+        warehouse_id__in={line.warehouse_id for line in lines},
+    )
+    return {
+        (warehouse_id, item_id): quantity
+        for warehouse_id, item_id, quantity in stocks.values_list('warehouse_id', 'item_id', 'quantity')
+    }
+
+
+def preview_count(count, differences_only=True):
+    """
+    Lines of a count with the quantity on record and the adjustment
+    posting would make, in two queries. Posted counts show the balances
+    they were posted against.
+    """
+    lines = list(count.lines.select_related('warehouse', 'item').only(
+        'count_id', 'warehouse_id', 'item_id', 'counted_quantity', 'expected_quantity',
+        'warehouse__code', 'item__sku', 'item__name',
+    ).order_by('warehouse_id', 'item__sku'))
+    balances = {} if count.status == 'posted' else _stock_balances(count, lines)
+
+    rows = []
+    for line in lines:
+        if count.status == 'posted':
+            expected = line.expected_quantity or Decimal('0')
+        else:
+            expected = balances.get((line.warehouse_id, line.item_id), Decimal('0'))
+        difference = line.counted_quantity - expected
+        if differences_only and not difference:
+            continue
+        rows.append({
+            'warehouse': line.warehouse_id,
+            'warehouse_code': line.warehouse.code,
+            'item': line.item_id,
+            'sku': line.item.sku,
+            'item_name': line.item.name,
+            'expected': expected,
+            'counted': line.counted_quantity,
+            'difference': difference,
+        })
+    return rows
+
+
+def post_stock_count(count, user=None):
+    """
+    Post a draft count: the counted stock rows are locked, the expected
+    quantities copied onto the lines with one UPDATE and every difference
+    recorded as an adjustment movement, with the balance updates, in one
+    transaction.
+    Returns the movements.
+    """
+    with transaction.atomic():
+        count = StockCount.objects.select_for_update().get(pk=count.pk)
+        _check_draft(count)
+        if not count.lines.exists():
+            raise StockCountError("Count has no lines")
+        list(Stock.objects.select_for_update().filter(
+            warehouse_id__in=count.lines.values('warehouse_id'), item_id__in=count.lines.values('item_id')
+        ).values_list('pk'))
+        count.lines.update(expected_quantity=Coalesce(
+            Subquery(Stock.objects.filter(
+                warehouse_id=OuterRef('warehouse_id'), item_id=OuterRef('item_id')
+            ).values('quantity')[:1]),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ))
+
+        now = timezone.now()
+        movements = []
+        for line in count.lines.only('count_id', 'warehouse_id', 'item_id', 'counted_quantity', 'expected_quantity'):
+            difference = line.counted_quantity - line.expected_quantity
+            if difference:
+                movements.append(StockMovement(
+                    company_id=count.company_id,
+                    warehouse_id=line.warehouse_id,
+                    item_id=line.item_id,
+                    movement_type='adjustment',
+                    quantity=difference,
+                    reference_type='stock_count',
+                    reference_number=count.count_number,
+                    date=now,
+                    created_by=user,
+                ))
+        movements = record_movements(movements)
+        count.status = 'posted'
+        count.posted_at = now
+        count.save(update_fields=['status', 'posted_at', 'updated_at'])
+    return movements
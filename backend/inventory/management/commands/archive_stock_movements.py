@@ -0,0 +1,55 @@
+"""
+Management command to archive old stock movements into opening balances
+"""
+import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from companies.models import Company
+from inventory.archive import ARCHIVE_BATCH_SIZE, ArchiveError, archivable_movements, archive_stock_movements
+from inventory.services import archived_until
+
+
+class Command(BaseCommand):
+    help = 'Move stock movements older than a cutoff to the archive, keeping one opening balance per warehouse and item'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, help='Only archive movements of this company')
+        parser.add_argument('--before', help='Archive movements dated before this day (YYYY-MM-DD)')
+        parser.add_argument('--keep-days', type=int, default=365,
+                            help='Without --before, keep this many days of movements in the hot table (default: 365)')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Movements moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the movements that would be archived')
+
+    def handle(self, *args, **options):
+        company_id = options.get('company_id')
+
+        if options.get('before'):
+            day = parse_date(options['before'])
+            if day is None:
+                self.stdout.write(self.style.ERROR('Invalid --before, expected YYYY-MM-DD'))
+                return
+        else:
+            day = timezone.localdate() - datetime.timedelta(days=options['keep_days'])
+        cutoff = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+        companies = Company.objects.all()
+        if company_id:
+            companies = companies.filter(id=company_id)
+            if not companies.exists():
+                self.stdout.write(self.style.ERROR(f'Company with ID {company_id} does not exist'))
+                return
+
+        for company in companies:
+            if options['dry_run']:
+                count = archivable_movements(company, cutoff).count()
+                previous = archived_until(company)
+                since = f' (archived until {previous:%Y-%m-%d})' if previous else ''
+                self.stdout.write(self.style.SUCCESS(f'{company.name}: {count} movements before {day} to archive{since}'))
+                continue
+            try:
+                run = archive_stock_movements(company, cutoff, options['batch_size'])
+            except ArchiveError as e:
+                self.stdout.write(self.style.ERROR(f'{company.name}: {e}'))
+                continue
+            self.stdout.write(self.style.SUCCESS(f'{company.name}: archived {run.archived_count} movements before {day}'))
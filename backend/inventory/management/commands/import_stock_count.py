@@ -0,0 +1,65 @@
+"""
+Management command to import a physical stock count from CSV
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.models import User
+from companies.models import Company
+from inventory.counts import StockCountError, import_count_lines, post_stock_count, preview_count, read_count_csv
+from inventory.models import StockCount
+
+
+class Command(BaseCommand):
+    help = 'Import counted quantities (warehouse, sku or barcode, quantity) from CSV and preview or post the adjustments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument('--company-id', type=int, help='Company ID the count belongs to')
+        parser.add_argument('--count-id', type=int, help='Add to this draft count instead of starting a new one')
+        parser.add_argument('--user-id', type=int, help='User recorded as the creator of the count and adjustments')
+        parser.add_argument('--post', action='store_true', help='Post the adjustments (default: preview only)')
+
+    def handle(self, *args, **options):
+        company_id = options.get('company_id')
+        if not company_id:
+            self.stdout.write(self.style.ERROR('Please provide --company-id'))
+            return
+
+        try:
+            company = Company.objects.get(id=company_id)
+        except Company.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f'Company with ID {company_id} does not exist'))
+            return
+
+        user = None
+        if options.get('user_id'):
+            user = User.objects.filter(id=options['user_id']).first()
+
+        if options.get('count_id'):
+            count = StockCount.objects.filter(company=company, id=options['count_id']).first()
+            if count is None:
+                self.stdout.write(self.style.ERROR(f"Stock count with ID {options['count_id']} does not exist"))
+                return
+        else:
+            count = StockCount.objects.create(company=company, date=timezone.localdate(), created_by=user)
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                imported, errors = import_count_lines(count, read_count_csv(f))
+            for error in errors:
+                self.stdout.write(self.style.WARNING(f"Line {error['line']}: {error['error']}"))
+
+            preview = preview_count(count)
+            for row in preview:
+                self.stdout.write(
+                    f"  {row['warehouse_code']} {row['sku']}: {row['expected']} -> {row['counted']} ({row['difference']:+})"
+                )
+            self.stdout.write(f'{count.count_number}: {imported} lines imported, {len(preview)} differences')
+
+            if options['post']:
+                movements = post_stock_count(count, user)
+                self.stdout.write(self.style.SUCCESS(f'{count.count_number}: posted {len(movements)} adjustments'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{count.count_number}: preview only, run with --post to adjust stock'))
+        except StockCountError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
@@ -0,0 +1,97 @@
+"""
+Management command to check that concurrent reservations never oversell
+"""
+import threading
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from companies.models import Company
+from inventory.models import Item, Stock, StockReservation, Warehouse
+from inventory.services import InsufficientStockError, reserve_stock
+
+
+class Command(BaseCommand):
+    help = (
+        'Let many buyers reserve the same item at once and verify that no more than the '
+        'stock on hand gets reserved; the test data is deleted afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, required=True, help='Company to create the test item in')
+        parser.add_argument('--buyers', type=int, default=50, help='Concurrent buyers')
+        parser.add_argument('--stock', type=int, default=20, help='Units on hand, spread over the warehouses')
+        parser.add_argument('--quantity', type=int, default=1, help='Units each buyer reserves')
+        parser.add_argument('--warehouses', type=int, default=2, help='Warehouses holding the item')
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(id=options['company_id'])
+        except Company.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f"Company with ID {options['company_id']} does not exist"))
+            return
+
+        warehouses = Warehouse.objects.bulk_create([
+            Warehouse(company=company, name=f'Load test {i}', code=f'LOADTEST-{i}')
+            for i in range(options['warehouses'])
+        ])
+        item = Item.objects.create(company=company, name='Load test item', sku='LOADTEST')
+        per_warehouse, extra = divmod(options['stock'], len(warehouses))
+        Stock.objects.bulk_create([
+            Stock(warehouse=warehouse, item=item, quantity=per_warehouse + (1 if i < extra else 0))
+            for i, warehouse in enumerate(warehouses)
+        ])
+        try:
+            self.run(company, item, options['buyers'], Decimal(options['quantity']), options['stock'])
+        finally:
+            StockReservation.objects.filter(reference_type='loadtest').delete()
+            item.delete()
+            Warehouse.objects.filter(pk__in=[warehouse.pk for warehouse in warehouses]).delete()
+
+    def run(self, company, item, buyers, quantity, on_hand):
+        barrier = threading.Barrier(buyers)
+        outcomes = []
+        lock = threading.Lock()
+
+        def buyer(number):
+            barrier.wait()
+            outcome, attempts = 'error', 0
+            try:
+                while attempts < 50:
+                    attempts += 1
+                    try:
+                        reserve_stock(company, {item.id: quantity}, 'loadtest', number)
+                        outcome = 'reserved'
+                        break
+                    except InsufficientStockError:
+                        outcome = 'rejected'
+                        break
+                    except OperationalError:
+                        # SQLite reports write contention instead of waiting
+                        time.sleep(0.01 * attempts)
+            finally:
+                connection.close()
+            with lock:
+                outcomes.append(outcome)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=buyer, args=(number,)) for number in range(buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        reserved = outcomes.count('reserved')
+        stocks = list(Stock.objects.filter(item=item).values_list('quantity', 'reserved'))
+        held = sum(row[1] for row in stocks)
+        expected = min(buyers, on_hand // quantity)
+        self.stdout.write(
+            f'{buyers} buyers in {elapsed:.2f}s: {reserved} reserved, {outcomes.count("rejected")} rejected, '
+            f'{outcomes.count("error")} errors; {held} of {on_hand} units held'
+        )
+        oversold = any(reserved_qty > qty for qty, reserved_qty in stocks)
+        if oversold or held != reserved * quantity or reserved != expected:
+            self.stdout.write(self.style.ERROR('Oversold or lost reservations'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No oversell'))
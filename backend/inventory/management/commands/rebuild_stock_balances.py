@@ -0,0 +1,45 @@
+"""
+Management command to check Stock balances against the movement ledger
+"""
+from django.core.management.base import BaseCommand
+from companies.models import Company
+from inventory.services import adopt_stock_balances, find_stock_drift, rebuild_stock_balances
+
+
+class Command(BaseCommand):
+    help = 'Detect stock balances that drifted from the movement ledger and rebuild them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, help='Only check stock of this company')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without changing anything')
+        parser.add_argument(
+            '--adopt', action='store_true',
+            help='Keep the current balances and record adjustment movements so the ledger matches them '
+                 '(for stock entered before all changes went through the ledger)'
+        )
+
+    def handle(self, *args, **options):
+        company_id = options.get('company_id')
+
+        companies = Company.objects.all()
+        if company_id:
+            companies = companies.filter(id=company_id)
+            if not companies.exists():
+                self.stdout.write(self.style.ERROR(f'Company with ID {company_id} does not exist'))
+                return
+
+        for company in companies:
+            if options['dry_run']:
+                drift = find_stock_drift(company)
+            elif options['adopt']:
+                drift = adopt_stock_balances(company)
+            else:
+                drift = rebuild_stock_balances(company)
+
+            for row in drift:
+                self.stdout.write(
+                    f"  warehouse {row['warehouse_id']} item {row['item_id']}: "
+                    f"stock {row['quantity']}, ledger {row['ledger']}"
+                )
+            action = 'found' if options['dry_run'] else 'adopted' if options['adopt'] else 'rebuilt'
+            self.stdout.write(self.style.SUCCESS(f'{company.name}: {len(drift)} drifted balances {action}'))
@@ -0,0 +1,13 @@
+"""
+Management command to release stock reservations past their expiry
+"""
+from django.core.management.base import BaseCommand
+from inventory.services import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release active stock reservations whose expiry has passed'
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations'))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+        ('inventory', '0002_item_sale_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.PositiveBigIntegerField(verbose_name='شناسه کالا')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='تاریخ حذف')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_tombstones', to='companies.company', verbose_name='شرکت')),
+            ],
+            options={
+                'verbose_name': 'کالای حذف شده',
+                'verbose_name_plural': 'کالاهای حذف شده',
+                'ordering': ['-deleted_at'],
+            },
+        ),
+    ]
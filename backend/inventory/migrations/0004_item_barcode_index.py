@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+        ('inventory', '0003_itemtombstone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['company', 'barcode'], name='inventory_item_barcode_idx'),
+        ),
+    ]
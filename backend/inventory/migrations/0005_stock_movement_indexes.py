@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+        ('inventory', '0004_item_barcode_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['company', 'date'], name='inventory_movement_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['company', 'reference_number'], name='inventory_movement_ref_idx'),
+        ),
+    ]
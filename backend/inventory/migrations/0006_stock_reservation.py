@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+        ('inventory', '0005_stock_movement_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مقدار')),
+                ('reference_type', models.CharField(max_length=50, verbose_name='نوع مرجع')),
+                ('reference_id', models.PositiveIntegerField(verbose_name='شناسه مرجع')),
+                ('status', models.CharField(choices=[('active', 'فعال'), ('released', 'آزاد شده'), ('consumed', 'مصرف شده'), ('expired', 'منقضی شده')], default='active', max_length=20, verbose_name='وضعیت')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان انقضا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='companies.company', verbose_name='شرکت')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='inventory.stock', verbose_name='موجودی')),
+            ],
+            options={
+                'verbose_name': 'رزرو موجودی',
+                'verbose_name_plural': 'رزروهای موجودی',
+                'indexes': [models.Index(fields=['reference_type', 'reference_id'], name='inventory_reservation_ref_idx'), models.Index(fields=['status', 'expires_at'], name='inventory_reservation_exp_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0005_company_costing_method'),
+        ('inventory', '0006_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='بهای واحد'),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(verbose_name='تاریخ')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مقدار')),
+                ('remaining_quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مقدار باقیمانده')),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=14, verbose_name='بهای واحد')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='companies.company', verbose_name='شرکت')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.item', verbose_name='کالا')),
+                ('movement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_layers', to='inventory.stockmovement', verbose_name='حرکت')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.warehouse', verbose_name='انبار')),
+            ],
+            options={
+                'verbose_name': 'لایه بهای تمام شده',
+                'verbose_name_plural': 'لایه\u200cهای بهای تمام شده',
+                'ordering': ['date', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CostLayerConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(verbose_name='تاریخ')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مقدار')),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=14, verbose_name='بهای واحد')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_consumptions', to='companies.company', verbose_name='شرکت')),
+                ('layer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='consumptions', to='inventory.costlayer', verbose_name='لایه')),
+                ('movement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_consumptions', to='inventory.stockmovement', verbose_name='حرکت')),
+            ],
+            options={
+                'verbose_name': 'مصرف لایه بهای تمام شده',
+                'verbose_name_plural': 'مصارف لایه\u200cهای بهای تمام شده',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='costlayer',
+            index=models.Index(fields=['company', 'date'], name='inventory_costlayer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='costlayer',
+            index=models.Index(fields=['warehouse', 'item', 'remaining_quantity'], name='inventory_costlayer_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='costlayerconsumption',
+            index=models.Index(fields=['company', 'date'], name='inventory_costuse_date_idx'),
+        ),
+    ]
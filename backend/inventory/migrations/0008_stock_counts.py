@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:55
+
+import companies.sequences
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0006_alter_documentsequence_document_type'),
+        ('inventory', '0007_cost_layers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count_number', models.CharField(blank=True, default='', max_length=100, verbose_name='شماره شمارش')),
+                ('date', models.DateField(verbose_name='تاریخ')),
+                ('status', models.CharField(choices=[('draft', 'پیش\u200cنویس'), ('posted', 'ثبت شده'), ('cancelled', 'لغو شده')], default='draft', max_length=20, verbose_name='وضعیت')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='یادداشت\u200cها')),
+                ('posted_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان ثبت')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_counts', to='companies.company', verbose_name='شرکت')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_counts', to=settings.AUTH_USER_MODEL, verbose_name='ایجاد شده توسط')),
+            ],
+            options={
+                'verbose_name': 'شمارش انبار',
+                'verbose_name_plural': 'شمارش\u200cهای انبار',
+                'ordering': ['-date', '-id'],
+                'unique_together': {('company', 'count_number')},
+            },
+            bases=(companies.sequences.NumberedDocumentMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='StockCountLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counted_quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مقدار شمارش شده')),
+                ('expected_quantity', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='موجودی سیستم هنگام ثبت')),
+                ('count', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.stockcount', verbose_name='شمارش')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='count_lines', to='inventory.item', verbose_name='کالا')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='count_lines', to='inventory.warehouse', verbose_name='انبار')),
+            ],
+            options={
+                'verbose_name': 'ردیف شمارش انبار',
+                'verbose_name_plural': 'ردیف\u200cهای شمارش انبار',
+                'unique_together': {('count', 'warehouse', 'item')},
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:03
+
+import companies.sequences
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_alter_documentsequence_document_type'),
+        ('inventory', '0008_stock_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='in_transit',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='در راه'),
+        ),
+        migrations.CreateModel(
+            name='StockTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transfer_number', models.CharField(blank=True, default='', max_length=100, verbose_name='شماره انتقال')),
+                ('date', models.DateField(verbose_name='تاریخ')),
+                ('status', models.CharField(choices=[('draft', 'پیش\u200cنویس'), ('in_transit', 'در راه'), ('received', 'دریافت شده'), ('cancelled', 'لغو شده')], default='draft', max_length=20, verbose_name='وضعیت')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='یادداشت\u200cها')),
+                ('shipped_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان ارسال')),
+                ('received_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان دریافت')),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان لغو')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_transfers', to='companies.company', verbose_name='شرکت')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_transfers', to=settings.AUTH_USER_MODEL, verbose_name='ایجاد شده توسط')),
+                ('destination_warehouse', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='incoming_transfers', to='inventory.warehouse', verbose_name='انبار مقصد')),
+                ('source_warehouse', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='outgoing_transfers', to='inventory.warehouse', verbose_name='انبار مبدا')),
+            ],
+            options={
+                'verbose_name': 'انتقال بین انبارها',
+                'verbose_name_plural': 'انتقال\u200cهای بین انبارها',
+                'ordering': ['-date', '-id'],
+                'unique_together': {('company', 'transfer_number')},
+            },
+            bases=(companies.sequences.NumberedDocumentMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='StockTransferLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مقدار')),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='بهای واحد هنگام ارسال')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfer_lines', to='inventory.item', verbose_name='کالا')),
+                ('transfer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.stocktransfer', verbose_name='انتقال')),
+            ],
+            options={
+                'verbose_name': 'ردیف انتقال',
+                'verbose_name_plural': 'ردیف\u200cهای انتقال',
+                'unique_together': {('transfer', 'item')},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_alter_documentsequence_document_type'),
+        ('inventory', '0009_stock_transfers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockArchiveRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff', models.DateTimeField(verbose_name='بایگانی حرکات پیش از')),
+                ('archived_count', models.PositiveIntegerField(default=0, verbose_name='تعداد حرکات بایگانی شده')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان شروع')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان پایان')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_archive_runs', to='companies.company', verbose_name='شرکت')),
+            ],
+            options={
+                'verbose_name': 'اجرای بایگانی موجودی',
+                'verbose_name_plural': 'اجراهای بایگانی موجودی',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovementArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_id', models.PositiveBigIntegerField(verbose_name='شناسه حرکت')),
+                ('movement_type', models.CharField(choices=[('in', 'ورود'), ('out', 'خروج'), ('transfer', 'انتقال'), ('adjustment', 'تعدیل')], max_length=20, verbose_name='نوع حرکت')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مقدار')),
+                ('reference_type', models.CharField(blank=True, max_length=50, null=True, verbose_name='نوع مرجع')),
+                ('reference_number', models.CharField(blank=True, max_length=100, null=True, verbose_name='شماره مرجع')),
+                ('date', models.DateTimeField(verbose_name='تاریخ')),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='بهای واحد')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='یادداشت\u200cها')),
+                ('created_at', models.DateTimeField(verbose_name='تاریخ ایجاد')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_stock_movements', to='companies.company', verbose_name='شرکت')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_stock_movements', to=settings.AUTH_USER_MODEL, verbose_name='ایجاد شده توسط')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_movements', to='inventory.item', verbose_name='کالا')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_movements', to='inventory.warehouse', verbose_name='انبار')),
+            ],
+            options={
+                'verbose_name': 'حرکت موجودی بایگانی شده',
+                'verbose_name_plural': 'حرکات موجودی بایگانی شده',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['company', 'date'], name='inventory_archive_date_idx'), models.Index(fields=['company', 'reference_number'], name='inventory_archive_ref_idx')],
+            },
+        ),
+    ]
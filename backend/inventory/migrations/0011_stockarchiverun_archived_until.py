@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:20
+
+import datetime
+from django.db import migrations, models
+
+
+def populate_archived_until(apps, schema_editor):
+    """
+    Completed runs dated their opening balances just before the cutoff
+    """
+    StockArchiveRun = apps.get_model('inventory', 'StockArchiveRun')
+    runs = list(StockArchiveRun.objects.filter(finished_at__isnull=False))
+    for run in runs:
+        run.archived_until = run.cutoff - datetime.timedelta(microseconds=1)
+    StockArchiveRun.objects.bulk_update(runs, ['archived_until'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_stock_movement_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockarchiverun',
+            name='archived_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='بایگانی شده تا'),
+        ),
+        migrations.RunPython(populate_archived_until, migrations.RunPython.noop),
+    ]
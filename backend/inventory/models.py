@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from companies.models import Company
+from companies.sequences import NumberedDocumentMixin
 
 
 class Warehouse(models.Model):
@@ -60,16 +61,48 @@ class Item(models.Model):
         verbose_name_plural = 'کالاها'
         ordering = ['name']
         unique_together = [('company', 'sku')]
+        # (company, sku) is covered by the unique constraint's index
+        indexes = [models.Index(fields=['company', 'barcode'], name='inventory_item_barcode_idx')]
 
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
+    def save(self, *args, **kwargs):
+        from .services import invalidate_item_lookups
+        super().save(*args, **kwargs)
+        invalidate_item_lookups(self.company_id)
+
+    def delete(self, *args, **kwargs):
+        from .services import invalidate_item_lookups
+        # Leave a tombstone so catalog copies (POS registers) drop the item
+        with transaction.atomic():
+            ItemTombstone.objects.create(company_id=self.company_id, item_id=self.pk)
+            result = super().delete(*args, **kwargs)
+        invalidate_item_lookups(self.company_id)
+        return result
+
+
+class ItemTombstone(models.Model):
+    """Deleted item, kept so that incremental catalog feeds can report the deletion"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='item_tombstones', verbose_name='شرکت')
+    item_id = models.PositiveBigIntegerField(verbose_name='شناسه کالا')
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='تاریخ حذف')
+
+    class Meta:
+        verbose_name = 'کالای حذف شده'
+        verbose_name_plural = 'کالاهای حذف شده'
+        ordering = ['-deleted_at']
+
+    def __str__(self):
+        return f"{self.item_id} @ {self.deleted_at}"
+
 
 class Stock(models.Model):
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='stocks', verbose_name='انبار')
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='stocks', verbose_name='کالا')
     quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='موجودی')
     reserved = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='رزرو شده')
+    in_transit = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='در راه')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
 
@@ -87,6 +120,37 @@ class Stock(models.Model):
         return self.quantity - self.reserved
 
 
+class StockReservation(models.Model):
+    """Quantity of a stock row held for a document until it is released or consumed"""
+    STATUS_CHOICES = [
+        ('active', 'فعال'),
+        ('released', 'آزاد شده'),
+        ('consumed', 'مصرف شده'),
+        ('expired', 'منقضی شده'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_reservations', verbose_name='شرکت')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='reservations', verbose_name='موجودی')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مقدار')
+    reference_type = models.CharField(max_length=50, verbose_name='نوع مرجع')
+    reference_id = models.PositiveIntegerField(verbose_name='شناسه مرجع')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active', verbose_name='وضعیت')
+    expires_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان انقضا')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+
+    class Meta:
+        verbose_name = 'رزرو موجودی'
+        verbose_name_plural = 'رزروهای موجودی'
+        indexes = [
+            models.Index(fields=['reference_type', 'reference_id'], name='inventory_reservation_ref_idx'),
+            models.Index(fields=['status', 'expires_at'], name='inventory_reservation_exp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.reference_type} #{self.reference_id}: {self.quantity}"
+
+
 class StockMovement(models.Model):
     MOVEMENT_TYPE_CHOICES = [
         ('in', 'ورود'),
@@ -103,6 +167,7 @@ class StockMovement(models.Model):
     reference_type = models.CharField(max_length=50, blank=True, null=True, verbose_name='نوع مرجع')
     reference_number = models.CharField(max_length=100, blank=True, null=True, verbose_name='شماره مرجع')
     date = models.DateTimeField(verbose_name='تاریخ')
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, blank=True, null=True, verbose_name='بهای واحد')
     notes = models.TextField(blank=True, null=True, verbose_name='یادداشت‌ها')
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -118,6 +183,248 @@ class StockMovement(models.Model):
         verbose_name = 'حرکت موجودی'
         verbose_name_plural = 'حرکات موجودی'
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['company', 'date'], name='inventory_movement_date_idx'),
+            models.Index(fields=['company', 'reference_number'], name='inventory_movement_ref_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_movement_type_display()} - {self.item.name} ({self.quantity})"
+
+
+class CostLayer(models.Model):
+    """
+    Quantity that entered a warehouse at one unit cost. Outgoing movements
+    consume the open layers; under moving average each receipt folds the
+    open layers into a single one at the new average cost.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='cost_layers', verbose_name='شرکت')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='cost_layers', verbose_name='انبار')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='cost_layers', verbose_name='کالا')
+    movement = models.ForeignKey(
+        StockMovement, on_delete=models.SET_NULL, blank=True, null=True, related_name='cost_layers', verbose_name='حرکت'
+    )
+    date = models.DateTimeField(verbose_name='تاریخ')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مقدار')
+    remaining_quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مقدار باقیمانده')
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, verbose_name='بهای واحد')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+
+    class Meta:
+        verbose_name = 'لایه بهای تمام شده'
+        verbose_name_plural = 'لایه‌های بهای تمام شده'
+        ordering = ['date', 'id']
+        indexes = [
+            models.Index(fields=['company', 'date'], name='inventory_costlayer_date_idx'),
+            models.Index(fields=['warehouse', 'item', 'remaining_quantity'], name='inventory_costlayer_open_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name} @ {self.warehouse.name}: {self.remaining_quantity}/{self.quantity} x {self.unit_cost}"
+
+
+class CostLayerConsumption(models.Model):
+    """
+    Quantity taken from a cost layer by an outgoing movement, at the
+    layer's unit cost. `layer` is empty for quantity that left without any
+    layer to cover it, costed at the last known cost.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='cost_consumptions', verbose_name='شرکت')
+    layer = models.ForeignKey(
+        CostLayer, on_delete=models.CASCADE, blank=True, null=True, related_name='consumptions', verbose_name='لایه'
+    )
+    movement = models.ForeignKey(
+        StockMovement, on_delete=models.SET_NULL, blank=True, null=True, related_name='cost_consumptions', verbose_name='حرکت'
+    )
+    date = models.DateTimeField(verbose_name='تاریخ')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مقدار')
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, verbose_name='بهای واحد')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+
+    class Meta:
+        verbose_name = 'مصرف لایه بهای تمام شده'
+        verbose_name_plural = 'مصارف لایه‌های بهای تمام شده'
+        indexes = [
+            models.Index(fields=['company', 'date'], name='inventory_costuse_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.unit_cost}"
+
+
+class StockCount(NumberedDocumentMixin, models.Model):
+    """
+    Physical count session: counted quantities are imported into lines,
+    previewed against the stock balances and posted as adjustments
+    """
+    STATUS_CHOICES = [
+        ('draft', 'پیش‌نویس'),
+        ('posted', 'ثبت شده'),
+        ('cancelled', 'لغو شده'),
+    ]
+
+    document_type = 'stock_count'
+    number_field = 'count_number'
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_counts', verbose_name='شرکت')
+    count_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره شمارش')
+    date = models.DateField(verbose_name='تاریخ')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name='وضعیت')
+    notes = models.TextField(blank=True, null=True, verbose_name='یادداشت‌ها')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='stock_counts',
+        verbose_name='ایجاد شده توسط'
+    )
+    posted_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان ثبت')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+
+    class Meta:
+        verbose_name = 'شمارش انبار'
+        verbose_name_plural = 'شمارش‌های انبار'
+        ordering = ['-date', '-id']
+        unique_together = [('company', 'count_number')]
+
+    def __str__(self):
+        return self.count_number
+
+
+class StockCountLine(models.Model):
+    count = models.ForeignKey(StockCount, on_delete=models.CASCADE, related_name='lines', verbose_name='شمارش')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='count_lines', verbose_name='انبار')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='count_lines', verbose_name='کالا')
+    counted_quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مقدار شمارش شده')
+    expected_quantity = models.DecimalField(
+        max_digits=12, decimal_places=2, blank=True, null=True, verbose_name='موجودی سیستم هنگام ثبت'
+    )
+
+    class Meta:
+        verbose_name = 'ردیف شمارش انبار'
+        verbose_name_plural = 'ردیف‌های شمارش انبار'
+        unique_together = [('count', 'warehouse', 'item')]
+
+    def __str__(self):
+        return f"{self.item.name} @ {self.warehouse.name}: {self.counted_quantity}"
+
+
+class StockTransfer(NumberedDocumentMixin, models.Model):
+    """
+    Move stock between two warehouses of a company. Shipping takes the
+    lines out of the source and shows them in transit at the destination
+    until they are received.
+    """
+    STATUS_CHOICES = [
+        ('draft', 'پیش‌نویس'),
+        ('in_transit', 'در راه'),
+        ('received', 'دریافت شده'),
+        ('cancelled', 'لغو شده'),
+    ]
+
+    document_type = 'stock_transfer'
+    number_field = 'transfer_number'
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_transfers', verbose_name='شرکت')
+    transfer_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره انتقال')
+    source_warehouse = models.ForeignKey(
+        Warehouse, on_delete=models.PROTECT, related_name='outgoing_transfers', verbose_name='انبار مبدا'
+    )
+    destination_warehouse = models.ForeignKey(
+        Warehouse, on_delete=models.PROTECT, related_name='incoming_transfers', verbose_name='انبار مقصد'
+    )
+    date = models.DateField(verbose_name='تاریخ')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name='وضعیت')
+    notes = models.TextField(blank=True, null=True, verbose_name='یادداشت‌ها')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='stock_transfers',
+        verbose_name='ایجاد شده توسط'
+    )
+    shipped_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان ارسال')
+    received_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان دریافت')
+    cancelled_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان لغو')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+
+    class Meta:
+        verbose_name = 'انتقال بین انبارها'
+        verbose_name_plural = 'انتقال‌های بین انبارها'
+        ordering = ['-date', '-id']
+        unique_together = [('company', 'transfer_number')]
+
+    def __str__(self):
+        return self.transfer_number
+
+
+class StockTransferLine(models.Model):
+    transfer = models.ForeignKey(StockTransfer, on_delete=models.CASCADE, related_name='lines', verbose_name='انتقال')
+    item = models.ForeignKey(Item, on_delete=models.PROTECT, related_name='transfer_lines', verbose_name='کالا')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مقدار')
+    unit_cost = models.DecimalField(
+        max_digits=14, decimal_places=4, blank=True, null=True, verbose_name='بهای واحد هنگام ارسال'
+    )
+
+    class Meta:
+        verbose_name = 'ردیف انتقال'
+        verbose_name_plural = 'ردیف‌های انتقال'
+        unique_together = [('transfer', 'item')]
+
+    def __str__(self):
+        return f"{self.item.name} x {self.quantity}"
+
+
+class StockMovementArchive(models.Model):
+    """
+    Movement moved out of StockMovement by archival. Its net effect stays
+    in the hot table as one opening-balance movement per warehouse and item.
+    """
+    movement_id = models.PositiveBigIntegerField(verbose_name='شناسه حرکت')
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name='archived_stock_movements', verbose_name='شرکت'
+    )
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='archived_movements', verbose_name='انبار')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='archived_movements', verbose_name='کالا')
+    movement_type = models.CharField(max_length=20, choices=StockMovement.MOVEMENT_TYPE_CHOICES, verbose_name='نوع حرکت')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مقدار')
+    reference_type = models.CharField(max_length=50, blank=True, null=True, verbose_name='نوع مرجع')
+    reference_number = models.CharField(max_length=100, blank=True, null=True, verbose_name='شماره مرجع')
+    date = models.DateTimeField(verbose_name='تاریخ')
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, blank=True, null=True, verbose_name='بهای واحد')
+    notes = models.TextField(blank=True, null=True, verbose_name='یادداشت‌ها')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_stock_movements',
+        verbose_name='ایجاد شده توسط'
+    )
+    created_at = models.DateTimeField(verbose_name='تاریخ ایجاد')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')
+
+    class Meta:
+        verbose_name = 'حرکت موجودی بایگانی شده'
+        verbose_name_plural = 'حرکات موجودی بایگانی شده'
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['company', 'date'], name='inventory_archive_date_idx'),
+            models.Index(fields=['company', 'reference_number'], name='inventory_archive_ref_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_movement_type_display()} - {self.item.name} ({self.quantity})"
+
+
+class StockArchiveRun(models.Model):
+    """One archival pass of a company's movements dated before `cutoff`"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_archive_runs', verbose_name='شرکت')
+    cutoff = models.DateTimeField(verbose_name='بایگانی حرکات پیش از')
+    archived_count = models.PositiveIntegerField(default=0, verbose_name='تعداد حرکات بایگانی شده')
+    archived_until = models.DateTimeField(blank=True, null=True, verbose_name='بایگانی شده تا')
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name='زمان شروع')
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان پایان')
+
+    class Meta:
+        verbose_name = 'اجرای بایگانی موجودی'
+        verbose_name_plural = 'اجراهای بایگانی موجودی'
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.company.name} < {self.cutoff:%Y-%m-%d}"
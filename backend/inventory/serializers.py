@@ -1,5 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Warehouse, Item, Stock, StockMovement
+from .models import (
+    Warehouse, Item, Stock, StockMovement, StockMovementArchive, StockCount, StockTransfer, StockTransferLine,
+)
 
 
 class WarehouseSerializer(serializers.ModelSerializer):
@@ -15,6 +18,18 @@ class ItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('company', 'created_at', 'updated_at')
 
+    def validate_barcode(self, value):
+        """Barcodes must resolve to a single item when scanned"""
+        if not value:
+            return value
+        company = self.instance.company if self.instance else self.context['request'].user.active_company
+        items = Item.objects.filter(company=company, barcode=value)
+        if self.instance:
+            items = items.exclude(pk=self.instance.pk)
+        if items.exists():
+            raise serializers.ValidationError("Another item already uses this barcode")
+        return value
+
 
 class StockSerializer(serializers.ModelSerializer):
     item_name = serializers.CharField(source='item.name', read_only=True)
@@ -24,15 +39,131 @@ class StockSerializer(serializers.ModelSerializer):
     class Meta:
         model = Stock
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('reserved', 'in_transit', 'created_at', 'updated_at')
+
+    def validate(self, data):
+        company = self.context['request'].user.active_company
+        warehouse = data.get('warehouse', self.instance.warehouse if self.instance else None)
+        item = data.get('item', self.instance.item if self.instance else None)
+        if warehouse.company_id != company.id or item.company_id != company.id:
+            raise serializers.ValidationError("Warehouse and item must belong to your company")
+        return data
 
 
 class StockMovementSerializer(serializers.ModelSerializer):
     item_name = serializers.CharField(source='item.name', read_only=True)
     warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
     movement_type_display = serializers.CharField(source='get_movement_type_display', read_only=True)
+    # Transfers are recorded with both legs by inventory.transfers
+    movement_type = serializers.ChoiceField(
+        choices=[choice for choice in StockMovement.MOVEMENT_TYPE_CHOICES if choice[0] != 'transfer']
+    )
     
     class Meta:
         model = StockMovement
         fields = '__all__'
-        read_only_fields = ('company', 'created_by', 'created_at', 'updated_at')
+        read_only_fields = ('company', 'reference_type', 'created_by', 'created_at', 'updated_at')
+
+    def validate(self, data):
+        """In and out movements carry a positive quantity; adjustments are signed"""
+        movement_type = data.get('movement_type')
+        quantity = data.get('quantity')
+        if movement_type in ('in', 'out') and quantity <= 0:
+            raise serializers.ValidationError({'quantity': "Quantity must be greater than zero"})
+        if not quantity:
+            raise serializers.ValidationError({'quantity': "Quantity cannot be zero"})
+        company = self.context['request'].user.active_company
+        if data['warehouse'].company_id != company.id or data['item'].company_id != company.id:
+            raise serializers.ValidationError("Warehouse and item must belong to your company")
+        return data
+
+
+class StockMovementArchiveSerializer(serializers.ModelSerializer):
+    item_name = serializers.CharField(source='item.name', read_only=True)
+    warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
+    movement_type_display = serializers.CharField(source='get_movement_type_display', read_only=True)
+
+    class Meta:
+        model = StockMovementArchive
+        fields = '__all__'
+
+
+class StockCountSerializer(serializers.ModelSerializer):
+    line_count = serializers.IntegerField(source='lines.count', read_only=True)
+
+    class Meta:
+        model = StockCount
+        fields = '__all__'
+        read_only_fields = ('company', 'status', 'posted_at', 'created_by', 'created_at', 'updated_at')
+
+    def validate(self, data):
+        if self.instance and self.instance.status != 'draft':
+            raise serializers.ValidationError("Only draft counts can be changed")
+        return data
+
+
+class StockTransferLineSerializer(serializers.ModelSerializer):
+    item_name = serializers.CharField(source='item.name', read_only=True)
+
+    class Meta:
+        model = StockTransferLine
+        fields = ['id', 'item', 'item_name', 'quantity', 'unit_cost']
+        read_only_fields = ('unit_cost',)
+
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Quantity must be greater than zero")
+        return value
+
+
+class StockTransferSerializer(serializers.ModelSerializer):
+    """Transfer with its lines; while in draft, `lines` replaces all of them"""
+    lines = StockTransferLineSerializer(many=True, required=False)
+    source_warehouse_name = serializers.CharField(source='source_warehouse.name', read_only=True)
+    destination_warehouse_name = serializers.CharField(source='destination_warehouse.name', read_only=True)
+
+    class Meta:
+        model = StockTransfer
+        fields = '__all__'
+        read_only_fields = (
+            'company', 'status', 'created_by', 'shipped_at', 'received_at', 'cancelled_at', 'created_at', 'updated_at',
+        )
+
+    def validate(self, data):
+        if self.instance and self.instance.status != 'draft':
+            raise serializers.ValidationError("Only draft transfers can be changed")
+        company = self.context['request'].user.active_company
+        source = data.get('source_warehouse', self.instance.source_warehouse if self.instance else None)
+        destination = data.get('destination_warehouse', self.instance.destination_warehouse if self.instance else None)
+        if source.company_id != company.id or destination.company_id != company.id:
+            raise serializers.ValidationError("Warehouses must belong to your company")
+        if source.pk == destination.pk:
+            raise serializers.ValidationError("Source and destination warehouses must differ")
+        lines = data.get('lines') or []
+        item_ids = [line['item'].pk for line in lines]
+        if len(item_ids) != len(set(item_ids)):
+            raise serializers.ValidationError({'lines': "Each item can only appear once"})
+        if any(line['item'].company_id != company.id for line in lines):
+            raise serializers.ValidationError({'lines': "Items must belong to your company"})
+        return data
+
+    def _save_lines(self, transfer, lines):
+        transfer.lines.all().delete()
+        StockTransferLine.objects.bulk_create([
+            StockTransferLine(transfer=transfer, item=line['item'], quantity=line['quantity']) for line in lines
+        ])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        lines = validated_data.pop('lines', [])
+        transfer = super().create(validated_data)
+        self._save_lines(transfer, lines)
+        return transfer
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        lines = validated_data.pop('lines', None)
+        transfer = super().update(instance, validated_data)
+        if lines is not None:
+            self._save_lines(transfer, lines)
+        return transfer
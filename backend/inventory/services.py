@@ -0,0 +1,541 @@
+"""
+Stock level changes shared by the modules that move inventory
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .costing import CostPosting
+from .models import Item, Stock, StockArchiveRun, StockMovement, StockMovementArchive, StockReservation
+
+
+ITEM_LOOKUP_CACHE_SIZE = 4096
+# Seconds an item lookup is reused without checking the database
+ITEM_LOOKUP_CACHE_TTL = 30
+# Stock rows per conditional UPDATE when applying movements in bulk
+STOCK_UPDATE_BATCH_SIZE = 500
+STOCK_DELTA_GROUP_SIZE = 20
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, item_id, available, required):
+        self.item_id = item_id
+        self.available = available
+        self.required = required
+        super().__init__(f"Insufficient stock for item {item_id}. Available: {available}, Required: {required}")
+
+
+class StockDeduction:
+    """
+    Stock rows of a company locked with one query so that the quantities
+    of one or many documents can be deducted in memory and written back in
+    bulk with save(). Only free stock (quantity - reserved) is deducted;
+    quantity held by reservations stays with their documents.
+    """
+
+    def __init__(self, company, item_ids):
+        self.company = company
+        self.stocks_by_item = defaultdict(list)
+        self.changed = {}
+        self.movements = []
+
+        stocks = Stock.objects.select_for_update(of=('self',)).filter(
+            warehouse__company=company,
+            item_id__in=set(item_ids),
+        ).annotate(free=F('quantity') - F('reserved')).filter(free__gt=0).order_by('item_id', '-free', 'pk')
+        for stock in stocks:
+            self.stocks_by_item[stock.item_id].append(stock)
+
+    def deduct(self, quantities, reference_type, reference_number, date, user=None, notes=None):
+        """
+        Take `quantities` ({item_id: quantity}) out of the warehouses holding
+        the most free stock first, adding one 'out' movement per warehouse
+        and item. Raises InsufficientStockError, leaving the stock
+        untouched, if an item cannot be covered.
+        """
+        for item_id, quantity in quantities.items():
+            available = sum(stock.available for stock in self.stocks_by_item[item_id])
+            if available < quantity:
+                raise InsufficientStockError(item_id, available, quantity)
+
+        now = timezone.now()
+        movements = []
+        for item_id, quantity in quantities.items():
+            remaining = quantity
+            for stock in self.stocks_by_item[item_id]:
+                if remaining <= 0:
+                    break
+                if stock.available <= 0:
+                    continue
+                deduct_qty = min(stock.available, remaining)
+                stock.quantity -= deduct_qty
+                stock.updated_at = now
+                self.changed[stock.pk] = stock
+                movements.append(StockMovement(
+                    company=self.company,
+                    warehouse_id=stock.warehouse_id,
+                    item_id=item_id,
+                    movement_type='out',
+                    quantity=deduct_qty,
+                    reference_type=reference_type,
+                    reference_number=reference_number,
+                    date=date,
+                    created_by=user,
+                    notes=notes,
+                ))
+                remaining -= deduct_qty
+
+        self.movements.extend(movements)
+        return movements
+
+    def save(self):
+        # The balances were computed under lock from the same movements
+        costs = CostPosting(self.movements)
+        Stock.objects.bulk_update(list(self.changed.values()), ['quantity', 'updated_at'])
+        StockMovement.objects.bulk_create(self.movements)
+        costs.save()
+
+
+def deduct_stock(company, quantities, reference_type, reference_number, date, user=None, notes=None):
+    """
+    Take `quantities` ({item_id: quantity}) out of a company's warehouses
+    with a fixed number of queries (see StockDeduction)
+    """
+    deduction = StockDeduction(company, quantities)
+    movements = deduction.deduct(quantities, reference_type, reference_number, date, user, notes)
+    deduction.save()
+    return movements
+
+
+def signed_quantity():
+    """
+    Effect of a movement on its stock balance as an expression: 'out'
+    subtracts, every other type adds (adjustments and transfers carry
+    their own sign)
+    """
+    return Case(
+        When(movement_type='out', then=-F('quantity')),
+        default=F('quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def movement_delta(movement):
+    """signed_quantity() of an in-memory movement"""
+    return -movement.quantity if movement.movement_type == 'out' else movement.quantity
+
+
+def apply_stock_deltas(deltas, field='quantity'):
+    """
+    Add `deltas` ({(warehouse_id, item_id): quantity}) to `field` of the
+    Stock rows, creating missing rows, with F() UPDATEs over batches of rows
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def stock_ids():
+        rows = Stock.objects.filter(
+            warehouse_id__in={warehouse_id for warehouse_id, item_id in deltas},
+            item_id__in={item_id for warehouse_id, item_id in deltas},
+        ).values_list('pk', 'warehouse_id', 'item_id')
+        return {(warehouse_id, item_id): pk for pk, warehouse_id, item_id in rows if (warehouse_id, item_id) in deltas}
+
+    existing = stock_ids()
+    missing = [key for key in deltas if key not in existing]
+    if missing:
+        Stock.objects.bulk_create(
+            [Stock(warehouse_id=warehouse_id, item_id=item_id, quantity=0) for warehouse_id, item_id in missing],
+            ignore_conflicts=True,
+        )
+        existing = stock_ids()
+
+    now = timezone.now()
+    # Rows sharing a delta (typical of counts and bulk adjustments) take a
+    # plain UPDATE per delta; the rest a CASE per batch of rows
+    by_delta = defaultdict(list)
+    for key, delta in deltas.items():
+        by_delta[delta].append(key)
+    keys = []
+    for delta, group in by_delta.items():
+        if len(group) < STOCK_DELTA_GROUP_SIZE:
+            keys.extend(group)
+            continue
+        for start in range(0, len(group), STOCK_UPDATE_BATCH_SIZE):
+            Stock.objects.filter(pk__in=[existing[key] for key in group[start:start + STOCK_UPDATE_BATCH_SIZE]]).update(
+                **{field: F(field) + Value(delta)}, updated_at=now
+            )
+    for start in range(0, len(keys), STOCK_UPDATE_BATCH_SIZE):
+        batch = keys[start:start + STOCK_UPDATE_BATCH_SIZE]
+        Stock.objects.filter(pk__in=[existing[key] for key in batch]).update(
+            **{field: F(field) + Case(
+                *[When(pk=existing[key], then=Value(deltas[key])) for key in batch],
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )},
+            updated_at=now,
+        )
+
+
+def record_movements(movements):
+    """
+    Write stock movements and apply them to the Stock balances in the same
+    transaction. Every change to stock goes through here or StockDeduction
+    so Stock always equals the sum of its movements, and the cost layers
+    follow the same movements (see CostPosting).
+    """
+    with transaction.atomic():
+        costs = CostPosting(movements)
+        created = StockMovement.objects.bulk_create(movements)
+        costs.save()
+        deltas = defaultdict(Decimal)
+        for movement in movements:
+            deltas[movement.warehouse_id, movement.item_id] += movement_delta(movement)
+        apply_stock_deltas(deltas)
+    return created
+
+
+def restore_stock(company, quantities, reference_type, reference_number, date, user=None, notes=None):
+    """
+    Put `quantities` ({(warehouse_id, item_id): quantity}) back into stock,
+    e.g. when reversing a sale, as 'in' movements written in bulk
+    """
+    return record_movements([
+        StockMovement(
+            company=company,
+            warehouse_id=warehouse_id,
+            item_id=item_id,
+            movement_type='in',
+            quantity=quantity,
+            reference_type=reference_type,
+            reference_number=reference_number,
+            date=date,
+            created_by=user,
+            notes=notes,
+        )
+        for (warehouse_id, item_id), quantity in quantities.items() if quantity > 0
+    ])
+
+
+@transaction.atomic
+def adjust_stock(company, warehouse_id, item_id, quantity, user=None, reference_type='adjustment', notes=None):
+    """Set a stock balance to `quantity` by recording the difference as an adjustment"""
+    stock = Stock.objects.select_for_update().filter(warehouse_id=warehouse_id, item_id=item_id).first()
+    difference = quantity - (stock.quantity if stock else 0)
+    if not difference:
+        return None
+    movement, = record_movements([StockMovement(
+        company=company,
+        warehouse_id=warehouse_id,
+        item_id=item_id,
+        movement_type='adjustment',
+        quantity=difference,
+        reference_type=reference_type,
+        date=timezone.now(),
+        created_by=user,
+        notes=notes,
+    )])
+    return movement
+
+
+def archived_until(company):
+    """
+    Date of the company's opening-balance movements, or None: movements
+    before it are archived. Moves forward with every archived batch.
+    """
+    return StockArchiveRun.objects.filter(company=company).aggregate(until=Max('archived_until'))['until']
+
+
+def ledger_balances(company, as_of=None, warehouse_id=None, item_id=None):
+    """
+    Stock balances computed from the movement ledger with one grouped
+    query, as {(warehouse_id, item_id): quantity}, optionally as of a
+    point in time. Points before archived_until() are answered from the
+    archived movements.
+    """
+    movements = StockMovement.objects.filter(company=company)
+    if as_of is not None:
+        until = archived_until(company)
+        if until and as_of < until:
+            movements = StockMovementArchive.objects.filter(company=company)
+        movements = movements.filter(date__lte=as_of)
+    if warehouse_id:
+        movements = movements.filter(warehouse_id=warehouse_id)
+    if item_id:
+        movements = movements.filter(item_id=item_id)
+    rows = movements.order_by().values('warehouse_id', 'item_id').annotate(balance=Sum(signed_quantity()))
+    return {(row['warehouse_id'], row['item_id']): row['balance'] for row in rows}
+
+
+def find_stock_drift(company):
+    """Stock rows whose quantity differs from the ledger, as dicts"""
+    ledger = ledger_balances(company)
+    stored = {
+        (warehouse_id, item_id): (pk, quantity)
+        for pk, warehouse_id, item_id, quantity in Stock.objects.filter(
+            warehouse__company=company
+        ).values_list('pk', 'warehouse_id', 'item_id', 'quantity')
+    }
+    drift = []
+    for key in sorted(ledger.keys() | stored.keys()):
+        pk, quantity = stored.get(key, (None, Decimal('0')))
+        balance = ledger.get(key, Decimal('0'))
+        if quantity != balance:
+            drift.append({
+                'stock_id': pk, 'warehouse_id': key[0], 'item_id': key[1],
+                'quantity': quantity, 'ledger': balance,
+            })
+    return drift
+
+
+@transaction.atomic
+def rebuild_stock_balances(company):
+    """Overwrite drifted Stock quantities with the ledger balances; returns the drift found"""
+    drift = find_stock_drift(company)
+    now = timezone.now()
+    Stock.objects.bulk_update(
+        [Stock(pk=row['stock_id'], quantity=row['ledger'], updated_at=now) for row in drift if row['stock_id']],
+        ['quantity', 'updated_at'],
+    )
+    Stock.objects.bulk_create([
+        Stock(warehouse_id=row['warehouse_id'], item_id=row['item_id'], quantity=row['ledger'])
+        for row in drift if not row['stock_id']
+    ])
+    return drift
+
+
+@transaction.atomic
+def adopt_stock_balances(company, user=None):
+    """
+    Record adjustment movements so the ledger matches the current Stock
+    quantities, for balances set before every change went through the
+    ledger; returns the drift found
+    """
+    drift = find_stock_drift(company)
+    movements = [
+        StockMovement(
+            company=company,
+            warehouse_id=row['warehouse_id'],
+            item_id=row['item_id'],
+            movement_type='adjustment',
+            quantity=row['quantity'] - row['ledger'],
+            reference_type='ledger_opening',
+            date=timezone.now(),
+            created_by=user,
+            notes='Opening balance for the stock ledger',
+        )
+        for row in drift
+    ]
+    costs = CostPosting(movements)
+    StockMovement.objects.bulk_create(movements)
+    costs.save()
+    return drift
+
+
+def reserve_stock(company, quantities, reference_type, reference_id, expires_at=None):
+    """
+    Hold `quantities` ({item_id: quantity}) for a document, from the
+    warehouses with the most free stock first. Each row is claimed with a
+    conditional UPDATE (reserved + n <= quantity), so concurrent
+    reservations only contend on the rows they touch and can never push
+    reserved above quantity. Raises InsufficientStockError, undoing this
+    call's holds, if an item cannot be covered.
+    """
+    quantities = {item_id: quantity for item_id, quantity in quantities.items() if quantity > 0}
+    free = F('quantity') - F('reserved')
+    candidates = defaultdict(list)
+    rows = Stock.objects.filter(
+        warehouse__company=company, item_id__in=quantities
+    ).annotate(free=free).filter(free__gt=0).order_by('item_id', '-free', 'pk')
+    for pk, item_id, available in rows.values_list('pk', 'item_id', 'free'):
+        candidates[item_id].append((pk, available))
+
+    now = timezone.now()
+    reservations = []
+    with transaction.atomic():
+        for item_id, quantity in quantities.items():
+            remaining = quantity
+            for pk, available in candidates[item_id]:
+                while remaining > 0 and available > 0:
+                    take = min(available, remaining)
+                    claimed = Stock.objects.filter(pk=pk, quantity__gte=F('reserved') + take).update(
+                        reserved=F('reserved') + take, updated_at=now
+                    )
+                    if claimed:
+                        reservations.append(StockReservation(
+                            company=company, stock_id=pk, quantity=take, reference_type=reference_type,
+                            reference_id=reference_id, expires_at=expires_at,
+                        ))
+                        remaining -= take
+                        available -= take
+                    else:
+                        # Another reservation got there first; retry with what is left now
+                        available = Stock.objects.filter(pk=pk).annotate(free=free).values_list('free', flat=True).first() or 0
+                if remaining <= 0:
+                    break
+            if remaining > 0:
+                raise InsufficientStockError(item_id, quantity - remaining, quantity)
+        return StockReservation.objects.bulk_create(reservations)
+
+
+def release_reservations(reference_type, reference_ids, status='released'):
+    """
+    Give back the active reservations of documents with one UPDATE of the
+    stock rows; returns the reservations that were released
+    """
+    with transaction.atomic():
+        reservations = list(StockReservation.objects.select_for_update().filter(
+            reference_type=reference_type, reference_id__in=reference_ids, status='active'
+        ).select_related('stock'))
+        if not reservations:
+            return []
+
+        held = defaultdict(Decimal)
+        for reservation in reservations:
+            held[reservation.stock_id] += reservation.quantity
+        now = timezone.now()
+        Stock.objects.filter(pk__in=held).update(
+            reserved=F('reserved') - Case(
+                *[When(pk=stock_id, then=Value(quantity)) for stock_id, quantity in held.items()],
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            updated_at=now,
+        )
+        StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).update(
+            status=status, updated_at=now
+        )
+    return reservations
+
+
+def consume_reservations(company, reference_type, reference_id, reference_number, date, user=None, notes=None):
+    """
+    Turn a document's reservations into 'out' movements, e.g. on
+    delivery: the held quantity leaves both reserved and quantity
+    """
+    with transaction.atomic():
+        reservations = release_reservations(reference_type, [reference_id], status='consumed')
+        return record_movements([
+            StockMovement(
+                company=company,
+                warehouse_id=reservation.stock.warehouse_id,
+                item_id=reservation.stock.item_id,
+                movement_type='out',
+                quantity=reservation.quantity,
+                reference_type=reference_type,
+                reference_number=reference_number,
+                date=date,
+                created_by=user,
+                notes=notes,
+            )
+            for reservation in reservations
+        ])
+
+
+def release_expired_reservations(now=None):
+    """Release every active reservation past its expiry; returns how many were released"""
+    expired = StockReservation.objects.filter(status='active', expires_at__lt=now or timezone.now())
+    released = 0
+    for reference_type in set(expired.values_list('reference_type', flat=True)):
+        reference_ids = set(expired.filter(reference_type=reference_type).values_list('reference_id', flat=True))
+        released += len(release_reservations(reference_type, reference_ids, status='expired'))
+    return released
+
+
+class ItemLookupCache:
+    """
+    In-process LRU of item lookups by barcode/SKU. Entries are stamped with
+    the company's item generation, kept in Django's cache, and expire after
+    `ttl` seconds, so changes the generation does not reach (another
+    worker with a per-process cache, Item.objects.update()) show up within
+    the TTL.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, generation):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != generation or entry[1] < time.monotonic():
+                return None
+            self.entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, generation, value):
+        with self.lock:
+            self.entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+item_lookup_cache = ItemLookupCache(ITEM_LOOKUP_CACHE_SIZE, ITEM_LOOKUP_CACHE_TTL)
+
+
+def _item_generation_key(company_id):
+    return f'inventory:item-generation:{company_id}'
+
+
+def get_item_generation(company_id):
+    return cache.get_or_set(_item_generation_key(company_id), 0, None)
+
+
+def invalidate_item_lookups(company_id):
+    """Called whenever an item of the company is written or deleted"""
+    try:
+        cache.incr(_item_generation_key(company_id))
+    except ValueError:
+        cache.set(_item_generation_key(company_id), 1, None)
+
+
+def lookup_item_by_code(company, code):
+    """
+    Resolve a scanned barcode or SKU to an active item with its sale price
+    and available stock. A barcode match wins over a SKU match.
+
+    Item data comes from the LRU when possible, leaving one query on the
+    stock of that item; otherwise item and stock come from a single query
+    using the (company, barcode) and (company, sku) indexes.
+    """
+    generation = get_item_generation(company.id)
+    key = (company.id, code)
+    item = item_lookup_cache.get(key, generation)
+
+    if item is not None:
+        stock = Stock.objects.filter(item_id=item['id']).aggregate(
+            available=Sum(F('quantity') - F('reserved'))
+        )
+        return {**item, 'available': stock['available'] or 0}
+
+    row = Item.objects.filter(
+        Q(barcode=code) | Q(sku=code),
+        company=company,
+        is_active=True,
+    ).annotate(
+        available=Coalesce(
+            Sum(F('stocks__quantity') - F('stocks__reserved')),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        barcode_match=Case(When(barcode=code, then=Value(0)), default=Value(1), output_field=IntegerField()),
+    ).order_by('barcode_match', 'id').values(
+        'id', 'sku', 'barcode', 'name', 'sale_price', 'unit', 'available', 'barcode_match',
+    ).first()
+    if row is None:
+        return None
+
+    row['matched'] = 'barcode' if row.pop('barcode_match') == 0 else 'sku'
+    available = row.pop('available')
+    item_lookup_cache.set(key, generation, row)
+    return {**row, 'available': available}
@@ -1,3 +1,338 @@
+import datetime
+import time
+from decimal import Decimal
+from unittest import mock
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import User
+from companies.models import Company
+from . import archive
+from .archive import ArchiveError, archive_stock_movements
+from .costing import inventory_valuation
+from .counts import StockCountError, import_count_lines, post_stock_count, preview_count, read_count_csv
+from .models import (
+    CostLayer, Item, Stock, StockCount, StockMovement, StockMovementArchive, StockReservation, StockTransfer,
+    StockTransferLine, Warehouse,
+)
+from .services import (
+    InsufficientStockError, consume_reservations, find_stock_drift, item_lookup_cache, ledger_balances,
+    lookup_item_by_code, record_movements, release_expired_reservations, release_reservations, reserve_stock,
+)
+from .transfers import TransferError, cancel_transfer, receive_transfer, ship_transfer
 
-# Create your tests here.
+
+class InventoryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('keeper', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.user.active_company = self.company
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.warehouse = Warehouse.objects.create(company=self.company, name='Main', code='MAIN')
+        self.item = Item.objects.create(company=self.company, name='Pen', sku='PEN', barcode='111', cost=2, sale_price=10)
+
+    def movement(self, quantity, date, movement_type='in', item=None, **fields):
+        return StockMovement(
+            company=self.company, warehouse=self.warehouse, item=item or self.item, movement_type=movement_type,
+            quantity=Decimal(quantity), date=date, **fields,
+        )
+
+    def stock(self, warehouse=None, item=None):
+        return Stock.objects.filter(warehouse=warehouse or self.warehouse, item=item or self.item).first()
+
+
+class ItemLookupTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        item_lookup_cache.clear()
+        Stock.objects.create(warehouse=self.warehouse, item=self.item, quantity=5, reserved=2)
+
+    def test_lookup_by_barcode_and_sku(self):
+        self.assertEqual(lookup_item_by_code(self.company, '111')['matched'], 'barcode')
+        found = lookup_item_by_code(self.company, 'PEN')
+        self.assertEqual(found['matched'], 'sku')
+        self.assertEqual(found['available'], Decimal('3'))
+
+    def test_saved_item_invalidates_lookups(self):
+        lookup_item_by_code(self.company, '111')
+        self.item.sale_price = 12
+        self.item.save()
+        self.assertEqual(lookup_item_by_code(self.company, '111')['sale_price'], Decimal('12'))
+
+    def test_lookups_expire_without_invalidation(self):
+        lookup_item_by_code(self.company, '111')
+        Item.objects.filter(pk=self.item.pk).update(sale_price=15)
+        self.assertEqual(lookup_item_by_code(self.company, '111')['sale_price'], Decimal('10'))
+
+        later = time.monotonic() + item_lookup_cache.ttl + 1
+        with mock.patch('inventory.services.time.monotonic', return_value=later):
+            self.assertEqual(lookup_item_by_code(self.company, '111')['sale_price'], Decimal('15'))
+
+
+class ReservationTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Warehouse.objects.create(company=self.company, name='Backup', code='BACK')
+        now = timezone.now()
+        record_movements([
+            self.movement('10', now, unit_cost=Decimal('2')),
+            StockMovement(company=self.company, warehouse=self.other, item=self.item, movement_type='in',
+                          quantity=Decimal('4'), date=now, unit_cost=Decimal('2')),
+        ])
+
+    def test_reserve_takes_most_free_stock_first(self):
+        reserve_stock(self.company, {self.item.id: Decimal('12')}, 'sales_order', 1)
+        self.assertEqual(self.stock().reserved, Decimal('10'))
+        self.assertEqual(self.stock(self.other).reserved, Decimal('2'))
+
+    def test_reserve_cannot_exceed_free_stock(self):
+        reserve_stock(self.company, {self.item.id: Decimal('12')}, 'sales_order', 1)
+        with self.assertRaises(InsufficientStockError):
+            reserve_stock(self.company, {self.item.id: Decimal('3')}, 'sales_order', 2)
+        self.assertEqual(self.stock(self.other).reserved, Decimal('2'))
+        self.assertFalse(StockReservation.objects.filter(reference_id=2).exists())
+
+    def test_consume_takes_reserved_quantity_out_of_stock(self):
+        reserve_stock(self.company, {self.item.id: Decimal('3')}, 'sales_order', 1)
+        movements = consume_reservations(self.company, 'sales_order', 1, 'SO-1', timezone.now())
+
+        self.assertEqual([(movement.movement_type, movement.quantity) for movement in movements], [('out', Decimal('3'))])
+        stock = self.stock()
+        self.assertEqual((stock.quantity, stock.reserved), (Decimal('7'), Decimal('0')))
+        self.assertEqual(StockReservation.objects.get().status, 'consumed')
+        self.assertEqual(find_stock_drift(self.company), [])
+
+    def test_release_gives_reserved_quantity_back(self):
+        reserve_stock(self.company, {self.item.id: Decimal('3')}, 'sales_order', 1)
+        release_reservations('sales_order', [1])
+        stock = self.stock()
+        self.assertEqual((stock.quantity, stock.reserved), (Decimal('10'), Decimal('0')))
+        self.assertEqual(release_reservations('sales_order', [1]), [])
+
+    def test_expired_reservations_are_released(self):
+        past = timezone.now() - datetime.timedelta(minutes=1)
+        reserve_stock(self.company, {self.item.id: Decimal('3')}, 'sales_order', 1, expires_at=past)
+        reserve_stock(self.company, {self.item.id: Decimal('2')}, 'sales_order', 2)
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(self.stock().reserved, Decimal('2'))
+        self.assertEqual(StockReservation.objects.get(reference_id=1).status, 'expired')
+
+    def test_reserved_quantity_cannot_be_edited(self):
+        reserve_stock(self.company, {self.item.id: Decimal('3')}, 'sales_order', 1)
+        response = self.client.patch(f'/api/inventory/stocks/{self.stock().id}/', {'reserved': '0'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock().reserved, Decimal('3'))
+
+
+class CostPostingTests(InventoryTestCase):
+    def receive_and_issue(self):
+        start = timezone.now() - datetime.timedelta(days=3)
+        record_movements([
+            self.movement('10', start, unit_cost=Decimal('2')),
+            self.movement('10', start + datetime.timedelta(days=1), unit_cost=Decimal('3')),
+        ])
+        [issue] = record_movements([self.movement('15', start + datetime.timedelta(days=2), 'out')])
+        return start, issue
+
+    def valuation(self, as_of=None):
+        return inventory_valuation(self.company, as_of).get((self.warehouse.id, self.item.id))
+
+    def test_fifo_consumes_oldest_layers(self):
+        start, issue = self.receive_and_issue()
+        self.assertEqual(issue.unit_cost, Decimal('2.3333'))
+        self.assertEqual(self.valuation(), (Decimal('5'), Decimal('15')))
+        self.assertEqual(
+            CostLayer.objects.filter(remaining_quantity__gt=0).values_list('unit_cost', flat=True).get(), Decimal('3')
+        )
+
+    def test_average_folds_layers(self):
+        self.company.costing_method = 'average'
+        self.company.save()
+        start, issue = self.receive_and_issue()
+        self.assertEqual(issue.unit_cost, Decimal('2.5'))
+        self.assertEqual(self.valuation(), (Decimal('5'), Decimal('12.5')))
+
+    def test_valuation_as_of(self):
+        start, issue = self.receive_and_issue()
+        self.assertEqual(self.valuation(start + datetime.timedelta(hours=36)), (Decimal('20'), Decimal('50')))
+        self.assertIsNone(self.valuation(start - datetime.timedelta(hours=1)))
+
+    def test_unlayered_quantity_is_costed_at_item_cost(self):
+        record_movements([self.movement('2', timezone.now(), unit_cost=Decimal('5'))])
+        [issue] = record_movements([self.movement('4', timezone.now(), 'out')])
+        self.assertEqual(issue.unit_cost, Decimal('3.5'))
+
+    def test_returns_come_back_at_average_cost(self):
+        self.receive_and_issue()
+        [returned] = record_movements([self.movement('1', timezone.now())])
+        self.assertEqual(returned.unit_cost, Decimal('3'))
+
+
+class StockCountTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.marker = Item.objects.create(company=self.company, name='Marker', sku='MRK', barcode='222')
+        record_movements([
+            self.movement('10', timezone.now(), unit_cost=Decimal('2')),
+            self.movement('4', timezone.now(), unit_cost=Decimal('2'), item=self.marker),
+        ])
+        self.count = StockCount.objects.create(company=self.company, date=datetime.date(2026, 1, 31))
+
+    def import_csv(self, *rows):
+        return import_count_lines(self.count, read_count_csv(['warehouse,sku,quantity\n', *rows]))
+
+    def test_import_reports_bad_rows(self):
+        imported, errors = self.import_csv('MAIN,PEN,3\n', 'MAIN,222,1\n', 'MAIN,PEN,2\n', 'NOPE,PEN,1\n', 'MAIN,PEN,x\n')
+        self.assertEqual(imported, 2)
+        self.assertEqual([error['line'] for error in errors], [5, 6])
+        self.assertEqual(self.count.lines.get(item=self.item).counted_quantity, Decimal('5'))
+
+    def test_post_adjusts_stock_to_counted(self):
+        self.import_csv('MAIN,PEN,7\n', 'MAIN,MRK,4\n')
+        preview = preview_count(self.count)
+        self.assertEqual([(row['sku'], row['difference']) for row in preview], [('PEN', Decimal('-3'))])
+
+        movements = post_stock_count(self.count, self.user)
+        self.assertEqual([movement.quantity for movement in movements], [Decimal('-3')])
+        self.assertEqual(self.stock().quantity, Decimal('7'))
+        self.assertEqual(self.count.lines.get(item=self.item).expected_quantity, Decimal('10'))
+        self.assertEqual(find_stock_drift(self.company), [])
+
+        self.count.refresh_from_db()
+        self.assertEqual(self.count.status, 'posted')
+        with self.assertRaises(StockCountError):
+            post_stock_count(self.count, self.user)
+        with self.assertRaises(StockCountError):
+            self.import_csv('MAIN,PEN,1\n')
+
+
+class StockTransferTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.destination = Warehouse.objects.create(company=self.company, name='Shop', code='SHOP')
+        record_movements([self.movement('10', timezone.now() - datetime.timedelta(hours=1), unit_cost=Decimal('3'))])
+        self.transfer = StockTransfer.objects.create(
+            company=self.company, source_warehouse=self.warehouse, destination_warehouse=self.destination,
+            date=datetime.date(2026, 1, 31),
+        )
+        StockTransferLine.objects.create(transfer=self.transfer, item=self.item, quantity=4)
+
+    def balances(self):
+        source, destination = self.stock(), self.stock(self.destination)
+        return source.quantity, destination.quantity, destination.in_transit
+
+    def test_ship_and_receive(self):
+        ship_transfer(self.transfer, self.user)
+        self.assertEqual(self.balances(), (Decimal('6'), Decimal('0'), Decimal('4')))
+        self.assertEqual(self.transfer.lines.get().unit_cost, Decimal('3'))
+
+        receive_transfer(self.transfer, self.user)
+        self.assertEqual(self.balances(), (Decimal('6'), Decimal('4'), Decimal('0')))
+        valuation = inventory_valuation(self.company)
+        self.assertEqual(valuation[self.destination.id, self.item.id], (Decimal('4'), Decimal('12')))
+        self.assertEqual(find_stock_drift(self.company), [])
+        with self.assertRaises(TransferError):
+            receive_transfer(self.transfer, self.user)
+
+    def test_cancel_in_transit_returns_to_source(self):
+        ship_transfer(self.transfer, self.user)
+        cancel_transfer(self.transfer, self.user)
+        self.assertEqual(self.balances(), (Decimal('10'), Decimal('0'), Decimal('0')))
+        self.assertEqual(StockTransfer.objects.get().status, 'cancelled')
+        self.assertEqual(find_stock_drift(self.company), [])
+
+    def test_cancel_draft_moves_nothing(self):
+        self.assertEqual(cancel_transfer(self.transfer, self.user), [])
+        self.assertEqual(self.stock().quantity, Decimal('10'))
+        self.assertIsNone(self.stock(self.destination))
+
+    def test_reserved_stock_cannot_be_shipped(self):
+        reserve_stock(self.company, {self.item.id: Decimal('8')}, 'sales_order', 1)
+        with self.assertRaises(InsufficientStockError):
+            ship_transfer(self.transfer, self.user)
+        self.assertEqual(StockTransfer.objects.get().status, 'draft')
+        self.assertEqual(self.stock().quantity, Decimal('10'))
+
+
+class StockApiTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        record_movements([self.movement('10', timezone.now())])
+        reserve_stock(self.company, {self.item.id: Decimal('6')}, 'sales_order', 1)
+
+    def post_movement(self, movement_type, quantity, **fields):
+        return self.client.post('/api/inventory/movements/', {
+            'warehouse': self.warehouse.id, 'item': self.item.id, 'movement_type': movement_type,
+            'quantity': quantity, 'date': '2026-01-01T10:00:00Z', **fields,
+        }, format='json')
+
+    def test_stock_cannot_be_deleted(self):
+        response = self.client.delete(f'/api/inventory/stocks/{self.stock().id}/')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(self.stock().quantity, Decimal('10'))
+
+    def test_out_movement_cannot_take_reserved_stock(self):
+        self.assertEqual(self.post_movement('out', '5').status_code, 400)
+        self.assertEqual(self.post_movement('out', '4').status_code, 201)
+        stock = self.stock()
+        self.assertEqual((stock.quantity, stock.reserved), (Decimal('6'), Decimal('6')))
+
+    def test_transfer_and_reference_type_are_not_accepted(self):
+        self.assertEqual(self.post_movement('transfer', '-2').status_code, 400)
+        response = self.post_movement('in', '2', reference_type='archive_opening')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(StockMovement.objects.get(pk=response.json()['id']).reference_type)
+
+
+class StockArchiveTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.make_aware(datetime.datetime(2025, 1, 1))
+        record_movements([
+            self.movement('5' if day % 3 else '2', self.day(day), 'in' if day % 3 else 'out', unit_cost=Decimal('2'))
+            for day in range(60)
+        ])
+        self.points = [self.day(day) + datetime.timedelta(hours=12) for day in (5, 25, 40, 59)]
+        self.balances = [ledger_balances(self.company, point) for point in self.points]
+
+    def day(self, day):
+        return self.start + datetime.timedelta(days=day)
+
+    def assertBalancesUnchanged(self):
+        self.assertEqual([ledger_balances(self.company, point) for point in self.points], self.balances)
+        self.assertEqual(find_stock_drift(self.company), [])
+
+    def test_archive_keeps_balances(self):
+        run = archive_stock_movements(self.company, self.day(30), batch_size=7)
+        self.assertEqual(run.archived_count, 30)
+        self.assertEqual(StockMovementArchive.objects.count(), 30)
+        self.assertEqual(StockMovement.objects.filter(reference_type='archive_opening').count(), 1)
+        self.assertBalancesUnchanged()
+
+        archive_stock_movements(self.company, self.day(45))
+        self.assertEqual(StockMovementArchive.objects.count(), 45)
+        self.assertBalancesUnchanged()
+        with self.assertRaises(ArchiveError):
+            archive_stock_movements(self.company, self.day(10))
+
+    def test_interrupted_run_keeps_balances(self):
+        add_to_openings = archive._add_to_openings
+        batches = []
+
+        def fail_on_third_batch(company, deltas, date):
+            batches.append(date)
+            if len(batches) == 3:
+                raise RuntimeError('interrupted')
+            return add_to_openings(company, deltas, date)
+
+        with mock.patch.object(archive, '_add_to_openings', fail_on_third_batch):
+            with self.assertRaises(RuntimeError):
+                archive_stock_movements(self.company, self.day(30), batch_size=7)
+        self.assertEqual(StockMovementArchive.objects.count(), 14)
+        self.assertBalancesUnchanged()
+
+        archive_stock_movements(self.company, self.day(30), batch_size=7)
+        self.assertEqual(StockMovementArchive.objects.count(), 30)
+        self.assertBalancesUnchanged()
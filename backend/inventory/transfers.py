@@ -0,0 +1,156 @@
+"""
+Warehouse transfers: shipping posts the source leg and shows the lines in
+transit at the destination, receiving posts the destination leg
+"""
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from .models import Stock, StockMovement, StockTransfer, StockTransferLine
+from .services import InsufficientStockError, apply_stock_deltas, record_movements
+
+
+class TransferError(Exception):
+    pass
+
+
+def _lock_transfer(transfer, status):
+    transfer = StockTransfer.objects.select_for_update().get(pk=transfer.pk)
+    if transfer.status != status:
+        raise TransferError(f"Transfer {transfer.transfer_number} is {transfer.status}, expected {status}")
+    return transfer
+
+
+def _lock_stocks(warehouse_ids, lines):
+    stocks = Stock.objects.select_for_update().filter(
+        warehouse_id__in=warehouse_ids, item_id__in=[line.item_id for line in lines]
+    )
+    return {(stock.warehouse_id, stock.item_id): stock for stock in stocks}
+
+
+def _legs(transfer, lines, warehouse_id, sign, date, user):
+    """
+    One 'transfer' movement per line; the incoming legs carry the cost the
+    lines left the source at, so their cost layers move with them
+    """
+    return [
+        StockMovement(
+            company_id=transfer.company_id,
+            warehouse_id=warehouse_id,
+            item_id=line.item_id,
+            movement_type='transfer',
+            quantity=sign * line.quantity,
+            unit_cost=line.unit_cost if sign > 0 else None,
+            reference_type='stock_transfer',
+            reference_number=transfer.transfer_number,
+            date=date,
+            created_by=user,
+        )
+        for line in lines
+    ]
+
+
+def ship_transfer(transfer, user=None):
+    """
+    Take a draft transfer's lines out of the source warehouse and put them
+    in transit at the destination. The stock rows of both warehouses are
+    locked with one query and updated in bulk. Raises
+    InsufficientStockError if the source cannot cover a line.
+    """
+    with transaction.atomic():
+        transfer = _lock_transfer(transfer, 'draft')
+        lines = list(transfer.lines.all())
+        if not lines:
+            raise TransferError("Transfer has no lines")
+        source_id, destination_id = transfer.source_warehouse_id, transfer.destination_warehouse_id
+
+        stocks = _lock_stocks([source_id, destination_id], lines)
+        for line in lines:
+            stock = stocks.get((source_id, line.item_id))
+            available = stock.available if stock else 0
+            if available < line.quantity:
+                raise InsufficientStockError(line.item_id, available, line.quantity)
+
+        now = timezone.now()
+        movements = record_movements(_legs(transfer, lines, source_id, -1, now, user))
+        for line, movement in zip(lines, movements):
+            line.unit_cost = movement.unit_cost
+        StockTransferLine.objects.bulk_update(lines, ['unit_cost'])
+        apply_stock_deltas({(destination_id, line.item_id): line.quantity for line in lines}, field='in_transit')
+
+        transfer.status = 'in_transit'
+        transfer.shipped_at = now
+        transfer.save(update_fields=['status', 'shipped_at', 'updated_at'])
+    return movements
+
+
+def _land(transfer, warehouse_id, status, user):
+    """Post the incoming legs into `warehouse_id` and clear the lines from transit"""
+    with transaction.atomic():
+        transfer = _lock_transfer(transfer, 'in_transit')
+        lines = list(transfer.lines.all())
+        _lock_stocks([transfer.destination_warehouse_id, warehouse_id], lines)
+
+        now = timezone.now()
+        movements = record_movements(_legs(transfer, lines, warehouse_id, 1, now, user))
+        apply_stock_deltas(
+            {(transfer.destination_warehouse_id, line.item_id): -line.quantity for line in lines}, field='in_transit'
+        )
+
+        transfer.status = status
+        timestamp = 'received_at' if status == 'received' else 'cancelled_at'
+        setattr(transfer, timestamp, now)
+        transfer.save(update_fields=['status', timestamp, 'updated_at'])
+    return movements
+
+
+def receive_transfer(transfer, user=None):
+    """Bring an in-transit transfer into its destination warehouse"""
+    return _land(transfer, transfer.destination_warehouse_id, 'received', user)
+
+
+def cancel_transfer(transfer, user=None):
+    """
+    Cancel a transfer; one already shipped goes back into its source
+    warehouse at the cost it left with
+    """
+    with transaction.atomic():
+        # Decided under the lock, so a concurrent ship cannot slip in between
+        transfer = StockTransfer.objects.select_for_update().get(pk=transfer.pk)
+        if transfer.status == 'in_transit':
+            return _land(transfer, transfer.source_warehouse_id, 'cancelled', user)
+        transfer = _lock_transfer(transfer, 'draft')
+        transfer.status = 'cancelled'
+        transfer.cancelled_at = timezone.now()
+        transfer.save(update_fields=['status', 'cancelled_at', 'updated_at'])
+    return []
+
+
+def in_transit_balances(company, as_of=None, warehouse_id=None, item_id=None):
+    """
+    Quantity in transit towards each warehouse and item, as
+    {(warehouse_id, item_id): quantity}: the current Stock.in_transit, or
+    as of a past point the lines shipped by then and not yet received or
+    cancelled by then
+    """
+    if as_of is None:
+        stocks = Stock.objects.filter(warehouse__company=company, in_transit__gt=0)
+        if warehouse_id:
+            stocks = stocks.filter(warehouse_id=warehouse_id)
+        if item_id:
+            stocks = stocks.filter(item_id=item_id)
+        return {
+            (warehouse, item): quantity
+            for warehouse, item, quantity in stocks.values_list('warehouse_id', 'item_id', 'in_transit')
+        }
+
+    lines = StockTransferLine.objects.filter(
+        transfer__company=company, transfer__shipped_at__lte=as_of,
+    ).exclude(
+        Q(transfer__received_at__lte=as_of) | Q(transfer__cancelled_at__lte=as_of)
+    )
+    if warehouse_id:
+        lines = lines.filter(transfer__destination_warehouse_id=warehouse_id)
+    if item_id:
+        lines = lines.filter(item_id=item_id)
+    rows = lines.order_by().values('transfer__destination_warehouse_id', 'item_id').annotate(total=Sum('quantity'))
+    return {(row['transfer__destination_warehouse_id'], row['item_id']): row['total'] for row in rows}
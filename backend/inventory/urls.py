@@ -3,7 +3,11 @@ from .views import (
     WarehouseListCreateView, WarehouseDetailView,
     ItemListCreateView, ItemDetailView,
     StockListCreateView, StockDetailView,
-    StockMovementListCreateView, StockMovementDetailView
+    StockMovementListCreateView, StockMovementDetailView, StockAsOfView,
+    InventoryValuationView, StockCountListCreateView, StockCountDetailView,
+    StockCountImportView, StockCountPreviewView, StockCountPostView,
+    StockTransferListCreateView, StockTransferDetailView, StockTransferActionView,
+    StockMovementArchiveListView,
 )
 
 urlpatterns = [
@@ -13,6 +17,19 @@ urlpatterns = [
     path('items/<int:pk>/', ItemDetailView.as_view(), name='item-detail'),
     path('stocks/', StockListCreateView.as_view(), name='stock-list-create'),
     path('stocks/<int:pk>/', StockDetailView.as_view(), name='stock-detail'),
+    path('stocks/as-of/', StockAsOfView.as_view(), name='stock-as-of'),
+    path('valuation/', InventoryValuationView.as_view(), name='inventory-valuation'),
+    path('stock-counts/', StockCountListCreateView.as_view(), name='stock-count-list-create'),
+    path('stock-counts/<int:pk>/', StockCountDetailView.as_view(), name='stock-count-detail'),
+    path('stock-counts/<int:pk>/import/', StockCountImportView.as_view(), name='stock-count-import'),
+    path('stock-counts/<int:pk>/preview/', StockCountPreviewView.as_view(), name='stock-count-preview'),
+    path('stock-counts/<int:pk>/post/', StockCountPostView.as_view(), name='stock-count-post'),
+    path('transfers/', StockTransferListCreateView.as_view(), name='stock-transfer-list-create'),
+    path('transfers/<int:pk>/', StockTransferDetailView.as_view(), name='stock-transfer-detail'),
+    path(
+        'transfers/<int:pk>/<str:action>/', StockTransferActionView.as_view(), name='stock-transfer-action',
+    ),
     path('movements/', StockMovementListCreateView.as_view(), name='movement-list-create'),
+    path('movements/archive/', StockMovementArchiveListView.as_view(), name='movement-archive-list'),
     path('movements/<int:pk>/', StockMovementDetailView.as_view(), name='movement-detail'),
 ]
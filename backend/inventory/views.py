@@ -1,6 +1,23 @@
+import datetime
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import generics, permissions
-from .models import Warehouse, Item, Stock, StockMovement
-from .serializers import WarehouseSerializer, ItemSerializer, StockSerializer, StockMovementSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from .models import Warehouse, Item, Stock, StockMovement, StockMovementArchive, StockCount, StockTransfer
+from .serializers import (
+    WarehouseSerializer, ItemSerializer, StockSerializer, StockMovementSerializer, StockCountSerializer,
+    StockMovementArchiveSerializer, StockTransferSerializer,
+)
+from .costing import inventory_valuation
+from .counts import StockCountError, import_count_lines, post_stock_count, preview_count, read_count_csv
+from .services import InsufficientStockError, adjust_stock, ledger_balances, record_movements
+from .transfers import TransferError, cancel_transfer, in_transit_balances, receive_transfer, ship_transfer
 
 
 class WarehouseListCreateView(generics.ListCreateAPIView):
@@ -67,8 +84,18 @@ class StockListCreateView(generics.ListCreateAPIView):
             return Stock.objects.filter(warehouse__company=user_company)
         return Stock.objects.none()
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        """The initial quantity is recorded in the ledger as an adjustment"""
+        quantity = serializer.validated_data.pop('quantity', 0)
+        stock = serializer.save(quantity=0)
+        adjust_stock(self.request.user.active_company, stock.warehouse_id, stock.item_id, quantity,
+                     self.request.user, notes='Opening quantity')
+        stock.refresh_from_db()
+
 
-class StockDetailView(generics.RetrieveUpdateDestroyAPIView):
+class StockDetailView(generics.RetrieveUpdateAPIView):
+    """Stock rows are not deleted; a balance is zeroed by setting its quantity"""
     serializer_class = StockSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -78,24 +105,75 @@ class StockDetailView(generics.RetrieveUpdateDestroyAPIView):
             return Stock.objects.filter(warehouse__company=user_company)
         return Stock.objects.none()
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """Quantity changes are recorded in the ledger as adjustments"""
+        quantity = serializer.validated_data.pop('quantity', None)
+        stock = serializer.save()
+        if quantity is not None:
+            adjust_stock(self.request.user.active_company, stock.warehouse_id, stock.item_id, quantity,
+                         self.request.user, notes='Manual stock correction')
+            stock.refresh_from_db()
+
+
+def filter_movements(queryset, params):
+    """
+    Narrow a movement list by `warehouse`, `item`, `reference_number` and
+    a `start_date`/`end_date` (YYYY-MM-DD) range
+    """
+    for param in ('warehouse', 'item', 'reference_number'):
+        if params.get(param):
+            queryset = queryset.filter(**{param: params[param]})
+    for param, lookup, time in (('start_date', 'date__gte', datetime.time.min), ('end_date', 'date__lte', datetime.time.max)):
+        value = params.get(param)
+        if not value:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({"error": f"Invalid {param}, expected YYYY-MM-DD"})
+        queryset = queryset.filter(**{lookup: timezone.make_aware(datetime.datetime.combine(day, time))})
+    return queryset.select_related('item', 'warehouse')
+
 
 class StockMovementListCreateView(generics.ListCreateAPIView):
+    """Recent movements; those before the archive cutoff are listed under movements/archive/"""
     serializer_class = StockMovementSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return StockMovement.objects.filter(company=user_company)
+            return filter_movements(StockMovement.objects.filter(company=user_company), self.request.query_params)
         return StockMovement.objects.none()
 
+    @transaction.atomic
     def perform_create(self, serializer):
+        """
+        Movements are applied to the stock balances as they are recorded. An
+        'out' movement may only take the warehouse's free stock; quantity
+        held by reservations stays with their documents.
+        """
         user_company = self.request.user.active_company
         if user_company:
-            serializer.save(company=user_company, created_by=self.request.user)
+            movement = StockMovement(**serializer.validated_data, company=user_company, created_by=self.request.user)
+            if movement.movement_type == 'out':
+                stock = Stock.objects.select_for_update().filter(
+                    warehouse_id=movement.warehouse_id, item_id=movement.item_id
+                ).first()
+                available = stock.available if stock else 0
+                if available < movement.quantity:
+                    raise ValidationError(
+                        {"error": str(InsufficientStockError(movement.item_id, available, movement.quantity))}
+                    )
+            record_movements([movement])
+            serializer.instance = movement
 
 
-class StockMovementDetailView(generics.RetrieveUpdateDestroyAPIView):
+class StockMovementDetailView(generics.RetrieveAPIView):
+    """Movements are append-only; corrections are recorded as new movements"""
     serializer_class = StockMovementSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -104,3 +182,291 @@ class StockMovementDetailView(generics.RetrieveUpdateDestroyAPIView):
         if user_company:
             return StockMovement.objects.filter(company=user_company)
         return StockMovement.objects.none()
+
+
+class StockMovementArchiveListView(generics.ListAPIView):
+    """
+    Archived movements, filtered like the movement list. A date range is
+    required so reads stay on the (company, date) index.
+    """
+    serializer_class = StockMovementArchiveSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if not user_company:
+            return StockMovementArchive.objects.none()
+        params = self.request.query_params
+        if not (params.get('start_date') and params.get('end_date')) and not params.get('reference_number'):
+            raise ValidationError({"error": "start_date and end_date, or reference_number, are required"})
+        return filter_movements(StockMovementArchive.objects.filter(company=user_company), params)
+
+
+def parse_as_of(value):
+    """Aware datetime from a date (end of that day) or an ISO datetime; None if invalid"""
+    try:
+        day = parse_date(value)
+        if day:
+            return timezone.make_aware(datetime.datetime.combine(day, datetime.time.max))
+        point = parse_datetime(value)
+    except ValueError:
+        return None
+    if point is not None and timezone.is_naive(point):
+        point = timezone.make_aware(point)
+    return point
+
+
+class StockAsOfView(APIView):
+    """
+    Stock balances per warehouse and item at a past point in time,
+    computed from the movement ledger, with the quantity then in transit
+    towards each warehouse. `as_of` is a date (end of that
+    day) or a datetime; `warehouse` and `item` narrow the result.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+
+        as_of = request.query_params.get('as_of')
+        if not as_of:
+            return Response({"error": "as_of is required"}, status=400)
+        point = parse_as_of(as_of)
+        if point is None:
+            return Response({"error": "Invalid as_of, expected YYYY-MM-DD or an ISO datetime"}, status=400)
+
+        filters = {'warehouse_id': request.query_params.get('warehouse'), 'item_id': request.query_params.get('item')}
+        balances = ledger_balances(user_company, point, **filters)
+        in_transit = in_transit_balances(user_company, point, **filters)
+        keys = {key for key, quantity in balances.items() if quantity} | in_transit.keys()
+        warehouses = Warehouse.objects.in_bulk({warehouse_id for warehouse_id, item_id in keys})
+        items = Item.objects.only('name', 'sku').in_bulk({item_id for warehouse_id, item_id in keys})
+        return Response({
+            'as_of': point,
+            'results': [
+                {
+                    'warehouse': warehouse_id,
+                    'warehouse_name': warehouses[warehouse_id].name,
+                    'item': item_id,
+                    'item_name': items[item_id].name,
+                    'sku': items[item_id].sku,
+                    'quantity': balances.get((warehouse_id, item_id), 0),
+                    'in_transit': in_transit.get((warehouse_id, item_id), 0),
+                }
+                for warehouse_id, item_id in sorted(keys)
+            ],
+        })
+
+
+class InventoryValuationView(APIView):
+    """
+    Quantity and value on hand per warehouse and item from the cost
+    layers, now or as of `as_of` (same format as stocks/as-of/);
+    `warehouse` and `item` narrow the result.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+
+        point = None
+        as_of = request.query_params.get('as_of')
+        if as_of:
+            point = parse_as_of(as_of)
+            if point is None:
+                return Response({"error": "Invalid as_of, expected YYYY-MM-DD or an ISO datetime"}, status=400)
+
+        valuation = inventory_valuation(
+            user_company, point,
+            warehouse_id=request.query_params.get('warehouse'),
+            item_id=request.query_params.get('item'),
+        )
+        warehouses = Warehouse.objects.in_bulk({warehouse_id for warehouse_id, item_id in valuation})
+        items = Item.objects.only('name', 'sku').in_bulk({item_id for warehouse_id, item_id in valuation})
+        results = [
+            {
+                'warehouse': warehouse_id,
+                'warehouse_name': warehouses[warehouse_id].name,
+                'item': item_id,
+                'item_name': items[item_id].name,
+                'sku': items[item_id].sku,
+                'quantity': quantity,
+                'value': value.quantize(Decimal('0.01')),
+            }
+            for (warehouse_id, item_id), (quantity, value) in sorted(valuation.items())
+        ]
+        return Response({
+            'as_of': point or timezone.now(),
+            'costing_method': user_company.costing_method,
+            'total_value': sum((row['value'] for row in results), Decimal('0')),
+            'results': results,
+        })
+
+
+class StockCountListCreateView(generics.ListCreateAPIView):
+    serializer_class = StockCountSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if user_company:
+            return StockCount.objects.filter(company=user_company)
+        return StockCount.objects.none()
+
+    def perform_create(self, serializer):
+        user_company = self.request.user.active_company
+        if user_company:
+            serializer.save(company=user_company, created_by=self.request.user)
+
+
+class StockCountDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = StockCountSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if user_company:
+            return StockCount.objects.filter(company=user_company)
+        return StockCount.objects.none()
+
+    def destroy(self, request, *args, **kwargs):
+        if self.get_object().status == 'posted':
+            return Response({"error": "Posted counts cannot be deleted"}, status=400)
+        return super().destroy(request, *args, **kwargs)
+
+
+class StockCountImportView(APIView):
+    """
+    Import counted quantities into a draft count from an uploaded CSV
+    `file` or a text/csv body with the columns warehouse (code), sku (or
+    barcode) and quantity. Responds with the preview of the adjustments.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+        count = get_object_or_404(StockCount, pk=pk, company=user_company)
+
+        if request.content_type.startswith('multipart/'):
+            lines = request.FILES.get('file')
+            if not lines:
+                return Response({"error": "No file uploaded"}, status=400)
+        else:
+            lines = request.stream or []
+
+        try:
+            imported, errors = import_count_lines(count, read_count_csv(lines))
+        except StockCountError as e:
+            return Response({"error": str(e)}, status=400)
+        preview = preview_count(count)
+        return Response({
+            'imported': imported,
+            'errors': errors,
+            'differences': len(preview),
+            'preview': preview,
+        }, status=400 if errors and not imported else 200)
+
+
+class StockCountPreviewView(APIView):
+    """Adjustments posting a count would make; `all=true` includes lines without a difference"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+        count = get_object_or_404(StockCount, pk=pk, company=user_company)
+        rows = preview_count(count, differences_only=request.query_params.get('all') not in ('1', 'true'))
+        return Response({'count': count.count_number, 'status': count.status, 'results': rows})
+
+
+class StockCountPostView(APIView):
+    """Post a draft count as adjustment movements in one transaction"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+        count = get_object_or_404(StockCount, pk=pk, company=user_company)
+        try:
+            movements = post_stock_count(count, request.user)
+        except StockCountError as e:
+            return Response({"error": str(e)}, status=400)
+        count.refresh_from_db()
+        return Response({
+            'count': StockCountSerializer(count).data,
+            'adjustments': len(movements),
+        })
+
+
+class StockTransferListCreateView(generics.ListCreateAPIView):
+    serializer_class = StockTransferSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if user_company:
+            return StockTransfer.objects.filter(company=user_company).select_related(
+                'source_warehouse', 'destination_warehouse'
+            ).prefetch_related('lines__item')
+        return StockTransfer.objects.none()
+
+    def perform_create(self, serializer):
+        user_company = self.request.user.active_company
+        if user_company:
+            serializer.save(company=user_company, created_by=self.request.user)
+
+
+class StockTransferDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = StockTransferSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user_company = self.request.user.active_company
+        if user_company:
+            return StockTransfer.objects.filter(company=user_company)
+        return StockTransfer.objects.none()
+
+    def destroy(self, request, *args, **kwargs):
+        if self.get_object().status != 'draft':
+            return Response({"error": "Only draft transfers can be deleted"}, status=400)
+        return super().destroy(request, *args, **kwargs)
+
+
+TRANSFER_ACTIONS = {
+    'ship': ship_transfer,
+    'receive': receive_transfer,
+    'cancel': cancel_transfer,
+}
+
+
+class StockTransferActionView(APIView):
+    """
+    Move a transfer along: ship (draft to in transit), receive (in
+    transit to received) or cancel (returning shipped lines to the source)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk, action):
+        if action not in TRANSFER_ACTIONS:
+            raise Http404
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+        transfer = get_object_or_404(StockTransfer, pk=pk, company=user_company)
+        try:
+            movements = TRANSFER_ACTIONS[action](transfer, request.user)
+        except (TransferError, InsufficientStockError) as e:
+            return Response({"error": str(e)}, status=400)
+        transfer.refresh_from_db()
+        return Response({
+            'transfer': StockTransferSerializer(transfer, context={'request': request}).data,
+            'movements': StockMovementSerializer(movements, many=True).data,
+        })
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import POSSale, POSSaleItem, POSPayment
+from .models import POSShift, POSSale, POSSaleItem, POSPayment, POSRefund, POSRefundItem
 
 @admin.register(POSSale)
 class POSSaleAdmin(admin.ModelAdmin):
@@ -23,3 +23,22 @@ class POSPaymentAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+@admin.register(POSShift)
+class POSShiftAdmin(admin.ModelAdmin):
+    list_display = ('id', '__str__', 'status', 'opened_at', 'closed_at', 'cash_difference')
+    list_filter = ('status', 'opened_at')
+    search_fields = ('id', 'cashier__username')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(POSRefund)
+class POSRefundAdmin(admin.ModelAdmin):
+    list_display = ('id', '__str__', 'date', 'created_at')
+    list_filter = ('date',)
+    search_fields = ('id', 'sale__sale_number')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(POSRefundItem)
+class POSRefundItemAdmin(admin.ModelAdmin):
+    list_display = ('id', '__str__')
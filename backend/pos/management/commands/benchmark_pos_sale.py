@@ -0,0 +1,83 @@
+"""
+Management command to measure the database queries issued per POS sale
+"""
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from companies.models import Company
+from inventory.models import Item, Stock, Warehouse
+from pos.views import POSSaleViewSet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Count queries per POS sale for several basket sizes; all data is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, required=True, help='Company to run the sales for')
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 40, 100], help='Basket sizes (lines per sale)')
+        parser.add_argument('--warehouses', type=int, default=3, help='Warehouses each item is stocked in')
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(id=options['company_id'])
+        except Company.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f"Company with ID {options['company_id']} does not exist"))
+            return
+
+        try:
+            with transaction.atomic():
+                self.run(company, options['sizes'], options['warehouses'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, company, sizes, warehouse_count):
+        user = company.owner
+        user.active_company = company
+        view = POSSaleViewSet.as_view({'post': 'create'})
+        factory = APIRequestFactory()
+
+        warehouses = Warehouse.objects.bulk_create([
+            Warehouse(company=company, name=f'Benchmark {i}', code=f'BENCH-{i}')
+            for i in range(warehouse_count)
+        ])
+        items = Item.objects.bulk_create([
+            Item(company=company, name=f'Benchmark item {i}', sku=f'BENCH-{i}', sale_price=Decimal('10'))
+            for i in range(max(sizes))
+        ])
+        Stock.objects.bulk_create([
+            Stock(warehouse=warehouse, item=item, quantity=Decimal('2'))
+            for warehouse in warehouses for item in items
+        ])
+
+        for size in sizes:
+            # Three units per line so most lines draw from two warehouses
+            payload = {
+                'date': timezone.now().isoformat(),
+                'payment_method': 'cash',
+                'items': [
+                    {'item': item.id, 'quantity': '3', 'unit_price': '10', 'discount': '0'}
+                    for item in items[:size]
+                ],
+            }
+            request = factory.post('/api/pos/sales/', payload, format='json')
+            force_authenticate(request, user=user)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request)
+            if response.status_code != 201:
+                self.stdout.write(self.style.ERROR(f'{size:>4} lines: sale failed: {response.data}'))
+                continue
+            self.stdout.write(f'{size:>4} lines: {len(queries)} queries')
+
+            # Restock for the next basket
+            Stock.objects.filter(item__in=items).update(quantity=Decimal('2'))
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, all changes rolled back'))
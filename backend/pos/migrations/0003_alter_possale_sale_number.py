@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0002_possale_change_amount_possale_paid_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='possale',
+            name='sale_number',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='شماره فروش'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def seed_sale_number_sequences(apps, schema_editor):
+    """
+    Continue POS sale numbering where the old POS-YYYYMMDD-XXXX counter left off
+    """
+    POSSale = apps.get_model('pos', 'POSSale')
+    DocumentSequence = apps.get_model('companies', 'DocumentSequence')
+
+    last_numbers = {}
+    for company_id, sale_number in POSSale.objects.values_list('company_id', 'sale_number').iterator():
+        try:
+            number = int(sale_number.split('-')[-1])
+        except (ValueError, IndexError):
+            continue
+        last_numbers[company_id] = max(number, last_numbers.get(company_id, 0))
+
+    DocumentSequence.objects.bulk_create([
+        DocumentSequence(
+            company_id=company_id,
+            document_type='pos_sale',
+            prefix='POS',
+            format='{prefix}-{date:%Y%m%d}-{number}',
+            padding=4,
+            next_number=last_number + 1,
+        )
+        for company_id, last_number in last_numbers.items()
+    ])
+
+
+def remove_sale_number_sequences(apps, schema_editor):
+    DocumentSequence = apps.get_model('companies', 'DocumentSequence')
+    DocumentSequence.objects.filter(document_type='pos_sale').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+        ('pos', '0003_alter_possale_sale_number'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_sale_number_sequences, remove_sale_number_sequences),
+    ]
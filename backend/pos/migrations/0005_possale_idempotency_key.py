@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+        ('pos', '0004_seed_sale_number_sequences'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='possale',
+            unique_together={('company', 'sale_number')},
+        ),
+        migrations.AddField(
+            model_name='possale',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='کلید یکتایی'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='possale',
+            unique_together={('company', 'idempotency_key'), ('company', 'sale_number')},
+        ),
+    ]
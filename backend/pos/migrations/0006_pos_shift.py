@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:36
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+        ('pos', '0005_possale_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='POSShift',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('open', 'باز'), ('closed', 'بسته')], default='open', max_length=20, verbose_name='وضعیت')),
+                ('opened_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان شروع')),
+                ('closed_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان پایان')),
+                ('opening_float', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='موجودی اولیه صندوق')),
+                ('expected_cash', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='نقد مورد انتظار')),
+                ('closing_cash', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='نقد شمارش شده')),
+                ('cash_difference', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='اختلاف صندوق')),
+                ('summary', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='گزارش Z')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='یادداشت\u200cها')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('cashier', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='pos_shifts', to=settings.AUTH_USER_MODEL, verbose_name='صندوقدار')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_shifts', to='companies.company', verbose_name='شرکت')),
+            ],
+            options={
+                'verbose_name': 'شیفت صندوق',
+                'verbose_name_plural': 'شیفت\u200cهای صندوق',
+                'ordering': ['-opened_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='possale',
+            name='shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales', to='pos.posshift', verbose_name='شیفت'),
+        ),
+    ]
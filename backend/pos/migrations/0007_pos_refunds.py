@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_documentsequence'),
+        ('pos', '0006_pos_shift'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='possale',
+            name='refunded_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='مبلغ مرجوعی'),
+        ),
+        migrations.AddField(
+            model_name='possaleitem',
+            name='refunded_quantity',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='تعداد مرجوعی'),
+        ),
+        migrations.CreateModel(
+            name='POSRefund',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(verbose_name='تاریخ')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='مبلغ')),
+                ('reason', models.TextField(blank=True, null=True, verbose_name='دلیل')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_refunds', to='companies.company', verbose_name='شرکت')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='ایجاد شده توسط')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refunds', to='pos.possale', verbose_name='فروش')),
+            ],
+            options={
+                'verbose_name': 'مرجوعی POS',
+                'verbose_name_plural': 'مرجوعی\u200cهای POS',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='POSRefundItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='تعداد')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مبلغ')),
+                ('refund', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='pos.posrefund', verbose_name='مرجوعی')),
+                ('sale_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refund_items', to='pos.possaleitem', verbose_name='آیتم فروش')),
+            ],
+            options={
+                'verbose_name': 'آیتم مرجوعی POS',
+                'verbose_name_plural': 'آیتم\u200cهای مرجوعی POS',
+            },
+        ),
+    ]
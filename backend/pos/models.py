@@ -1,12 +1,43 @@
 from django.db import models
 from django.conf import settings
-from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
 from companies.models import Company
+from companies.sequences import NumberedDocumentMixin
 from contacts.models import Contact
 from inventory.models import Item, Stock
 
 
-class POSSale(models.Model):
+class POSShift(models.Model):
+    """Cashier shift from opening the drawer with a float to closing it with a Z-report"""
+    STATUS_CHOICES = [
+        ('open', 'باز'),
+        ('closed', 'بسته'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='pos_shifts', verbose_name='شرکت')
+    cashier = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='pos_shifts', verbose_name='صندوقدار')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open', verbose_name='وضعیت')
+    opened_at = models.DateTimeField(auto_now_add=True, verbose_name='زمان شروع')
+    closed_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان پایان')
+    opening_float = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='موجودی اولیه صندوق')
+    expected_cash = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True, verbose_name='نقد مورد انتظار')
+    closing_cash = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True, verbose_name='نقد شمارش شده')
+    cash_difference = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True, verbose_name='اختلاف صندوق')
+    summary = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder, verbose_name='گزارش Z')
+    notes = models.TextField(blank=True, null=True, verbose_name='یادداشت‌ها')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+
+    class Meta:
+        verbose_name = 'شیفت صندوق'
+        verbose_name_plural = 'شیفت‌های صندوق'
+        ordering = ['-opened_at']
+
+    def __str__(self):
+        return f"{self.cashier} - {self.opened_at:%Y-%m-%d %H:%M}"
+
+
+class POSSale(NumberedDocumentMixin, models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('cash', 'نقدی'),
         ('card', 'کارت'),
@@ -19,8 +50,11 @@ class POSSale(models.Model):
         ('refunded', 'بازگشت داده شده'),
     ]
 
+    document_type = 'pos_sale'
+    number_field = 'sale_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='pos_sales', verbose_name='شرکت')
-    sale_number = models.CharField(max_length=100, blank=True, verbose_name='شماره فروش')
+    sale_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره فروش')
     date = models.DateTimeField(verbose_name='تاریخ')
     customer = models.ForeignKey(Contact, on_delete=models.SET_NULL, null=True, blank=True, related_name='pos_sales', verbose_name='مشتری')
     subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='جمع جزء')
@@ -28,11 +62,14 @@ class POSSale(models.Model):
     tax = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='مالیات')
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='جمع کل')
     paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='مبلغ پرداختی')
+    refunded_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='مبلغ مرجوعی')
     change_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='مبلغ برگشتی')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, verbose_name='روش پرداخت')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed', verbose_name='وضعیت')
     cashier = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, verbose_name='صندوقدار')
+    shift = models.ForeignKey(POSShift, on_delete=models.SET_NULL, null=True, blank=True, related_name='sales', verbose_name='شیفت')
     notes = models.TextField(blank=True, null=True, verbose_name='یادداشت‌ها')
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, verbose_name='کلید یکتایی')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
 
@@ -40,32 +77,16 @@ class POSSale(models.Model):
         verbose_name = 'فروش POS'
         verbose_name_plural = 'فروش‌های POS'
         ordering = ['-date']
-        unique_together = [('company', 'sale_number')]
-
-    def save(self, *args, **kwargs):
-        # Auto-generate sale number if not provided
-        if not self.sale_number:
-            # Get the last sale for this company
-            last_sale = POSSale.objects.filter(company=self.company).order_by('-id').first()
-            if last_sale and last_sale.sale_number:
-                try:
-                    # Extract number from format POS-YYYYMMDD-XXXX
-                    last_num = int(last_sale.sale_number.split('-')[-1])
-                    new_num = last_num + 1
-                except (ValueError, IndexError):
-                    new_num = 1
-            else:
-                new_num = 1
-            
-            # Format: POS-YYYYMMDD-0001
-            date_str = timezone.now().strftime('%Y%m%d')
-            self.sale_number = f"POS-{date_str}-{new_num:04d}"
-        
-        super().save(*args, **kwargs)
-    
+        unique_together = [('company', 'sale_number'), ('company', 'idempotency_key')]
+
     def calculate_totals(self):
         """Calculate subtotal, tax, and total from items"""
-        self.subtotal = sum(item.total for item in self.items.all())
+        self.set_totals(sum(item.total for item in self.items.all()))
+        self.save()
+
+    def set_totals(self, subtotal):
+        """Set subtotal, total and change from the sum of the line totals"""
+        self.subtotal = subtotal
         # Apply discount
         discounted_amount = self.subtotal - self.discount
         # Calculate tax (assuming tax is a percentage, e.g., 9% = 0.09)
@@ -74,7 +95,6 @@ class POSSale(models.Model):
         # Calculate change if paid amount is provided
         if self.paid_amount > 0:
             self.change_amount = self.paid_amount - self.total
-        self.save()
 
     def __str__(self):
         return f"{self.sale_number} - {self.total}"
@@ -87,6 +107,7 @@ class POSSaleItem(models.Model):
     unit_price = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='قیمت واحد')
     discount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='تخفیف')
     total = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='جمع')
+    refunded_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='تعداد مرجوعی')
 
     class Meta:
         verbose_name = 'آیتم فروش POS'
@@ -118,3 +139,37 @@ class POSPayment(models.Model):
 
     def __str__(self):
         return f"{self.amount} - {self.get_payment_method_display()}"
+
+
+class POSRefund(models.Model):
+    """Return of some or all lines of a POS sale"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='pos_refunds', verbose_name='شرکت')
+    sale = models.ForeignKey(POSSale, on_delete=models.CASCADE, related_name='refunds', verbose_name='فروش')
+    date = models.DateTimeField(verbose_name='تاریخ')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='مبلغ')
+    reason = models.TextField(blank=True, null=True, verbose_name='دلیل')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, verbose_name='ایجاد شده توسط')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+
+    class Meta:
+        verbose_name = 'مرجوعی POS'
+        verbose_name_plural = 'مرجوعی‌های POS'
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.sale.sale_number} - {self.amount}"
+
+
+class POSRefundItem(models.Model):
+    refund = models.ForeignKey(POSRefund, on_delete=models.CASCADE, related_name='items', verbose_name='مرجوعی')
+    sale_item = models.ForeignKey(POSSaleItem, on_delete=models.CASCADE, related_name='refund_items', verbose_name='آیتم فروش')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='تعداد')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مبلغ')
+
+    class Meta:
+        verbose_name = 'آیتم مرجوعی POS'
+        verbose_name_plural = 'آیتم‌های مرجوعی POS'
+
+    def __str__(self):
+        return f"{self.sale_item} - {self.quantity}"
@@ -0,0 +1,198 @@
+"""
+Receipt rendering for POS sales: JSON data, plain text, HTML and ESC/POS
+bytes, cached per sale and format
+"""
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.html import escape
+from .models import POSSale, POSSaleItem
+
+
+RECEIPT_FORMATS = ['json', 'text', 'html', 'escpos']
+RECEIPT_CACHE_TIMEOUT = 24 * 60 * 60
+RECEIPT_WIDTH = 42
+MAX_RECEIPT_EXPORT = 200
+
+ESC = b'\x1b'
+GS = b'\x1d'
+ESCPOS_STYLES = {
+    'title': ESC + b'a\x01' + GS + b'!\x11',
+    'center': ESC + b'a\x01' + GS + b'!\x00',
+    'bold': ESC + b'a\x00' + ESC + b'E\x01',
+    'normal': ESC + b'a\x00' + GS + b'!\x00',
+}
+
+
+def receipt_cache_key(sale_id, output):
+    return f'pos:receipt:{sale_id}:{output}'
+
+
+def invalidate_receipts(sale_ids):
+    """Drop cached receipts of the given sales, e.g. after a void or refund"""
+    cache.delete_many([receipt_cache_key(sale_id, output) for sale_id in sale_ids for output in RECEIPT_FORMATS])
+
+
+def receipt_queryset(queryset):
+    """Sales with everything a receipt needs, loaded in a fixed number of queries"""
+    return queryset.select_related('company', 'customer', 'cashier').prefetch_related(
+        Prefetch('items', queryset=POSSaleItem.objects.select_related('item').order_by('id')),
+        'payments',
+    )
+
+
+def receipt_data(sale):
+    """Receipt fields of a sale loaded through receipt_queryset()"""
+    return {
+        'sale_number': sale.sale_number,
+        'date': sale.date,
+        'company': sale.company.name,
+        'cashier': (sale.cashier.get_full_name() or sale.cashier.username) if sale.cashier else 'N/A',
+        'customer': sale.customer.name if sale.customer else 'Walk-in Customer',
+        'items': [
+            {
+                'name': item.item.name,
+                'quantity': float(item.quantity),
+                'unit_price': float(item.unit_price),
+                'discount': float(item.discount),
+                'total': float(item.total)
+            }
+            for item in sale.items.all()
+        ],
+        'payments': [
+            {'payment_method': payment.get_payment_method_display(), 'amount': float(payment.amount)}
+            for payment in sale.payments.all()
+        ],
+        'subtotal': float(sale.subtotal),
+        'discount': float(sale.discount),
+        'tax': float(sale.tax),
+        'total': float(sale.total),
+        'paid_amount': float(sale.paid_amount),
+        'change_amount': float(sale.change_amount),
+        'payment_method': sale.get_payment_method_display(),
+        'status': sale.status,
+        'status_display': sale.get_status_display(),
+        'notes': sale.notes or ''
+    }
+
+
+def _money(value):
+    return f'{value:,.2f}'
+
+
+def _columns(left, right, width=RECEIPT_WIDTH):
+    """Left and right text on one line, truncating the left side if needed"""
+    room = width - len(right) - 1
+    return f'{left[:room]:<{room}} {right}'
+
+
+def receipt_lines(data, width=RECEIPT_WIDTH):
+    """Receipt as (style, text) lines shared by the text and ESC/POS renderers"""
+    rule = ('normal', '-' * width)
+    lines = [
+        ('title', data['company']),
+        ('center', data['sale_number']),
+        ('center', timezone.localtime(data['date']).strftime('%Y-%m-%d %H:%M')),
+        ('normal', f"Cashier: {data['cashier']}"),
+        ('normal', f"Customer: {data['customer']}"),
+        rule,
+    ]
+    if data['status'] != 'completed':
+        lines.insert(1, ('title', f"*** {data['status'].upper()} ***"))
+
+    for item in data['items']:
+        lines.append(('normal', item['name'][:width]))
+        lines.append(('normal', _columns(
+            f"  {item['quantity']:g} x {_money(item['unit_price'])}", _money(item['total']), width
+        )))
+        if item['discount']:
+            lines.append(('normal', _columns('  Discount', f"-{_money(item['discount'])}", width)))
+    lines.append(rule)
+
+    lines.append(('normal', _columns('Subtotal', _money(data['subtotal']), width)))
+    if data['discount']:
+        lines.append(('normal', _columns('Discount', f"-{_money(data['discount'])}", width)))
+    if data['tax']:
+        lines.append(('normal', _columns('Tax', _money(data['tax']), width)))
+    lines.append(('bold', _columns('TOTAL', _money(data['total']), width)))
+    lines.append(('normal', _columns(f"Paid ({data['payment_method']})", _money(data['paid_amount']), width)))
+    for payment in data['payments']:
+        lines.append(('normal', _columns(f"  {payment['payment_method']}", _money(payment['amount']), width)))
+    if data['change_amount']:
+        lines.append(('normal', _columns('Change', _money(data['change_amount']), width)))
+    if data['notes']:
+        lines.append(rule)
+        lines.append(('normal', data['notes']))
+    return lines
+
+
+def render_text(data, width=RECEIPT_WIDTH):
+    return '\n'.join(text for style, text in receipt_lines(data, width)) + '\n'
+
+
+def render_escpos(data, width=RECEIPT_WIDTH, encoding='utf-8'):
+    """ESC/POS bytes: initialize, styled lines, then feed and partial cut"""
+    out = [ESC + b'@']
+    for style, text in receipt_lines(data, width):
+        out.append(ESCPOS_STYLES[style] + text.encode(encoding, 'replace') + b'\n')
+        if style == 'bold':
+            out.append(ESC + b'E\x00')
+    out.append(ESCPOS_STYLES['normal'] + ESC + b'd\x03' + GS + b'VB\x00')
+    return b''.join(out)
+
+
+def render_html(data):
+    """Self-contained receipt fragment; bulk exports concatenate these"""
+    rows = ''.join(
+        f"<tr><td>{escape(item['name'])}</td><td>{item['quantity']:g}</td>"
+        f"<td>{_money(item['unit_price'])}</td><td>{_money(item['total'])}</td></tr>"
+        for item in data['items']
+    )
+    totals = [('Subtotal', data['subtotal']), ('Discount', data['discount']), ('Tax', data['tax']),
+              ('Total', data['total']), ('Paid', data['paid_amount']), ('Change', data['change_amount'])]
+    totals_html = ''.join(
+        f'<tr><th colspan="3">{label}</th><td>{_money(value)}</td></tr>'
+        for label, value in totals if value or label in ('Total', 'Paid')
+    )
+    status = '' if data['status'] == 'completed' else f"<p class=\"status\">{escape(data['status_display'])}</p>"
+    notes = f"<p class=\"notes\">{escape(data['notes'])}</p>" if data['notes'] else ''
+    return (
+        '<div class="receipt">'
+        f"<h1>{escape(data['company'])}</h1>{status}"
+        f"<p>{escape(data['sale_number'])}<br>{timezone.localtime(data['date']):%Y-%m-%d %H:%M}</p>"
+        f"<p>Cashier: {escape(data['cashier'])}<br>Customer: {escape(data['customer'])}</p>"
+        f'<table><tbody>{rows}</tbody><tfoot>{totals_html}</tfoot></table>'
+        f"<p>{escape(data['payment_method'])}</p>{notes}"
+        '</div>'
+    )
+
+
+RENDERERS = {
+    'json': lambda data: data,
+    'text': render_text,
+    'html': render_html,
+    'escpos': render_escpos,
+}
+
+
+def get_receipts(queryset, output='json'):
+    """
+    Rendered receipts for the sales in `queryset`, in its order. Cached
+    receipts are read in one round trip; the rest are loaded through
+    receipt_queryset(), rendered and cached.
+    """
+    sale_ids = list(queryset.prefetch_related(None).values_list('id', flat=True))
+    keys = {sale_id: receipt_cache_key(sale_id, output) for sale_id in sale_ids}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [sale_id for sale_id in sale_ids if keys[sale_id] not in cached]
+    if missing:
+        render = RENDERERS[output]
+        rendered = {
+            keys[sale.id]: render(receipt_data(sale))
+            for sale in receipt_queryset(POSSale.objects.filter(id__in=missing))
+        }
+        cache.set_many(rendered, RECEIPT_CACHE_TIMEOUT)
+        cached.update(rendered)
+
+    return [cached[keys[sale_id]] for sale_id in sale_ids]
@@ -1,9 +1,13 @@
+from collections import defaultdict
+from decimal import Decimal
 from rest_framework import serializers
-from django.utils import timezone
-from django.db import transaction, models
-from .models import POSSale, POSSaleItem, POSPayment
-from inventory.models import Item, Stock
+from rest_framework.settings import api_settings
+from django.db import transaction
+from .models import POSShift, POSSale, POSSaleItem, POSPayment, POSRefund, POSRefundItem
+from inventory.models import Item
+from inventory.services import InsufficientStockError, deduct_stock
 from contacts.models import Contact
+from .services import get_open_shift
 
 
 class ItemBasicSerializer(serializers.ModelSerializer):
@@ -30,12 +34,15 @@ class POSSaleItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = POSSaleItem
         fields = ['id', 'sale', 'item', 'item_details', 'item_name', 
-                  'quantity', 'unit_price', 'discount', 'total']
-        read_only_fields = ['id']
+                  'quantity', 'unit_price', 'discount', 'total', 'refunded_quantity']
+        read_only_fields = ['id', 'refunded_quantity']
 
 
 class POSSaleItemCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating POS sale items"""
+    # Items are looked up for the whole basket at once in POSSaleCreateSerializer
+    item = serializers.IntegerField(source='item_id')
+
     class Meta:
         model = POSSaleItem
         fields = ['item', 'quantity', 'unit_price', 'discount']
@@ -80,11 +87,11 @@ class POSSaleSerializer(serializers.ModelSerializer):
     class Meta:
         model = POSSale
         fields = ['id', 'sale_number', 'date', 'customer', 'customer_name',
-                  'subtotal', 'discount', 'tax', 'total', 'paid_amount', 
+                  'subtotal', 'discount', 'tax', 'total', 'paid_amount', 'refunded_amount',
                   'change_amount', 'payment_method', 'payment_method_display',
                   'status', 'status_display', 'cashier', 'cashier_name', 
-                  'notes', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'sale_number', 'created_at', 'updated_at']
+                  'shift', 'notes', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'sale_number', 'shift', 'refunded_amount', 'created_at', 'updated_at']
 
 
 class POSSaleDetailSerializer(serializers.ModelSerializer):
@@ -104,11 +111,11 @@ class POSSaleDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = POSSale
         fields = ['id', 'sale_number', 'date', 'customer', 'customer_details',
-                  'subtotal', 'discount', 'tax', 'total', 'paid_amount', 
+                  'subtotal', 'discount', 'tax', 'total', 'paid_amount', 'refunded_amount',
                   'change_amount', 'payment_method', 'payment_method_display',
                   'status', 'status_display', 'cashier', 'cashier_name', 
-                  'notes', 'items', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'sale_number', 'created_at', 'updated_at']
+                  'shift', 'notes', 'items', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'sale_number', 'shift', 'refunded_amount', 'created_at', 'updated_at']
 
 
 class POSSaleCreateSerializer(serializers.ModelSerializer):
@@ -118,7 +125,7 @@ class POSSaleCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = POSSale
         fields = ['id', 'sale_number', 'date', 'customer', 'discount', 'tax', 'paid_amount',
-                  'payment_method', 'notes', 'items']
+                  'payment_method', 'notes', 'idempotency_key', 'items']
         read_only_fields = ['id', 'sale_number']
     
     def validate_items(self, items):
@@ -128,96 +135,154 @@ class POSSaleCreateSerializer(serializers.ModelSerializer):
         return items
     
     def validate(self, data):
-        """Validate stock availability for all items"""
+        """Validate that all items belong to the company, with one query"""
         items = data.get('items', [])
         company = self.context['request'].user.active_company
-        
-        for item_data in items:
-            item = item_data['item']
-            quantity = item_data['quantity']
-            
-            # Check if item belongs to the company
-            if item.company != company:
-                raise serializers.ValidationError(
-                    f"Item {item.name} does not belong to your company"
-                )
-            
-            # Check stock availability across all warehouses
-            total_stock = Stock.objects.filter(
-                item=item,
-                warehouse__company=company
-            ).aggregate(
-                total=models.Sum('quantity')
-            )['total'] or 0
-            
-            if total_stock < quantity:
-                raise serializers.ValidationError(
-                    f"Insufficient stock for {item.name}. Available: {total_stock}, Required: {quantity}"
-                )
-        
+
+        item_ids = {item_data['item_id'] for item_data in items}
+        self.basket_items = Item.objects.filter(company=company).in_bulk(item_ids)
+        missing = item_ids - self.basket_items.keys()
+        if missing:
+            raise serializers.ValidationError(
+                f"Items {sorted(missing)} do not belong to your company"
+            )
+
         return data
-    
+
     @transaction.atomic
     def create(self, validated_data):
-        """Create sale with items in a single transaction"""
+        """
+        Create sale with items in a single transaction. Stock availability
+        is checked while the stock rows are locked, so the number of queries
+        does not depend on the number of lines.
+        """
         items_data = validated_data.pop('items')
         request = self.context['request']
-        
-        # Set company and cashier
+
+        # Set company, cashier and the cashier's open shift
         validated_data['company'] = request.user.active_company
         validated_data['cashier'] = request.user
-        
-        # Create the sale
-        sale = POSSale.objects.create(**validated_data)
-        
-        # Create sale items
-        for item_data in items_data:
-            POSSaleItem.objects.create(sale=sale, **item_data)
-        
-        # Calculate totals
-        sale.calculate_totals()
-        
+        validated_data['shift'] = get_open_shift(request.user.active_company, request.user)
+
+        # Create the sale with its totals computed from the lines
+        sale = POSSale(**validated_data)
+        sale.set_totals(sum(item_data['total'] for item_data in items_data))
+        sale.save()
+
+        POSSaleItem.objects.bulk_create([
+            POSSaleItem(sale=sale, **item_data) for item_data in items_data
+        ])
+
         # Update inventory stock
-        self._update_inventory(sale)
-        
+        self._update_inventory(sale, items_data)
+
         return sale
-    
-    def _update_inventory(self, sale):
-        """Update inventory stock for completed sale"""
-        from inventory.models import StockMovement
-        
-        for sale_item in sale.items.all():
-            # Find warehouses with stock for this item
-            stocks = Stock.objects.filter(
-                item=sale_item.item,
-                warehouse__company=sale.company,
-                quantity__gt=0
-            ).order_by('-quantity')
-            
-            remaining_qty = sale_item.quantity
-            
-            for stock in stocks:
-                if remaining_qty <= 0:
-                    break
-                
-                # Deduct from this warehouse
-                deduct_qty = min(stock.quantity, remaining_qty)
-                stock.quantity -= deduct_qty
-                stock.save()
-                
-                # Create stock movement record
-                StockMovement.objects.create(
-                    company=sale.company,
-                    warehouse=stock.warehouse,
-                    item=sale_item.item,
-                    movement_type='out',
-                    quantity=deduct_qty,
-                    reference_type='pos_sale',
-                    reference_number=sale.sale_number,
-                    date=sale.date,
-                    created_by=sale.cashier,
-                    notes=f'POS Sale: {sale.sale_number}'
-                )
-                
-                remaining_qty -= deduct_qty
 
+    def _update_inventory(self, sale, items_data):
+        """Deduct the sold quantities from the warehouses in bulk"""
+        quantities = defaultdict(int)
+        for item_data in items_data:
+            quantities[item_data['item_id']] += item_data['quantity']
+
+        try:
+            deduct_stock(
+                sale.company,
+                quantities,
+                reference_type='pos_sale',
+                reference_number=sale.sale_number,
+                date=sale.date,
+                user=sale.cashier,
+                notes=f'POS Sale: {sale.sale_number}',
+            )
+        except InsufficientStockError as e:
+            item = self.basket_items[e.item_id]
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f"Insufficient stock for {item.name}. Available: {e.available}, Required: {e.required}"
+                ]
+            })
+
+
+class POSSyncPaymentSerializer(serializers.ModelSerializer):
+    """Payment of a sale recorded offline"""
+    class Meta:
+        model = POSPayment
+        fields = ['amount', 'payment_method', 'reference']
+
+
+class POSSyncSaleSerializer(serializers.ModelSerializer):
+    """
+    One sale of an offline sync batch. Only the shape is checked here;
+    items, customers and stock are resolved for the whole batch at once
+    by pos.services.sync_sales.
+    """
+    idempotency_key = serializers.CharField(max_length=64)
+    sale_number = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    customer = serializers.IntegerField(source='customer_id', required=False, allow_null=True)
+    items = POSSaleItemCreateSerializer(many=True)
+    payments = POSSyncPaymentSerializer(many=True, required=False)
+
+    class Meta:
+        model = POSSale
+        fields = ['idempotency_key', 'sale_number', 'date', 'customer', 'discount', 'tax',
+                  'paid_amount', 'payment_method', 'notes', 'items', 'payments']
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError("Sale must have at least one item")
+        return items
+
+
+class POSShiftSerializer(serializers.ModelSerializer):
+    """Serializer for cashier shifts; only the float and notes are set by clients"""
+    cashier_name = serializers.CharField(source='cashier.get_full_name', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = POSShift
+        fields = ['id', 'cashier', 'cashier_name', 'status', 'status_display', 'opened_at',
+                  'closed_at', 'opening_float', 'expected_cash', 'closing_cash',
+                  'cash_difference', 'notes', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'cashier', 'status', 'opened_at', 'closed_at', 'expected_cash',
+                            'closing_cash', 'cash_difference', 'created_at', 'updated_at']
+
+
+class POSRefundItemSerializer(serializers.ModelSerializer):
+    """Serializer for refunded lines"""
+    item_name = serializers.CharField(source='sale_item.item.name', read_only=True)
+
+    class Meta:
+        model = POSRefundItem
+        fields = ['id', 'sale_item', 'item_name', 'quantity', 'amount']
+        read_only_fields = fields
+
+
+class POSRefundSerializer(serializers.ModelSerializer):
+    """Serializer for refunds with their lines"""
+    items = POSRefundItemSerializer(many=True, read_only=True)
+    sale_number = serializers.CharField(source='sale.sale_number', read_only=True)
+
+    class Meta:
+        model = POSRefund
+        fields = ['id', 'sale', 'sale_number', 'date', 'amount', 'reason', 'created_by',
+                  'items', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class POSRefundLineSerializer(serializers.Serializer):
+    sale_item = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
+
+class POSRefundCreateSerializer(serializers.Serializer):
+    """Lines and quantities to return; omit items to refund the whole sale"""
+    items = POSRefundLineSerializer(many=True, required=False)
+    reason = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError("Provide at least one line or omit items to refund everything")
+        quantities = {}
+        for line in items:
+            quantities[line['sale_item']] = quantities.get(line['sale_item'], 0) + line['quantity']
+        return quantities
@@ -0,0 +1,465 @@
+"""
+Point of sale operations that work on many sales at once
+"""
+import gzip
+import hashlib
+import json
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractHour
+from django.utils import timezone
+from companies.sequences import reserve_numbers_for
+from contacts.models import Contact
+from inventory.models import Item, ItemTombstone, Stock, StockMovement, StockMovementArchive
+from inventory.services import InsufficientStockError, StockDeduction, restore_stock
+from .models import POSShift, POSSale, POSSaleItem, POSPayment, POSRefund, POSRefundItem
+from .receipts import invalidate_receipts
+
+
+MAX_SYNC_BATCH = 500
+PAYMENT_METHODS = [method for method, label in POSSale.PAYMENT_METHOD_CHOICES]
+CENT = Decimal('0.01')
+
+CATALOG_FIELDS = ['id', 'sku', 'barcode', 'name', 'sale_price', 'unit', 'available']
+CATALOG_CACHE_TIMEOUT = 60 * 60
+# Delta cursors are moved back by this much so that rows written by
+# transactions still in flight when a feed was built are sent again
+CATALOG_CURSOR_OVERLAP = timedelta(seconds=5)
+
+
+@transaction.atomic
+def sync_sales(company, user, sales):
+    """
+    Record a batch of sales made offline, given as validated
+    POSSyncSaleSerializer data, and return one result per sale.
+
+    Sales whose idempotency key was already synced are reported as
+    duplicates instead of being created again. Each sale goes to the
+    cashier's shift that was open at its date, even if that shift has
+    been closed since. Lookups, stock locking and inserts are done once
+    for the whole batch, so the number of queries does not grow with the
+    number of sales or lines.
+    """
+    results = [None] * len(sales)
+
+    keys = [sale['idempotency_key'] for sale in sales]
+    synced = {
+        key: {'id': sale_id, 'sale_number': sale_number}
+        for key, sale_id, sale_number in POSSale.objects.filter(
+            company=company, idempotency_key__in=keys,
+        ).values_list('idempotency_key', 'id', 'sale_number')
+    }
+
+    item_ids = {line['item_id'] for sale in sales for line in sale['items']}
+    known_items = set(Item.objects.filter(company=company, pk__in=item_ids).values_list('pk', flat=True))
+    customer_ids = {sale.get('customer_id') for sale in sales} - {None}
+    known_customers = set(Contact.objects.filter(company=company, pk__in=customer_ids).values_list('pk', flat=True))
+    sale_numbers = {sale['sale_number'] for sale in sales if sale.get('sale_number')}
+    taken_numbers = set(POSSale.objects.filter(
+        company=company, sale_number__in=sale_numbers,
+    ).values_list('sale_number', flat=True))
+
+    deduction = StockDeduction(company, known_items)
+    dates = [sale['date'] for sale in sales]
+    shifts = list(POSShift.objects.filter(company=company, cashier=user, opened_at__lte=max(dates)).filter(
+        Q(closed_at__isnull=True) | Q(closed_at__gte=min(dates))
+    ))
+    accepted, batch_keys = [], {}
+
+    for index, data in enumerate(sales):
+        key = data['idempotency_key']
+        if key in synced:
+            results[index] = {'idempotency_key': key, 'status': 'duplicate', **synced[key]}
+            continue
+        if key in batch_keys:
+            # Filled in with the first occurrence once it is created
+            results[index] = {'idempotency_key': key, 'status': 'duplicate', 'duplicate_of': batch_keys[key]}
+            continue
+
+        errors = []
+        unknown = sorted({line['item_id'] for line in data['items']} - known_items)
+        if unknown:
+            errors.append(f"Items {unknown} do not belong to your company")
+        if data.get('customer_id') and data['customer_id'] not in known_customers:
+            errors.append(f"Customer {data['customer_id']} does not belong to your company")
+        if data.get('sale_number') and data['sale_number'] in taken_numbers:
+            errors.append(f"Sale number {data['sale_number']} already exists")
+
+        movements = []
+        if not errors:
+            quantities = defaultdict(int)
+            for line in data['items']:
+                quantities[line['item_id']] += line['quantity']
+            try:
+                movements = deduction.deduct(quantities, 'pos_sale', None, data['date'], user)
+            except InsufficientStockError as e:
+                errors.append(f"Insufficient stock for item {e.item_id}. Available: {e.available}, Required: {e.required}")
+
+        if errors:
+            results[index] = {'idempotency_key': key, 'status': 'error', 'errors': {'non_field_errors': errors}}
+            continue
+
+        batch_keys[key] = index
+        if data.get('sale_number'):
+            taken_numbers.add(data['sale_number'])
+        accepted.append((index, data, movements))
+
+    # Number the sales that were not numbered from a pre-allocated block
+    unnumbered = [data for index, data, movements in accepted if not data.get('sale_number')]
+    numbers = iter(reserve_numbers_for(company.id, 'pos_sale', [data['date'] for data in unnumbered]) if unnumbered else [])
+
+    new_sales = []
+    for index, data, movements in accepted:
+        sale = POSSale(
+            company=company,
+            cashier=user,
+            shift=_shift_at(shifts, data['date']),
+            idempotency_key=data['idempotency_key'],
+            sale_number=data.get('sale_number') or next(numbers),
+            date=data['date'],
+            customer_id=data.get('customer_id'),
+            discount=data.get('discount', 0),
+            tax=data.get('tax', 0),
+            paid_amount=data.get('paid_amount', 0),
+            payment_method=data['payment_method'],
+            notes=data.get('notes'),
+        )
+        sale.set_totals(sum(line['total'] for line in data['items']))
+        for movement in movements:
+            movement.reference_number = sale.sale_number
+            movement.notes = f'POS Sale: {sale.sale_number}'
+        new_sales.append(sale)
+
+    POSSale.objects.bulk_create(new_sales)
+    POSSaleItem.objects.bulk_create([
+        POSSaleItem(sale=sale, **line)
+        for sale, (index, data, movements) in zip(new_sales, accepted)
+        for line in data['items']
+    ])
+    POSPayment.objects.bulk_create([
+        POSPayment(sale=sale, date=sale.date, **payment)
+        for sale, (index, data, movements) in zip(new_sales, accepted)
+        for payment in data.get('payments', [])
+    ])
+    deduction.save()
+
+    for sale, (index, data, movements) in zip(new_sales, accepted):
+        results[index] = {'idempotency_key': sale.idempotency_key, 'status': 'created', 'id': sale.id, 'sale_number': sale.sale_number}
+    for result in results:
+        if 'duplicate_of' in result:
+            first = results[result.pop('duplicate_of')]
+            result.update(id=first['id'], sale_number=first['sale_number'])
+
+    return results
+
+
+def _catalog_rows(company, condition=Q()):
+    """Catalog rows (CATALOG_FIELDS + is_active) of items matching `condition`, in one query"""
+    rows = Item.objects.filter(company=company).filter(condition).annotate(
+        available=Coalesce(
+            Sum(F('stocks__quantity') - F('stocks__reserved')),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    ).order_by('id').values_list(*CATALOG_FIELDS, 'is_active')
+    for item_id, sku, barcode, name, sale_price, unit, available, is_active in rows:
+        yield [item_id, sku, barcode, name, f'{sale_price:.2f}', unit, f'{Decimal(available):.2f}', is_active]
+
+
+def get_catalog_version(company):
+    """Short hash that changes whenever an item or stock row of the company changes"""
+    items = Item.objects.filter(company=company).aggregate(count=Count('id'), updated=Max('updated_at'))
+    stocks = Stock.objects.filter(item__company=company).aggregate(count=Count('id'), updated=Max('updated_at'))
+    state = f"{items['count']}:{items['updated']}:{stocks['count']}:{stocks['updated']}"
+    return hashlib.sha1(state.encode()).hexdigest()[:20]
+
+
+def get_catalog_snapshot(company):
+    """
+    Gzip-compressed JSON of all active items for registers, returned as
+    (version, blob). The blob is cached per catalog version so unchanged
+    catalogs are served without rebuilding.
+    """
+    version = get_catalog_version(company)
+    key = f'pos:catalog:{company.id}:{version}'
+    blob = cache.get(key)
+    if blob is None:
+        cursor = timezone.now() - CATALOG_CURSOR_OVERLAP
+        payload = {
+            'version': version,
+            'cursor': cursor,
+            'fields': CATALOG_FIELDS,
+            'items': [row[:-1] for row in _catalog_rows(company, Q(is_active=True))],
+        }
+        blob = gzip.compress(json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode())
+        cache.set(key, blob, CATALOG_CACHE_TIMEOUT)
+    return version, blob
+
+
+def get_catalog_changes(company, since):
+    """
+    Items whose data or stock changed since the `since` cursor, plus the
+    ids of items deleted or deactivated since then
+    """
+    cursor = timezone.now() - CATALOG_CURSOR_OVERLAP
+    changed = Q(updated_at__gte=since) | Q(pk__in=Stock.objects.filter(updated_at__gte=since).values('item_id'))
+
+    items, deleted = [], []
+    for row in _catalog_rows(company, changed):
+        if row[-1]:
+            items.append(row[:-1])
+        else:
+            deleted.append(row[0])
+    deleted.extend(ItemTombstone.objects.filter(
+        company=company, deleted_at__gte=since,
+    ).values_list('item_id', flat=True))
+
+    return {
+        'cursor': cursor,
+        'fields': CATALOG_FIELDS,
+        'items': items,
+        'deleted': sorted(set(deleted)),
+    }
+
+
+class ShiftError(Exception):
+    pass
+
+
+def get_open_shift(company, user):
+    return POSShift.objects.filter(company=company, cashier=user, status='open').first()
+
+
+def _shift_at(shifts, date):
+    """The shift of `shifts` that was open at `date`, or None"""
+    for shift in shifts:
+        if shift.opened_at <= date and (shift.closed_at is None or date <= shift.closed_at):
+            return shift
+    return None
+
+
+def summarize_sales(sales, tzinfo=None):
+    """
+    Z-report figures for a queryset of sales: totals, voids and refunds,
+    and completed sales broken down by payment method, cashier and hour.
+    Everything comes from one query grouped by cashier and hour with
+    conditional aggregates per payment method and status.
+    """
+    completed = Q(status='completed')
+    # Completed sales count net of their partial refunds
+    net_total = F('total') - F('refunded_amount')
+    aggregates = {
+        'sales_count': Count('id', filter=completed),
+        'total': Sum(net_total, filter=completed),
+        'discount': Sum('discount', filter=completed),
+        'tax': Sum('tax', filter=completed),
+        'voided_count': Count('id', filter=Q(status='cancelled')),
+        'voided_total': Sum('total', filter=Q(status='cancelled')),
+        'refunded_count': Count('id', filter=Q(refunded_amount__gt=0) & ~Q(status='cancelled')),
+        'refunded_total': Sum('refunded_amount', filter=~Q(status='cancelled')),
+    }
+    method_aggregates = {}
+    for method in PAYMENT_METHODS:
+        method_aggregates[f'{method}_count'] = Count('id', filter=completed & Q(payment_method=method))
+        method_aggregates[f'{method}_total'] = Sum(net_total, filter=completed & Q(payment_method=method))
+
+    rows = sales.order_by().values(
+        'cashier_id', 'cashier__username', hour=ExtractHour('date', tzinfo=tzinfo),
+    ).annotate(
+        # Prefixed so the aliases don't clash with the total/discount/tax fields
+        **{f'z_{key}': aggregate for key, aggregate in aggregates.items()},
+        **method_aggregates,
+    )
+
+    zero = Decimal('0')
+    summary = {key: 0 if key.endswith('_count') else zero for key in aggregates}
+    by_method = {method: {'count': 0, 'total': zero} for method in PAYMENT_METHODS}
+    by_cashier, by_hour = {}, {}
+
+    for row in rows:
+        for key in summary:
+            summary[key] += row[f'z_{key}'] or 0
+        for method in PAYMENT_METHODS:
+            by_method[method]['count'] += row[f'{method}_count']
+            by_method[method]['total'] += row[f'{method}_total'] or zero
+        cashier = by_cashier.setdefault(row['cashier_id'], {
+            'cashier': row['cashier_id'], 'username': row['cashier__username'], 'count': 0, 'total': zero,
+        })
+        hour = by_hour.setdefault(row['hour'], {'hour': row['hour'], 'count': 0, 'total': zero})
+        for group in (cashier, hour):
+            group['count'] += row['z_sales_count']
+            group['total'] += row['z_total'] or zero
+
+    summary['by_payment_method'] = by_method
+    summary['by_cashier'] = sorted(by_cashier.values(), key=lambda group: group['username'] or '')
+    summary['by_hour'] = [group for hour, group in sorted(by_hour.items()) if group['count']]
+    return summary
+
+
+def summary_as_json(summary):
+    """JSON-ready copy of a summary with amounts as 2-decimal strings"""
+    def convert(value):
+        if isinstance(value, Decimal):
+            return str(value.quantize(CENT))
+        if isinstance(value, dict):
+            return {key: convert(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        return value
+    return convert(summary)
+
+
+@transaction.atomic
+def close_shift(shift, closing_cash, tzinfo=None, notes=None):
+    """
+    Close a shift: compute its Z-report once and store it on the shift
+    together with expected cash (float + cash sales) and the counted
+    difference
+    """
+    shift = POSShift.objects.select_for_update().get(pk=shift.pk)
+    if shift.status == 'closed':
+        raise ShiftError("Shift is already closed")
+
+    summary = summarize_sales(shift.sales.all(), tzinfo)
+    shift.expected_cash = shift.opening_float + summary['by_payment_method']['cash']['total']
+    shift.closing_cash = closing_cash
+    shift.cash_difference = closing_cash - shift.expected_cash
+    summary.update(
+        opening_float=shift.opening_float,
+        expected_cash=shift.expected_cash,
+        closing_cash=shift.closing_cash,
+        cash_difference=shift.cash_difference,
+    )
+    shift.summary = summary_as_json(summary)
+    shift.status = 'closed'
+    shift.closed_at = timezone.now()
+    if notes:
+        shift.notes = notes
+    shift.save()
+    return shift
+
+
+class RefundError(Exception):
+    pass
+
+
+def _sold_quantities(sale):
+    """
+    Quantities of a sale still out of stock per (warehouse_id, item_id):
+    its 'out' movements less what earlier refunds put back, including
+    movements already archived, in two queries
+    """
+    sold = defaultdict(Decimal)
+    for model in (StockMovement, StockMovementArchive):
+        movements = model.objects.filter(
+            company_id=sale.company_id,
+            reference_number=sale.sale_number,
+            reference_type__in=['pos_sale', 'pos_refund'],
+        ).values_list('warehouse_id', 'item_id', 'movement_type', 'quantity')
+        for warehouse_id, item_id, movement_type, quantity in movements:
+            sold[warehouse_id, item_id] += quantity if movement_type == 'out' else -quantity
+    return sold
+
+
+@transaction.atomic
+def void_pos_sale(sale, user=None):
+    """Cancel a sale and put everything still out of stock back with bulk writes"""
+    sale = POSSale.objects.select_for_update().get(pk=sale.pk)
+    if sale.status == 'cancelled':
+        raise RefundError("Sale is already cancelled")
+    if sale.status == 'refunded':
+        raise RefundError("Sale is already fully refunded")
+
+    restore_stock(
+        sale.company, _sold_quantities(sale), 'pos_sale_void', sale.sale_number,
+        timezone.now(), user, f'Void POS Sale: {sale.sale_number}'
+    )
+    sale.status = 'cancelled'
+    sale.save(update_fields=['status', 'updated_at'])
+    transaction.on_commit(lambda: invalidate_receipts([sale.id]))
+    return sale
+
+
+@transaction.atomic
+def refund_pos_sale(sale, quantities=None, user=None, reason=None):
+    """
+    Return `quantities` ({sale_item_id: quantity}) of a completed sale, or
+    everything not yet returned when omitted. Records a POSRefund with its
+    lines, restores the stock from the warehouses the items left, and marks
+    the sale refunded once every line is fully returned. The refund amount
+    of a line is its share of the sale total, so sale-level discount and
+    tax are returned proportionally.
+    """
+    sale = POSSale.objects.select_for_update().get(pk=sale.pk)
+    if sale.status != 'completed':
+        raise RefundError(f"Only completed sales can be refunded (sale is {sale.status})")
+
+    sale_items = {item.id: item for item in sale.items.all()}
+    remaining = {item.id: item.quantity - item.refunded_quantity for item in sale_items.values()}
+    if quantities is None:
+        quantities = {item_id: quantity for item_id, quantity in remaining.items() if quantity > 0}
+    if not quantities:
+        raise RefundError("Nothing left to refund")
+    for item_id, quantity in quantities.items():
+        if item_id not in sale_items:
+            raise RefundError(f"Line {item_id} does not belong to sale {sale.sale_number}")
+        if quantity <= 0:
+            raise RefundError(f"Refund quantity for line {item_id} must be greater than zero")
+        if quantity > remaining[item_id]:
+            raise RefundError(f"Line {item_id} has only {remaining[item_id]} left to refund")
+
+    fully_refunded = all(quantities.get(item_id, 0) == left for item_id, left in remaining.items())
+    scale = sale.total / sale.subtotal if sale.subtotal else Decimal('1')
+    amounts = {
+        item_id: (sale_items[item_id].total * quantity / sale_items[item_id].quantity * scale).quantize(CENT)
+        for item_id, quantity in quantities.items()
+    }
+    if fully_refunded:
+        # Give back exactly what is left so no rounding residue stays on the sale
+        last = next(reversed(amounts))
+        amounts[last] += sale.total - sale.refunded_amount - sum(amounts.values())
+
+    # Put the items back into the warehouses they left, largest first
+    by_item = defaultdict(Decimal)
+    for item_id, quantity in quantities.items():
+        by_item[sale_items[item_id].item_id] += quantity
+    sold = sorted(_sold_quantities(sale).items(), key=lambda entry: -entry[1])
+    returned = {}
+    for (warehouse_id, item_id), available in sold:
+        quantity = min(available, by_item.get(item_id, 0))
+        if quantity > 0:
+            returned[warehouse_id, item_id] = quantity
+            by_item[item_id] -= quantity
+
+    now = timezone.now()
+    restore_stock(
+        sale.company, returned, 'pos_refund', sale.sale_number, now, user,
+        f'Refund POS Sale: {sale.sale_number}'
+    )
+
+    refund = POSRefund.objects.create(
+        company=sale.company, sale=sale, date=now, amount=sum(amounts.values()),
+        reason=reason, created_by=user,
+    )
+    POSRefundItem.objects.bulk_create([
+        POSRefundItem(refund=refund, sale_item_id=item_id, quantity=quantity, amount=amounts[item_id])
+        for item_id, quantity in quantities.items()
+    ])
+    POSSaleItem.objects.filter(pk__in=quantities).update(
+        refunded_quantity=F('refunded_quantity') + Case(
+            *[When(pk=item_id, then=Value(quantity)) for item_id, quantity in quantities.items()],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+    sale.refunded_amount += refund.amount
+    if fully_refunded:
+        sale.status = 'refunded'
+    sale.save(update_fields=['refunded_amount', 'status', 'updated_at'])
+    transaction.on_commit(lambda: invalidate_receipts([sale.id]))
+    return refund
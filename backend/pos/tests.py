@@ -1,3 +1,291 @@
+import datetime
+import json
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.utils import timezone
 from django.test import TestCase
+from rest_framework.test import APIClient
+from accounts.models import User
+from companies.models import Company
+from inventory.archive import archive_stock_movements
+from inventory.models import Item, Stock, StockMovementArchive, Warehouse
+from inventory.services import reserve_stock
+from .models import POSSale, POSShift
+from .receipts import get_receipts
+from .serializers import POSSaleCreateSerializer
+from .services import RefundError, refund_pos_sale, void_pos_sale
 
-# Create your tests here.
+
+class POSTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cashier', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.user.active_company = self.company
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.warehouse = Warehouse.objects.create(company=self.company, name='Main', code='MAIN')
+        self.item = Item.objects.create(company=self.company, name='Pen', sku='PEN', sale_price=10)
+        self.stock = Stock.objects.create(warehouse=self.warehouse, item=self.item, quantity=10)
+
+    def sell(self, quantity, **extra):
+        return self.client.post('/api/pos/sales/', {
+            'date': '2026-01-01T10:00:00Z',
+            'payment_method': 'cash',
+            'paid_amount': '1000',
+            'items': [{'item': self.item.id, 'quantity': str(quantity), 'unit_price': '10'}],
+            **extra,
+        }, format='json')
+
+
+class POSSaleStockTests(POSTestCase):
+    def test_reserved_stock_cannot_be_sold(self):
+        reserve_stock(self.company, {self.item.id: Decimal('8')}, 'sales_order', 1)
+
+        response = self.sell(9)
+        self.assertEqual(response.status_code, 400)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('10'))
+        self.assertEqual(self.stock.reserved, Decimal('8'))
+
+    def test_free_stock_can_be_sold(self):
+        reserve_stock(self.company, {self.item.id: Decimal('8')}, 'sales_order', 1)
+
+        response = self.sell(2)
+        self.assertEqual(response.status_code, 201)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('8'))
+        self.assertEqual(self.stock.available, Decimal('0'))
+
+    def test_sync_skips_reserved_stock(self):
+        reserve_stock(self.company, {self.item.id: Decimal('8')}, 'sales_order', 1)
+
+        response = self.client.post('/api/pos/sales/sync/', {'sales': [{
+            'idempotency_key': 'offline-1',
+            'date': '2026-01-01T10:00:00Z',
+            'payment_method': 'cash',
+            'paid_amount': '30',
+            'items': [{'item': self.item.id, 'quantity': '3', 'unit_price': '10'}],
+        }]}, format='json')
+        self.assertEqual(response.json()['results'][0]['status'], 'error')
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('10'))
+
+
+class POSSyncShiftTests(POSTestCase):
+    def shift(self, opened_at, closed_at=None):
+        shift = POSShift.objects.create(company=self.company, cashier=self.user)
+        POSShift.objects.filter(pk=shift.pk).update(
+            opened_at=opened_at, closed_at=closed_at, status='closed' if closed_at else 'open'
+        )
+        return shift
+
+    def sync(self, *dates):
+        return self.client.post('/api/pos/sales/sync/', {'sales': [{
+            'idempotency_key': f'offline-{index}',
+            'date': date.isoformat(),
+            'payment_method': 'cash',
+            'paid_amount': '10',
+            'items': [{'item': self.item.id, 'quantity': '1', 'unit_price': '10'}],
+        } for index, date in enumerate(dates)]}, format='json')
+
+    def test_sales_go_to_shift_open_at_their_date(self):
+        monday = datetime.datetime(2026, 1, 5, 8, tzinfo=datetime.timezone.utc)
+        earlier = self.shift(monday, monday + datetime.timedelta(hours=8))
+        current = self.shift(monday + datetime.timedelta(days=1))
+
+        response = self.sync(
+            monday + datetime.timedelta(hours=2),
+            monday + datetime.timedelta(hours=12),
+            monday + datetime.timedelta(days=1, hours=2),
+        )
+        self.assertEqual([result['status'] for result in response.json()['results']], ['created'] * 3)
+        shifts = POSSale.objects.order_by('date').values_list('shift_id', flat=True)
+        self.assertEqual(list(shifts), [earlier.id, None, current.id])
+
+
+class POSShiftCloseTests(POSTestCase):
+    def setUp(self):
+        super().setUp()
+        response = self.client.post('/api/pos/shifts/', {'opening_float': '50'}, format='json')
+        self.shift = POSShift.objects.get(pk=response.json()['id'])
+
+    def close(self, closing_cash):
+        return self.client.post(f'/api/pos/shifts/{self.shift.id}/close/', {'closing_cash': closing_cash}, format='json')
+
+    def test_close_stores_z_report(self):
+        self.sell(3)
+        sale = POSSale.objects.get()
+        self.assertEqual(sale.shift_id, self.shift.id)
+        self.sell(1)
+        void_pos_sale(POSSale.objects.latest('id'), self.user)
+
+        response = self.close('75')
+        self.assertEqual(response.status_code, 200)
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.status, 'closed')
+        self.assertEqual((self.shift.expected_cash, self.shift.cash_difference), (Decimal('80'), Decimal('-5')))
+        summary = self.client.get(f'/api/pos/shifts/{self.shift.id}/z-report/').json()['summary']
+        self.assertEqual((summary['sales_count'], summary['total']), (1, '30.00'))
+        self.assertEqual((summary['voided_count'], summary['voided_total']), (1, '10.00'))
+        self.assertEqual(self.close('75').status_code, 400)
+
+    def test_closing_cash_must_be_an_amount(self):
+        for closing_cash in ('NaN', 'Infinity', '1e20', '1.234', 'abc', None):
+            self.assertEqual(self.close(closing_cash).status_code, 400, closing_cash)
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.status, 'open')
+
+
+class POSSaleIdempotencyTests(POSTestCase):
+    def test_retry_returns_existing_sale(self):
+        first = self.sell(1, idempotency_key='till-1')
+        retry = self.sell(1, idempotency_key='till-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('9'))
+
+    def test_concurrent_retry_returns_existing_sale(self):
+        create = POSSaleCreateSerializer.create
+
+        def create_after_other_request(serializer, validated_data):
+            # The other request passed the same idempotency check and committed first
+            POSSale.objects.create(company=self.company, cashier=self.user, idempotency_key='till-1',
+                                   date=validated_data['date'], payment_method='cash')
+            return create(serializer, validated_data)
+
+        with mock.patch.object(POSSaleCreateSerializer, 'create', create_after_other_request):
+            response = self.sell(1, idempotency_key='till-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], POSSale.objects.get(idempotency_key='till-1').id)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('10'))
+
+
+class POSRefundTests(POSTestCase):
+    def setUp(self):
+        super().setUp()
+        # Subtotal 40, total 42: every refunded line carries 5% of discount and tax
+        response = self.sell(4, discount='4', tax='6')
+        self.sale = POSSale.objects.get(pk=response.json()['id'])
+        self.line = self.sale.items.get()
+
+    def test_void_restores_stock(self):
+        void_pos_sale(self.sale, self.user)
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.status, 'cancelled')
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('10'))
+        with self.assertRaises(RefundError):
+            void_pos_sale(self.sale, self.user)
+
+    def test_partial_refund_returns_share_of_total(self):
+        refund = refund_pos_sale(self.sale, {self.line.id: Decimal('1')}, self.user)
+        self.assertEqual(refund.amount, Decimal('10.50'))
+        self.sale.refresh_from_db()
+        self.line.refresh_from_db()
+        self.assertEqual((self.sale.status, self.sale.refunded_amount), ('completed', Decimal('10.50')))
+        self.assertEqual(self.line.refunded_quantity, Decimal('1'))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('7'))
+
+        refund_pos_sale(self.sale, user=self.user)
+        self.sale.refresh_from_db()
+        self.assertEqual((self.sale.status, self.sale.refunded_amount), ('refunded', Decimal('42')))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('10'))
+
+    def test_refund_cannot_exceed_sold_quantity(self):
+        refund_pos_sale(self.sale, {self.line.id: Decimal('3')}, self.user)
+        response = self.client.post(f'/api/pos/sales/{self.sale.id}/refund/', {
+            'items': [{'sale_item': self.line.id, 'quantity': '2'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.line.refresh_from_db()
+        self.assertEqual(self.line.refunded_quantity, Decimal('3'))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('9'))
+
+    def test_refund_after_movements_are_archived(self):
+        archive_stock_movements(self.company, timezone.now())
+        self.assertTrue(StockMovementArchive.objects.filter(reference_number=self.sale.sale_number).exists())
+
+        refund_pos_sale(self.sale, user=self.user)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, Decimal('10'))
+
+
+class POSCatalogTests(POSTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def items(self, payload):
+        return {row[0]: dict(zip(payload['fields'], row)) for row in payload['items']}
+
+    def test_snapshot_is_served_by_version(self):
+        response = self.client.get('/api/pos/catalog/')
+        self.assertEqual(response.status_code, 200)
+        items = self.items(json.loads(response.content))
+        self.assertEqual((items[self.item.id]['sku'], items[self.item.id]['available']), ('PEN', '10.00'))
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/pos/catalog/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        reserve_stock(self.company, {self.item.id: Decimal('3')}, 'sales_order', 1)
+        response = self.client.get('/api/pos/catalog/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.items(json.loads(response.content))[self.item.id]['available'], '7.00')
+
+    def test_changes_since_cursor(self):
+        other = Item.objects.create(company=self.company, name='Pad', sku='PAD', sale_price=4)
+        gone = Item.objects.create(company=self.company, name='Ink', sku='INK', sale_price=7)
+        gone_id = gone.id
+        since = timezone.now()
+        self.stock.quantity = 8
+        self.stock.save()
+        other.is_active = False
+        other.save()
+        gone.delete()
+
+        changes = self.client.get('/api/pos/catalog/changes/', {'since': since.isoformat()}).json()
+        self.assertEqual(list(self.items(changes)), [self.item.id])
+        self.assertEqual(changes['deleted'], sorted([other.id, gone_id]))
+        self.assertEqual(self.client.get('/api/pos/catalog/changes/', {'since': 'yesterday'}).status_code, 400)
+
+
+class POSReceiptTests(POSTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.sale = POSSale.objects.get(pk=self.sell(2).json()['id'])
+
+    def receipt(self, output):
+        return self.client.get(f'/api/pos/sales/{self.sale.id}/print_receipt/', {'output': output})
+
+    def test_formats(self):
+        self.assertEqual(self.receipt('json').json()['total'], 20.0)
+        self.assertIn(self.sale.sale_number, self.receipt('text').content.decode())
+        self.assertTrue(self.receipt('html')['Content-Type'].startswith('text/html'))
+        escpos = self.receipt('escpos')
+        self.assertEqual(escpos['Content-Type'], 'application/octet-stream')
+        self.assertTrue(escpos.content.startswith(b'\x1b'))
+        self.assertEqual(self.receipt('pdf').status_code, 400)
+
+    def test_receipts_are_cached_until_the_sale_changes(self):
+        get_receipts(POSSale.objects.filter(pk=self.sale.pk), 'text')
+        with self.assertNumQueries(1):
+            get_receipts(POSSale.objects.filter(pk=self.sale.pk), 'text')
+
+        self.assertEqual(self.receipt('json').json()['status'], 'completed')
+        with self.captureOnCommitCallbacks(execute=True):
+            void_pos_sale(self.sale, self.user)
+        self.assertEqual(self.receipt('json').json()['status'], 'cancelled')
+
+    def test_export_several_receipts(self):
+        other = POSSale.objects.get(pk=self.sell(1).json()['id'])
+        response = self.client.get('/api/pos/sales/receipts/', {'ids': f'{self.sale.id},{other.id}', 'output': 'json'})
+        self.assertEqual([receipt['sale_number'] for receipt in response.json()], [self.sale.sale_number, other.sale_number])
+        self.assertEqual(self.client.get('/api/pos/sales/receipts/', {'ids': 'x'}).status_code, 400)
@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import POSSaleViewSet, POSSaleItemViewSet, POSPaymentViewSet
+from .views import POSSaleViewSet, POSSaleItemViewSet, POSPaymentViewSet, POSCatalogViewSet, POSShiftViewSet
 
 router = DefaultRouter()
 router.register(r'sales', POSSaleViewSet, basename='pos-sale')
 router.register(r'sale-items', POSSaleItemViewSet, basename='pos-sale-item')
 router.register(r'payments', POSPaymentViewSet, basename='pos-payment')
+router.register(r'catalog', POSCatalogViewSet, basename='pos-catalog')
+router.register(r'shifts', POSShiftViewSet, basename='pos-shift')
 
 urlpatterns = [
     path('', include(router.urls)),
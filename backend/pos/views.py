@@ -1,15 +1,50 @@
-from rest_framework import viewsets, permissions, status
+import gzip
+import time
+from datetime import timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from rest_framework import serializers, viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import IntegrityError
+from django.http import HttpResponse
 from django.utils import timezone
-from django.db import transaction
-from django.db.models import Q, Sum
-from .models import POSSale, POSSaleItem, POSPayment
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q
+from .models import POSShift, POSSale, POSSaleItem, POSPayment
 from .serializers import (
     POSSaleSerializer, POSSaleDetailSerializer, POSSaleCreateSerializer,
-    POSSaleItemSerializer, POSPaymentSerializer
+    POSSaleItemSerializer, POSPaymentSerializer, POSSyncSaleSerializer, POSShiftSerializer,
+    POSRefundSerializer, POSRefundCreateSerializer
 )
-from inventory.models import Stock, StockMovement
+from .services import (
+    MAX_SYNC_BATCH, RefundError, ShiftError, close_shift, get_catalog_changes, get_catalog_snapshot,
+    get_open_shift, refund_pos_sale, summarize_sales, summary_as_json, sync_sales, void_pos_sale
+)
+from .receipts import MAX_RECEIPT_EXPORT, RECEIPT_FORMATS, RECEIPT_WIDTH, get_receipts, invalidate_receipts
+from inventory.services import lookup_item_by_code
+
+
+def receipt_response(content, output, filename):
+    """HTTP response for a rendered receipt in the given output format"""
+    if output == 'json':
+        return Response(content)
+    if output == 'escpos':
+        response = HttpResponse(content, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.bin"'
+        return response
+    content_type = 'text/html' if output == 'html' else 'text/plain'
+    return HttpResponse(content, content_type=f'{content_type}; charset=utf-8')
+
+
+def get_tz_param(request):
+    """Time zone from the `tz` query parameter, or the current time zone"""
+    name = request.query_params.get('tz')
+    if not name:
+        return timezone.get_current_timezone()
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f'Unknown time zone: {name}')
 
 
 class POSSaleViewSet(viewsets.ModelViewSet):
@@ -61,6 +96,81 @@ class POSSaleViewSet(viewsets.ModelViewSet):
             )
         
         return queryset.order_by('-date')
+
+    def create(self, request, *args, **kwargs):
+        """Create a sale; retries with an already used idempotency key return the existing sale"""
+        idempotency_key = request.data.get('idempotency_key') if isinstance(request.data, dict) else None
+        if idempotency_key:
+            sale = self.get_queryset().filter(idempotency_key=idempotency_key).first()
+            if sale:
+                return Response(POSSaleDetailSerializer(sale).data, status=status.HTTP_200_OK)
+        try:
+            return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            # A concurrent retry with the same key was stored first
+            sale = self.get_queryset().filter(idempotency_key=idempotency_key).first() if idempotency_key else None
+            if sale is None:
+                raise
+            return Response(POSSaleDetailSerializer(sale).data, status=status.HTTP_200_OK)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_receipts([serializer.instance.id])
+
+    def perform_destroy(self, instance):
+        sale_id = instance.id
+        instance.delete()
+        invalidate_receipts([sale_id])
+
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """
+        Record a batch of sales queued by a register while offline.
+        Body: {"sales": [...]} where every sale carries a client-generated
+        idempotency_key. Returns one result per sale: created, duplicate
+        (already synced) or error.
+        """
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({'error': 'No active company'}, status=status.HTTP_400_BAD_REQUEST)
+
+        sales_data = request.data.get('sales') if isinstance(request.data, dict) else request.data
+        if not isinstance(sales_data, list) or not sales_data:
+            return Response({'error': 'Expected a non-empty list of sales'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(sales_data) > MAX_SYNC_BATCH:
+            return Response(
+                {'error': f'At most {MAX_SYNC_BATCH} sales can be synced per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(sales_data)
+        valid, positions = [], []
+        for index, sale_data in enumerate(sales_data):
+            serializer = POSSyncSaleSerializer(data=sale_data)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+                positions.append(index)
+            else:
+                results[index] = {
+                    'idempotency_key': sale_data.get('idempotency_key') if isinstance(sale_data, dict) else None,
+                    'status': 'error',
+                    'errors': serializer.errors,
+                }
+
+        if valid:
+            try:
+                synced = sync_sales(user_company, request.user, valid)
+            except IntegrityError:
+                # A concurrent sync stored some of these sales first; the batch
+                # was rolled back and the retry reports them as duplicates
+                synced = sync_sales(user_company, request.user, valid)
+            for index, result in zip(positions, synced):
+                results[index] = result
+
+        counts = {'created': 0, 'duplicate': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] += 1
+        return Response({**counts, 'results': results})
     
     @action(detail=True, methods=['post'])
     def complete_sale(self, request, pk=None):
@@ -78,125 +188,146 @@ class POSSaleViewSet(viewsets.ModelViewSet):
         
         # Recalculate totals
         sale.calculate_totals()
+        invalidate_receipts([sale.id])
         
         serializer = POSSaleDetailSerializer(sale)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
-    @transaction.atomic
     def void_sale(self, request, pk=None):
         """
         Void a sale and restore inventory.
-        This reverses the stock movements.
+        This reverses the stock movements still outstanding for the sale.
+        """
+        try:
+            sale = void_pos_sale(self.get_object(), request.user)
+        except RefundError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = POSSaleDetailSerializer(self.get_queryset().get(pk=sale.pk))
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get', 'post'])
+    def refund(self, request, pk=None):
+        """
+        GET lists the refunds of the sale. POST returns lines to stock:
+        {"items": [{"sale_item": id, "quantity": n}], "reason": "..."};
+        without items everything not yet returned is refunded.
         """
         sale = self.get_object()
-        
-        if sale.status == 'cancelled':
-            return Response(
-                {'error': 'Sale is already cancelled'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Restore inventory for each item
-        for sale_item in sale.items.all():
-            # Find the stock movements for this sale
-            movements = StockMovement.objects.filter(
-                company=sale.company,
-                item=sale_item.item,
-                reference_type='pos_sale',
-                reference_number=sale.sale_number,
-                movement_type='out'
+        if request.method == 'GET':
+            refunds = sale.refunds.prefetch_related('items__sale_item__item').select_related('sale')
+            return Response(POSRefundSerializer(refunds, many=True).data)
+
+        serializer = POSRefundCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            refund = refund_pos_sale(
+                sale, serializer.validated_data.get('items'), request.user,
+                serializer.validated_data.get('reason')
             )
-            
-            for movement in movements:
-                # Restore stock
-                stock, created = Stock.objects.get_or_create(
-                    warehouse=movement.warehouse,
-                    item=movement.item,
-                    defaults={'quantity': 0}
-                )
-                stock.quantity += movement.quantity
-                stock.save()
-                
-                # Create reverse movement
-                StockMovement.objects.create(
-                    company=sale.company,
-                    warehouse=movement.warehouse,
-                    item=movement.item,
-                    movement_type='in',
-                    quantity=movement.quantity,
-                    reference_type='pos_sale_void',
-                    reference_number=sale.sale_number,
-                    date=timezone.now(),
-                    created_by=request.user,
-                    notes=f'Void POS Sale: {sale.sale_number}'
-                )
-        
-        # Update sale status
-        sale.status = 'cancelled'
-        sale.save()
-        
-        serializer = POSSaleDetailSerializer(sale)
-        return Response(serializer.data)
-    
+        except RefundError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'refund': POSRefundSerializer(refund).data,
+            'sale': POSSaleDetailSerializer(self.get_queryset().get(pk=sale.pk)).data,
+        }, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['get'])
     def print_receipt(self, request, pk=None):
         """
-        Get receipt data for printing.
-        Returns formatted sale data suitable for receipt printing.
+        Get a print-ready receipt. `output` selects json (default), text,
+        html or escpos (raw printer bytes). Receipts are cached per sale
+        so reprints skip rendering.
         """
-        sale = self.get_object()
-        
-        receipt_data = {
-            'sale_number': sale.sale_number,
-            'date': sale.date,
-            'cashier': sale.cashier.get_full_name() if sale.cashier else 'N/A',
-            'customer': sale.customer.name if sale.customer else 'Walk-in Customer',
-            'items': [
-                {
-                    'name': item.item.name,
-                    'quantity': float(item.quantity),
-                    'unit_price': float(item.unit_price),
-                    'discount': float(item.discount),
-                    'total': float(item.total)
-                }
-                for item in sale.items.all()
-            ],
-            'subtotal': float(sale.subtotal),
-            'discount': float(sale.discount),
-            'tax': float(sale.tax),
-            'total': float(sale.total),
-            'paid_amount': float(sale.paid_amount),
-            'change_amount': float(sale.change_amount),
-            'payment_method': sale.get_payment_method_display(),
-            'notes': sale.notes or ''
-        }
-        
-        return Response(receipt_data)
-    
+        output = request.query_params.get('output', 'json')
+        if output not in RECEIPT_FORMATS:
+            return Response(
+                {'error': f"output must be one of: {', '.join(RECEIPT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            receipts = get_receipts(self.get_queryset().filter(pk=pk), output)
+        except ValueError:
+            receipts = []
+        if not receipts:
+            return Response({'error': 'Sale not found'}, status=status.HTTP_404_NOT_FOUND)
+        return receipt_response(receipts[0], output, f'receipt-{pk}')
+
+    @action(detail=False, methods=['get'])
+    def receipts(self, request):
+        """
+        Export receipts of several sales in one response: the sales in
+        `ids` (comma-separated) or those matching the list filters.
+        """
+        output = request.query_params.get('output', 'json')
+        if output not in RECEIPT_FORMATS:
+            return Response(
+                {'error': f"output must be one of: {', '.join(RECEIPT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.get_queryset()
+        ids = request.query_params.get('ids')
+        if ids:
+            try:
+                queryset = queryset.filter(pk__in=[int(sale_id) for sale_id in ids.split(',')])
+            except ValueError:
+                return Response({'error': 'ids must be comma-separated integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if queryset.count() > MAX_RECEIPT_EXPORT:
+            return Response(
+                {'error': f'At most {MAX_RECEIPT_EXPORT} receipts can be exported per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        receipts = get_receipts(queryset, output)
+        if output == 'json':
+            return Response(receipts)
+        if output == 'text':
+            content = ('=' * RECEIPT_WIDTH + '\n').join(receipts)
+        elif output == 'html':
+            content = (
+                '<!DOCTYPE html><html><head><meta charset="utf-8"><style>'
+                '.receipt{page-break-after:always}</style></head><body>'
+                + ''.join(receipts) + '</body></html>'
+            )
+        else:
+            content = b''.join(receipts)
+        return receipt_response(content, output, 'receipts')
+
     @action(detail=False, methods=['get'])
     def today_sales(self, request):
-        """Get today's sales summary"""
+        """
+        Get today's sales summary. `tz` (e.g. Asia/Tehran) sets the day
+        boundaries and hours; defaults to the server time zone.
+        """
         user_company = request.user.active_company
         if not user_company:
             return Response({'error': 'No active company'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        today = timezone.now().date()
+
+        try:
+            tzinfo = get_tz_param(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.localtime(timezone.now(), tzinfo)
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         sales = POSSale.objects.filter(
             company=user_company,
-            date__date=today,
-            status='completed'
+            date__gte=day_start,
+            date__lt=day_start + timedelta(days=1),
         )
-        
-        summary = {
-            'total_sales': sales.count(),
-            'total_revenue': sales.aggregate(Sum('total'))['total__sum'] or 0,
-            'cash_sales': sales.filter(payment_method='cash').aggregate(Sum('total'))['total__sum'] or 0,
-            'card_sales': sales.filter(payment_method='card').aggregate(Sum('total'))['total__sum'] or 0,
-            'transfer_sales': sales.filter(payment_method='transfer').aggregate(Sum('total'))['total__sum'] or 0,
-        }
-        
-        return Response(summary)
+        summary = summarize_sales(sales, tzinfo)
+
+        return Response({
+            'total_sales': summary['sales_count'],
+            'total_revenue': summary['total'],
+            'cash_sales': summary['by_payment_method']['cash']['total'],
+            'card_sales': summary['by_payment_method']['card']['total'],
+            'transfer_sales': summary['by_payment_method']['transfer']['total'],
+            'summary': summary_as_json(summary),
+        })
 
 
 class POSSaleItemViewSet(viewsets.ModelViewSet):
@@ -214,6 +345,18 @@ class POSSaleItemViewSet(viewsets.ModelViewSet):
             sale__company=user_company
         ).select_related('sale', 'item')
 
+    def perform_create(self, serializer):
+        serializer.save()
+        invalidate_receipts([serializer.instance.sale_id])
+
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_receipts([serializer.instance.sale_id])
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_receipts([instance.sale_id])
+
 
 class POSPaymentViewSet(viewsets.ModelViewSet):
     """ViewSet for POS payments"""
@@ -236,3 +379,160 @@ class POSPaymentViewSet(viewsets.ModelViewSet):
             serializer.save(date=timezone.now())
         else:
             serializer.save()
+        invalidate_receipts([serializer.instance.sale_id])
+
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_receipts([serializer.instance.sale_id])
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_receipts([instance.sale_id])
+
+
+class POSCatalogViewSet(viewsets.ViewSet):
+    """
+    Item catalog for registers: a full snapshot to load on start and a
+    delta feed to refresh it
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        """
+        Gzip-compressed snapshot of active items with their available stock.
+        Send the returned ETag in If-None-Match to skip unchanged catalogs.
+        """
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({'error': 'No active company'}, status=status.HTTP_400_BAD_REQUEST)
+
+        version, blob = get_catalog_snapshot(user_company)
+        etag = f'"{version}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(blob, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(blob), content_type='application/json')
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Items changed and ids deleted since `since` (the cursor of the
+        snapshot or of the previous delta)
+        """
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({'error': 'No active company'}, status=status.HTTP_400_BAD_REQUEST)
+
+        since = request.query_params.get('since')
+        try:
+            since = parse_datetime(since) if since else None
+        except ValueError:
+            since = None
+        if since is None:
+            return Response({'error': 'since must be a cursor returned by the catalog'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(get_catalog_changes(user_company, since))
+
+    @action(detail=False, methods=['get'])
+    def scan(self, request):
+        """Resolve a scanned barcode or SKU (`code`) to item, price and available stock"""
+        started = time.perf_counter()
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({'error': 'No active company'}, status=status.HTTP_400_BAD_REQUEST)
+
+        code = request.query_params.get('code', '').strip()
+        if not code:
+            return Response({'error': 'code is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        item = lookup_item_by_code(user_company, code)
+        if item is None:
+            response = Response({'error': f'No active item with barcode or SKU {code}'}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            response = Response(item)
+        response['Server-Timing'] = f'scan;dur={(time.perf_counter() - started) * 1000:.2f}'
+        return response
+
+
+class POSShiftViewSet(viewsets.ReadOnlyModelViewSet):
+    """Cashier shifts: open with a float, close with counted cash and a stored Z-report"""
+    serializer_class = POSShiftSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        """Filter shifts by user's active company"""
+        user_company = self.request.user.active_company
+        if not user_company:
+            return POSShift.objects.none()
+
+        queryset = POSShift.objects.filter(company=user_company).select_related('cashier')
+
+        shift_status = self.request.query_params.get('status')
+        if shift_status:
+            queryset = queryset.filter(status=shift_status)
+        cashier_id = self.request.query_params.get('cashier')
+        if cashier_id:
+            queryset = queryset.filter(cashier_id=cashier_id)
+        return queryset
+
+    def create(self, request):
+        """Open a shift for the current user"""
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({'error': 'No active company'}, status=status.HTTP_400_BAD_REQUEST)
+        if get_open_shift(user_company, request.user):
+            return Response({'error': 'You already have an open shift'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(company=user_company, cashier=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def current(self, request):
+        """The current user's open shift"""
+        shift = get_open_shift(request.user.active_company, request.user)
+        if not shift:
+            return Response({'error': 'No open shift'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_serializer(shift).data)
+
+    @action(detail=True, methods=['post'])
+    def close(self, request, pk=None):
+        """Close the shift with the counted cash (`closing_cash`)"""
+        shift = self.get_object()
+        try:
+            closing_cash = serializers.DecimalField(max_digits=12, decimal_places=2).run_validation(
+                request.data.get('closing_cash')
+            )
+        except serializers.ValidationError as e:
+            return Response({'error': f"closing_cash: {' '.join(e.detail)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tzinfo = get_tz_param(request)
+            shift = close_shift(shift, closing_cash, tzinfo, request.data.get('notes'))
+        except (ShiftError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({**self.get_serializer(shift).data, 'summary': shift.summary})
+
+    @action(detail=True, methods=['get'], url_path='z-report')
+    def z_report(self, request, pk=None):
+        """
+        Z-report of the shift: the stored summary once closed, or the
+        running figures (an X-report) while open
+        """
+        shift = self.get_object()
+        if shift.status == 'closed':
+            summary = shift.summary
+        else:
+            try:
+                tzinfo = get_tz_param(request)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            summary = summary_as_json(summarize_sales(shift.sales.all(), tzinfo))
+        return Response({**self.get_serializer(shift).data, 'summary': summary})
@@ -0,0 +1,60 @@
+"""
+Management command to generate draft purchase orders from reorder points
+"""
+from django.core.management.base import BaseCommand
+from companies.models import Company
+from procurement.models import Supplier
+from procurement.services import (
+    REPLENISHMENT_HISTORY_DAYS, REPLENISHMENT_LEAD_TIME_DAYS, create_replenishment_orders, plan_replenishment,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare stock with min/max levels and recent consumption and create draft purchase orders by supplier'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, help='Only plan for this company')
+        parser.add_argument('--history-days', type=int, default=REPLENISHMENT_HISTORY_DAYS,
+                            help='Days of outgoing movements used for the average daily consumption')
+        parser.add_argument('--lead-time-days', type=int, default=REPLENISHMENT_LEAD_TIME_DAYS,
+                            help='Days of consumption to cover while an order is on its way')
+        parser.add_argument('--supplier-id', type=int, help='Supplier for items that were never purchased')
+        parser.add_argument('--dry-run', action='store_true', help='List the suggestions without creating orders')
+
+    def handle(self, *args, **options):
+        company_id = options.get('company_id')
+
+        companies = Company.objects.filter(is_active=True)
+        if company_id:
+            companies = Company.objects.filter(id=company_id)
+            if not companies.exists():
+                self.stdout.write(self.style.ERROR(f'Company with ID {company_id} does not exist'))
+                return
+
+        for company in companies:
+            supplier = None
+            if options.get('supplier_id'):
+                supplier = Supplier.objects.filter(company=company, id=options['supplier_id']).first()
+                if supplier is None:
+                    self.stdout.write(self.style.ERROR(f"{company.name}: supplier {options['supplier_id']} not found"))
+                    continue
+
+            plan = plan_replenishment(company, options['history_days'], options['lead_time_days'], supplier)
+            unassigned = [line for line in plan if not line['supplier']]
+            for line in unassigned:
+                self.stdout.write(f"  {line['sku']}: {line['quantity']} needed, no supplier")
+            if options['dry_run']:
+                for line in plan:
+                    if line['supplier']:
+                        self.stdout.write(
+                            f"  {line['sku']}: order {line['quantity']} from supplier {line['supplier']} "
+                            f"(available {line['available']}, on order {line['on_order']}, "
+                            f"reorder point {line['reorder_point']})"
+                        )
+                self.stdout.write(self.style.SUCCESS(f'{company.name}: {len(plan)} items to reorder'))
+                continue
+
+            orders = create_replenishment_orders(company, plan)
+            self.stdout.write(self.style.SUCCESS(
+                f'{company.name}: {len(orders)} draft purchase orders for {len(plan) - len(unassigned)} items'
+            ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procurement', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchaseorder',
+            name='po_number',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='شماره سفارش خرید'),
+        ),
+        migrations.AlterField(
+            model_name='purchasereceipt',
+            name='receipt_number',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='شماره رسید'),
+        ),
+    ]
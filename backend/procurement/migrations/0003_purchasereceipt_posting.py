@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_cost_layers'),
+        ('procurement', '0002_alter_purchaseorder_po_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchasereceipt',
+            name='posted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='زمان ثبت در انبار'),
+        ),
+        migrations.AddField(
+            model_name='purchasereceipt',
+            name='warehouse',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='purchase_receipts', to='inventory.warehouse', verbose_name='انبار'),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
 from django.conf import settings
 from companies.models import Company
-from inventory.models import Item
+from companies.sequences import NumberedDocumentMixin
+from inventory.models import Item, Warehouse
 
 
 class Supplier(models.Model):
@@ -26,7 +27,7 @@ class Supplier(models.Model):
         return self.name
 
 
-class PurchaseOrder(models.Model):
+class PurchaseOrder(NumberedDocumentMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'پیش‌نویس'),
         ('sent', 'ارسال شده'),
@@ -35,8 +36,11 @@ class PurchaseOrder(models.Model):
         ('cancelled', 'لغو شده'),
     ]
 
+    document_type = 'purchase_order'
+    number_field = 'po_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='purchase_orders', verbose_name='شرکت')
-    po_number = models.CharField(max_length=100, verbose_name='شماره سفارش خرید')
+    po_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره سفارش خرید')
     supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, related_name='purchase_orders', verbose_name='تامین‌کننده')
     date = models.DateField(verbose_name='تاریخ')
     expected_delivery_date = models.DateField(blank=True, null=True, verbose_name='تاریخ تحویل مورد انتظار')
@@ -75,12 +79,19 @@ class PurchaseOrderItem(models.Model):
         return f"{self.item.name} x {self.quantity}"
 
 
-class PurchaseReceipt(models.Model):
+class PurchaseReceipt(NumberedDocumentMixin, models.Model):
+    document_type = 'purchase_receipt'
+    number_field = 'receipt_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='purchase_receipts', verbose_name='شرکت')
-    receipt_number = models.CharField(max_length=100, verbose_name='شماره رسید')
+    receipt_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره رسید')
     purchase_order = models.ForeignKey(PurchaseOrder, on_delete=models.PROTECT, related_name='receipts', verbose_name='سفارش خرید')
+    warehouse = models.ForeignKey(
+        Warehouse, on_delete=models.PROTECT, blank=True, null=True, related_name='purchase_receipts', verbose_name='انبار'
+    )
     date = models.DateField(verbose_name='تاریخ')
     received_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, verbose_name='دریافت شده توسط')
+    posted_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان ثبت در انبار')
     notes = models.TextField(blank=True, null=True, verbose_name='یادداشت‌ها')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
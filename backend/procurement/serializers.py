@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from sales.serializers import DocumentLineListSerializer, DocumentLineSerializer, DocumentLinesMixin
 from .models import Supplier, PurchaseOrder, PurchaseOrderItem, PurchaseReceipt, PurchaseReceiptItem
 
 class SupplierSerializer(serializers.ModelSerializer):
@@ -8,25 +9,51 @@ class SupplierSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at', 'company')
 
 
-class PurchaseOrderSerializer(serializers.ModelSerializer):
+class PurchaseOrderLineSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = PurchaseOrderItem
+        fields = ['id', 'item', 'quantity', 'unit_price', 'total']
+        read_only_fields = ('total',)
+
+
+class PurchaseOrderSerializer(DocumentLinesMixin, serializers.ModelSerializer):
+    items = PurchaseOrderLineSerializer(many=True, required=False)
+
     class Meta:
         model = PurchaseOrder
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'company')
+        read_only_fields = ('created_at', 'updated_at', 'company', 'subtotal', 'total')
+
 
+class PurchaseOrderItemSerializer(DocumentLineSerializer):
+    document_field = 'purchase_order'
 
-class PurchaseOrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = PurchaseOrderItem
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'total')
+        list_serializer_class = DocumentLineListSerializer
 
 
 class PurchaseReceiptSerializer(serializers.ModelSerializer):
     class Meta:
         model = PurchaseReceipt
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'company')
+        read_only_fields = ('created_at', 'updated_at', 'company', 'posted_at')
+
+    def validate(self, data):
+        if self.instance and self.instance.posted_at:
+            raise serializers.ValidationError("Posted receipts cannot be changed")
+        company = self.context['request'].user.active_company
+        warehouse = data.get('warehouse')
+        if warehouse and warehouse.company_id != company.id:
+            raise serializers.ValidationError({'warehouse': "Warehouse must belong to your company"})
+        purchase_order = data.get('purchase_order')
+        if purchase_order and purchase_order.company_id != company.id:
+            raise serializers.ValidationError({'purchase_order': "Purchase order must belong to your company"})
+        return data
 
 
 class PurchaseReceiptItemSerializer(serializers.ModelSerializer):
@@ -35,4 +62,16 @@ class PurchaseReceiptItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
 
+    def validate(self, data):
+        receipt = data.get('receipt') or self.instance.receipt
+        if receipt.posted_at or (self.instance and self.instance.receipt.posted_at):
+            raise serializers.ValidationError("Posted receipts cannot be changed")
+        company = self.context['request'].user.active_company
+        if not company or receipt.company_id != company.id:
+            raise serializers.ValidationError({'receipt': "Receipt does not belong to your company"})
+        po_item = data.get('po_item') or self.instance.po_item
+        if po_item.purchase_order_id != receipt.purchase_order_id:
+            raise serializers.ValidationError({'po_item': "Line is not part of the receipt's purchase order"})
+        return data
+
 
@@ -0,0 +1,184 @@
+"""
+Posting of purchase receipts into stock and replenishment planning
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal, ROUND_UP
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from companies.sequences import reserve_numbers
+from inventory.models import Item, Stock, StockMovement
+from inventory.services import record_movements
+from sales.services import recalculate_document_totals
+from .models import PurchaseOrder, PurchaseOrderItem, PurchaseReceipt, PurchaseReceiptItem
+
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+# Purchase orders whose unreceived quantities are still expected
+OPEN_PURCHASE_STATUSES = ('draft', 'sent', 'confirmed')
+REPLENISHMENT_HISTORY_DAYS = 30
+REPLENISHMENT_LEAD_TIME_DAYS = 7
+
+
+class ReceiptPostingError(Exception):
+    pass
+
+
+def post_purchase_receipt(receipt, user=None):
+    """
+    Bring the received quantities of a receipt into its warehouse as 'in'
+    movements at the purchase order prices, opening one cost layer per
+    line, in one batch. A receipt can only be posted once.
+    """
+    with transaction.atomic():
+        receipt = PurchaseReceipt.objects.select_for_update().get(pk=receipt.pk)
+        if receipt.posted_at:
+            raise ReceiptPostingError("Receipt is already posted")
+        if not receipt.warehouse_id:
+            raise ReceiptPostingError("Receipt has no warehouse")
+        lines = list(receipt.items.select_related('po_item').filter(quantity_received__gt=0))
+        if not lines:
+            raise ReceiptPostingError("Receipt has no received quantities")
+        if any(line.po_item.purchase_order_id != receipt.purchase_order_id for line in lines):
+            raise ReceiptPostingError("Receipt has lines of another purchase order")
+
+        now = timezone.now()
+        if receipt.date == timezone.localdate(now):
+            date = now
+        else:
+            date = timezone.make_aware(datetime.datetime.combine(receipt.date, datetime.time.min))
+        movements = record_movements([
+            StockMovement(
+                company_id=receipt.company_id,
+                warehouse_id=receipt.warehouse_id,
+                item_id=line.po_item.item_id,
+                movement_type='in',
+                quantity=line.quantity_received,
+                unit_cost=line.po_item.unit_price,
+                reference_type='purchase_receipt',
+                reference_number=receipt.receipt_number,
+                date=date,
+                created_by=user,
+            )
+            for line in lines
+        ])
+        receipt.posted_at = now
+        receipt.save(update_fields=['posted_at', 'updated_at'])
+    return receipt, movements
+
+
+def _grouped(queryset, key, value):
+    return {
+        row[key]: row['total'] or ZERO
+        for row in queryset.order_by().values(key).annotate(total=Sum(value))
+    }
+
+
+def plan_replenishment(company, history_days=REPLENISHMENT_HISTORY_DAYS, lead_time_days=REPLENISHMENT_LEAD_TIME_DAYS,
+                       default_supplier=None):
+    """
+    Items of a company that need ordering, with five grouped queries
+    whatever the number of items.
+
+    Each active item with a min_stock or max_stock is projected as free
+    stock (quantity - reserved, plus what is in transit between
+    warehouses) plus what open purchase orders still expect (ordered
+    minus posted receipts). The reorder point is the
+    larger of min_stock and the demand over the lead time, from the
+    average daily 'out' movements of the last `history_days`. Items at or
+    below it are ordered up to max_stock (or the reorder point when
+    max_stock is lower) from the supplier and at the price of their last
+    purchase order, or from `default_supplier` if never purchased.
+    """
+    last_line = PurchaseOrderItem.objects.filter(
+        item=OuterRef('pk'), purchase_order__company=company
+    ).exclude(purchase_order__status='cancelled').order_by('-purchase_order__date', '-pk')
+    items = Item.objects.filter(company=company, is_active=True).filter(
+        Q(min_stock__gt=0) | Q(max_stock__gt=0)
+    ).annotate(
+        last_supplier=Subquery(last_line.values('purchase_order__supplier_id')[:1]),
+        last_price=Subquery(last_line.values('unit_price')[:1]),
+    ).values('id', 'sku', 'name', 'min_stock', 'max_stock', 'cost', 'last_supplier', 'last_price')
+
+    free = _grouped(
+        Stock.objects.filter(warehouse__company=company), 'item_id', F('quantity') - F('reserved') + F('in_transit')
+    )
+    open_lines = PurchaseOrderItem.objects.filter(
+        purchase_order__company=company, purchase_order__status__in=OPEN_PURCHASE_STATUSES
+    )
+    ordered = _grouped(open_lines, 'item_id', 'quantity')
+    received = _grouped(
+        PurchaseReceiptItem.objects.filter(po_item__in=open_lines, receipt__posted_at__isnull=False),
+        'po_item__item_id', 'quantity_received',
+    )
+    since = timezone.now() - datetime.timedelta(days=history_days)
+    consumed = _grouped(
+        StockMovement.objects.filter(company=company, movement_type='out', date__gte=since),
+        'item_id', 'quantity',
+    )
+
+    default_supplier_id = default_supplier.pk if default_supplier else None
+    plan = []
+    for item in items.iterator(chunk_size=2000):
+        item_id = item['id']
+        on_order = max(ordered.get(item_id, ZERO) - received.get(item_id, ZERO), ZERO)
+        projected = free.get(item_id, ZERO) + on_order
+        daily_usage = consumed.get(item_id, ZERO) / history_days
+        reorder_point = max(item['min_stock'], daily_usage * lead_time_days)
+        if projected > reorder_point:
+            continue
+        quantity = (max(item['max_stock'], reorder_point) - projected).quantize(CENT, rounding=ROUND_UP)
+        if quantity <= 0:
+            continue
+        plan.append({
+            'item': item_id,
+            'sku': item['sku'],
+            'name': item['name'],
+            'available': free.get(item_id, ZERO),
+            'on_order': on_order,
+            'daily_usage': daily_usage.quantize(CENT),
+            'reorder_point': reorder_point.quantize(CENT),
+            'quantity': quantity,
+            'supplier': item['last_supplier'] or default_supplier_id,
+            'unit_price': item['last_price'] if item['last_price'] is not None else item['cost'],
+        })
+    return plan
+
+
+@transaction.atomic
+def create_replenishment_orders(company, plan, user=None, date=None):
+    """
+    Draft purchase orders for a plan from plan_replenishment(), one per
+    supplier, written in bulk. Lines without a supplier are skipped.
+    Returns the created orders.
+    """
+    by_supplier = defaultdict(list)
+    for line in plan:
+        if line['supplier']:
+            by_supplier[line['supplier']].append(line)
+    if not by_supplier:
+        return []
+
+    date = date or timezone.localdate()
+    suppliers = sorted(by_supplier)
+    numbers = reserve_numbers(company.id, PurchaseOrder.document_type, len(suppliers), date)
+    orders = PurchaseOrder.objects.bulk_create([
+        PurchaseOrder(
+            company=company, po_number=number, supplier_id=supplier_id, date=date, status='draft',
+            created_by=user, notes='Generated by the replenishment planner',
+        )
+        for supplier_id, number in zip(suppliers, numbers)
+    ])
+    PurchaseOrderItem.objects.bulk_create([
+        PurchaseOrderItem(
+            purchase_order=order, item_id=line['item'], quantity=line['quantity'],
+            unit_price=line['unit_price'], total=(line['quantity'] * line['unit_price']).quantize(CENT),
+        )
+        for order in orders
+        for line in by_supplier[order.supplier_id]
+    ], batch_size=1000)
+    recalculate_document_totals(PurchaseOrder, [order.pk for order in orders])
+    return orders
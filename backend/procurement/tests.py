@@ -1,3 +1,155 @@
+import datetime
+from decimal import Decimal
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import User
+from companies.models import Company
+from inventory.models import Item, Stock, StockMovement, Warehouse
+from .models import PurchaseOrder, PurchaseOrderItem, PurchaseReceipt, PurchaseReceiptItem, Supplier
+from .services import ReceiptPostingError, create_replenishment_orders, plan_replenishment, post_purchase_receipt
 
-# Create your tests here.
+
+def purchase_order(company, item, unit_price):
+    supplier = Supplier.objects.create(company=company, name='Supplier')
+    order = PurchaseOrder.objects.create(company=company, supplier=supplier, date=datetime.date(2026, 1, 1))
+    line = PurchaseOrderItem.objects.create(
+        purchase_order=order, item=item, quantity=10, unit_price=unit_price, total=10 * unit_price
+    )
+    return order, line
+
+
+class PurchaseReceiptTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.user.active_company = self.company
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.warehouse = Warehouse.objects.create(company=self.company, name='Main', code='MAIN')
+        self.item = Item.objects.create(company=self.company, name='Pen', sku='PEN')
+        self.order, self.po_item = purchase_order(self.company, self.item, 4)
+        self.receipt = PurchaseReceipt.objects.create(
+            company=self.company, purchase_order=self.order, warehouse=self.warehouse, date=datetime.date(2026, 1, 2)
+        )
+
+        owner = User.objects.create_user('other', password='secret')
+        self.other = Company.objects.create(owner=owner, name='Other')
+        other_item = Item.objects.create(company=self.other, name='Secret', sku='SECRET')
+        self.other_order, self.other_po_item = purchase_order(self.other, other_item, 99)
+
+    def add_line(self, po_item):
+        return self.client.post('/api/procurement/purchase-receipt-items/', {
+            'receipt': self.receipt.id, 'po_item': po_item.id, 'quantity_received': '5',
+        }, format='json')
+
+    def test_post_receipt(self):
+        self.assertEqual(self.add_line(self.po_item).status_code, 201)
+        post_purchase_receipt(self.receipt, self.user)
+
+        stock = Stock.objects.get(warehouse=self.warehouse, item=self.item)
+        self.assertEqual(stock.quantity, Decimal('5'))
+        with self.assertRaises(ReceiptPostingError):
+            post_purchase_receipt(self.receipt, self.user)
+
+    def test_line_of_another_purchase_order_is_rejected(self):
+        response = self.add_line(self.other_po_item)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('po_item', response.json())
+
+    def test_lines_of_another_purchase_order_are_not_posted(self):
+        PurchaseReceiptItem.objects.create(receipt=self.receipt, po_item=self.other_po_item, quantity_received=5)
+        with self.assertRaises(ReceiptPostingError):
+            post_purchase_receipt(self.receipt, self.user)
+        self.assertFalse(Stock.objects.filter(warehouse=self.warehouse).exists())
+
+    def test_receipt_items_are_scoped_to_company(self):
+        other_receipt = PurchaseReceipt.objects.create(
+            company=self.other, purchase_order=self.other_order, date=datetime.date(2026, 1, 2)
+        )
+        line = PurchaseReceiptItem.objects.create(receipt=other_receipt, po_item=self.other_po_item, quantity_received=1)
+        self.assertEqual(self.client.get(f'/api/procurement/purchase-receipt-items/{line.id}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/procurement/purchase-receipt-items/').json(), [])
+
+
+class ReplenishmentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.warehouse = Warehouse.objects.create(company=self.company, name='Main', code='MAIN')
+        self.supplier = Supplier.objects.create(company=self.company, name='Stationer')
+        self.fallback = Supplier.objects.create(company=self.company, name='Wholesaler')
+        now = timezone.now()
+
+        # Pen: free 12 - 4 reserved, 20 ordered of which 15 received, 60 sold in the last 30 days
+        self.pen = Item.objects.create(company=self.company, name='Pen', sku='PEN', cost=3, min_stock=10, max_stock=50)
+        Stock.objects.create(warehouse=self.warehouse, item=self.pen, quantity=12, reserved=4)
+        # An older, fully received order from another supplier
+        order, line = purchase_order(self.company, self.pen, 4)
+        PurchaseOrder.objects.filter(pk=order.pk).update(status='received')
+        order = PurchaseOrder.objects.create(
+            company=self.company, supplier=self.supplier, date=datetime.date(2026, 2, 1), status='sent'
+        )
+        line = PurchaseOrderItem.objects.create(purchase_order=order, item=self.pen, quantity=20, unit_price=5, total=100)
+        receipt = PurchaseReceipt.objects.create(
+            company=self.company, purchase_order=order, warehouse=self.warehouse, date=datetime.date(2026, 2, 2),
+            posted_at=now,
+        )
+        PurchaseReceiptItem.objects.create(receipt=receipt, po_item=line, quantity_received=15)
+        self.sold(self.pen, 60, now - datetime.timedelta(days=1))
+        self.sold(self.pen, 100, now - datetime.timedelta(days=40))
+
+        # Ink: never purchased, 10 sold in 30 days
+        self.ink = Item.objects.create(company=self.company, name='Ink', sku='INK', cost=7, min_stock=1)
+        self.sold(self.ink, 10, now - datetime.timedelta(days=2))
+
+        # Pad: enough free stock
+        self.pad = Item.objects.create(company=self.company, name='Pad', sku='PAD', min_stock=5, max_stock=20)
+        Stock.objects.create(warehouse=self.warehouse, item=self.pad, quantity=20)
+
+    def sold(self, item, quantity, date):
+        StockMovement.objects.create(
+            company=self.company, warehouse=self.warehouse, item=item, movement_type='out', quantity=quantity, date=date
+        )
+
+    def plan(self, **options):
+        return {line['item']: line for line in plan_replenishment(self.company, **options)}
+
+    def test_plan_orders_up_to_max_stock(self):
+        plan = self.plan()
+        self.assertEqual(set(plan), {self.pen.id, self.ink.id})
+
+        pen = plan[self.pen.id]
+        self.assertEqual((pen['available'], pen['on_order']), (Decimal('8'), Decimal('5')))
+        self.assertEqual((pen['daily_usage'], pen['reorder_point']), (Decimal('2.00'), Decimal('14.00')))
+        self.assertEqual(pen['quantity'], Decimal('37.00'))
+        self.assertEqual((pen['supplier'], pen['unit_price']), (self.supplier.id, Decimal('5')))
+
+        # Lead-time demand of 7 * 10 / 30 is above min_stock and max_stock, rounded up
+        ink = plan[self.ink.id]
+        self.assertEqual((ink['reorder_point'], ink['quantity']), (Decimal('2.33'), Decimal('2.34')))
+        self.assertEqual((ink['supplier'], ink['unit_price']), (None, Decimal('7')))
+
+    def test_plan_takes_five_queries(self):
+        for number in range(20):
+            Item.objects.create(company=self.company, name=f'Clip {number}', sku=f'CLIP{number}', min_stock=1)
+        with self.assertNumQueries(5):
+            plan = plan_replenishment(self.company)
+        self.assertEqual(len(plan), 22)
+
+    def test_orders_are_created_per_supplier(self):
+        plan = plan_replenishment(self.company, default_supplier=self.fallback)
+        orders = create_replenishment_orders(self.company, plan, self.user, datetime.date(2026, 3, 1))
+        self.assertEqual({order.supplier_id for order in orders}, {self.supplier.id, self.fallback.id})
+
+        pen_order = PurchaseOrder.objects.get(supplier=self.supplier, status='draft')
+        self.assertEqual(pen_order.total, Decimal('185.00'))
+        line = pen_order.items.get()
+        self.assertEqual((line.item_id, line.quantity, line.unit_price), (self.pen.id, Decimal('37'), Decimal('5')))
+        line = PurchaseOrderItem.objects.get(purchase_order__supplier=self.fallback)
+        self.assertEqual((line.item_id, line.quantity, line.total), (self.ink.id, Decimal('2.34'), Decimal('16.38')))
+
+    def test_lines_without_supplier_are_skipped(self):
+        orders = create_replenishment_orders(self.company, plan_replenishment(self.company), self.user)
+        self.assertEqual([order.supplier_id for order in orders], [self.supplier.id])
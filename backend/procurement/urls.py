@@ -3,8 +3,9 @@ from .views import (
     SupplierListCreateView, SupplierDetailView,
     PurchaseOrderListCreateView, PurchaseOrderDetailView,
     PurchaseOrderItemListCreateView, PurchaseOrderItemDetailView,
-    PurchaseReceiptListCreateView, PurchaseReceiptDetailView,
+    PurchaseReceiptListCreateView, PurchaseReceiptDetailView, PurchaseReceiptPostView,
     PurchaseReceiptItemListCreateView, PurchaseReceiptItemDetailView,
+    ReplenishmentView,
 )
 
 urlpatterns = [
@@ -16,6 +17,8 @@ urlpatterns = [
     path('purchase-order-items/<int:pk>/', PurchaseOrderItemDetailView.as_view(), name='purchase-order-item-detail'),
     path('purchase-receipts/', PurchaseReceiptListCreateView.as_view(), name='purchase-receipt-list-create'),
     path('purchase-receipts/<int:pk>/', PurchaseReceiptDetailView.as_view(), name='purchase-receipt-detail'),
+    path('purchase-receipts/<int:pk>/post/', PurchaseReceiptPostView.as_view(), name='purchase-receipt-post'),
     path('purchase-receipt-items/', PurchaseReceiptItemListCreateView.as_view(), name='purchase-receipt-item-list-create'),
     path('purchase-receipt-items/<int:pk>/', PurchaseReceiptItemDetailView.as_view(), name='purchase-receipt-item-detail'),
+    path('replenishment/', ReplenishmentView.as_view(), name='replenishment'),
 ]
@@ -1,6 +1,17 @@
 from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from inventory.serializers import StockMovementSerializer
+from sales.services import recalculate_document_totals
+from sales.views import BulkCreateMixin
 from .models import Supplier, PurchaseOrder, PurchaseOrderItem, PurchaseReceipt, PurchaseReceiptItem
 from .serializers import SupplierSerializer, PurchaseOrderSerializer, PurchaseOrderItemSerializer, PurchaseReceiptSerializer, PurchaseReceiptItemSerializer
+from .services import (
+    REPLENISHMENT_HISTORY_DAYS, REPLENISHMENT_LEAD_TIME_DAYS, ReceiptPostingError,
+    create_replenishment_orders, plan_replenishment, post_purchase_receipt,
+)
 
 
 class SupplierListCreateView(generics.ListCreateAPIView):
@@ -37,7 +48,7 @@ class PurchaseOrderListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return PurchaseOrder.objects.filter(company=user_company)
+            return PurchaseOrder.objects.filter(company=user_company).prefetch_related('items')
         return PurchaseOrder.objects.none()
 
     def perform_create(self, serializer):
@@ -53,16 +64,16 @@ class PurchaseOrderDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return PurchaseOrder.objects.filter(company=user_company)
+            return PurchaseOrder.objects.filter(company=user_company).prefetch_related('items')
         return PurchaseOrder.objects.none()
 
 
-class PurchaseOrderItemListCreateView(generics.ListCreateAPIView):
+class PurchaseOrderItemListCreateView(BulkCreateMixin, generics.ListCreateAPIView):
     serializer_class = PurchaseOrderItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return PurchaseOrderItem.objects.all()
+        return PurchaseOrderItem.objects.filter(purchase_order__company=self.request.user.active_company)
 
 
 class PurchaseOrderItemDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -70,7 +81,12 @@ class PurchaseOrderItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return PurchaseOrderItem.objects.all()
+        return PurchaseOrderItem.objects.filter(purchase_order__company=self.request.user.active_company)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        recalculate_document_totals(PurchaseOrder, [instance.purchase_order_id])
 
 
 class PurchaseReceiptListCreateView(generics.ListCreateAPIView):
@@ -99,13 +115,37 @@ class PurchaseReceiptDetailView(generics.RetrieveUpdateDestroyAPIView):
             return PurchaseReceipt.objects.filter(company=user_company)
         return PurchaseReceipt.objects.none()
 
+    def destroy(self, request, *args, **kwargs):
+        if self.get_object().posted_at:
+            return Response({"error": "Posted receipts cannot be deleted"}, status=400)
+        return super().destroy(request, *args, **kwargs)
+
+
+class PurchaseReceiptPostView(APIView):
+    """Post a receipt into its warehouse, opening the cost layers of its lines"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+        receipt = get_object_or_404(PurchaseReceipt, pk=pk, company=user_company)
+        try:
+            receipt, movements = post_purchase_receipt(receipt, request.user)
+        except ReceiptPostingError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({
+            'receipt': PurchaseReceiptSerializer(receipt, context={'request': request}).data,
+            'movements': StockMovementSerializer(movements, many=True).data,
+        })
+
 
 class PurchaseReceiptItemListCreateView(generics.ListCreateAPIView):
     serializer_class = PurchaseReceiptItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return PurchaseReceiptItem.objects.all()
+        return PurchaseReceiptItem.objects.filter(receipt__company=self.request.user.active_company)
 
 
 class PurchaseReceiptItemDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -113,6 +153,56 @@ class PurchaseReceiptItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return PurchaseReceiptItem.objects.all()
+        return PurchaseReceiptItem.objects.filter(receipt__company=self.request.user.active_company)
+
+    def destroy(self, request, *args, **kwargs):
+        if self.get_object().receipt.posted_at:
+            return Response({"error": "Posted receipts cannot be changed"}, status=400)
+        return super().destroy(request, *args, **kwargs)
 
 
+class ReplenishmentView(APIView):
+    """
+    Reorder suggestions from min/max stock and recent consumption (GET),
+    or draft purchase orders for them, one per supplier (POST).
+    `history_days` and `lead_time_days` tune the demand estimate and
+    `supplier` is used for items never purchased before.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_plan(self, request, params):
+        user_company = request.user.active_company
+        try:
+            history_days = int(params.get('history_days', REPLENISHMENT_HISTORY_DAYS))
+            lead_time_days = int(params.get('lead_time_days', REPLENISHMENT_LEAD_TIME_DAYS))
+        except (TypeError, ValueError):
+            return None, Response({"error": "history_days and lead_time_days must be integers"}, status=400)
+        if history_days < 1 or lead_time_days < 0:
+            return None, Response({"error": "history_days must be positive and lead_time_days not negative"}, status=400)
+        supplier = None
+        if params.get('supplier'):
+            supplier = Supplier.objects.filter(company=user_company, pk=params['supplier']).first()
+            if supplier is None:
+                return None, Response({"error": "Supplier not found"}, status=400)
+        return plan_replenishment(user_company, history_days, lead_time_days, supplier), None
+
+    def get(self, request):
+        if not request.user.active_company:
+            return Response({"error": "No active company"}, status=400)
+        plan, error = self.get_plan(request, request.query_params)
+        if error:
+            return error
+        return Response({'count': len(plan), 'results': plan})
+
+    def post(self, request):
+        if not request.user.active_company:
+            return Response({"error": "No active company"}, status=400)
+        plan, error = self.get_plan(request, request.data)
+        if error:
+            return error
+        orders = create_replenishment_orders(request.user.active_company, plan, request.user)
+        orders = PurchaseOrder.objects.filter(pk__in=[order.pk for order in orders]).prefetch_related('items')
+        return Response({
+            'orders': PurchaseOrderSerializer(orders, many=True, context={'request': request}).data,
+            'unassigned': [line for line in plan if not line['supplier']],
+        }, status=201)
@@ -0,0 +1,29 @@
+"""
+Management command to recompute invoice paid amounts and statuses from payments
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from companies.models import Company
+from sales.services import reconcile_invoice_payments
+
+
+class Command(BaseCommand):
+    help = 'Recompute invoice paid amounts and statuses from recorded payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, help='Only reconcile invoices of this company')
+
+    def handle(self, *args, **options):
+        company_id = options.get('company_id')
+
+        companies = Company.objects.all()
+        if company_id:
+            companies = companies.filter(id=company_id)
+            if not companies.exists():
+                self.stdout.write(self.style.ERROR(f'Company with ID {company_id} does not exist'))
+                return
+
+        for company in companies:
+            with transaction.atomic():
+                drifted = reconcile_invoice_payments(company)
+            self.stdout.write(self.style.SUCCESS(f'Reconciled invoices for {company.name}: {drifted} paid amounts corrected'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='invoice_number',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='شماره فاکتور'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='payment_number',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='شماره پرداخت'),
+        ),
+        migrations.AlterField(
+            model_name='quotation',
+            name='quote_number',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='شماره پیش\u200cفاکتور'),
+        ),
+        migrations.AlterField(
+            model_name='salesorder',
+            name='order_number',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='شماره سفارش'),
+        ),
+    ]
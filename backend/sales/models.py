@@ -1,11 +1,12 @@
 from django.db import models
 from django.conf import settings
 from companies.models import Company
+from companies.sequences import NumberedDocumentMixin
 from contacts.models import Contact
 from inventory.models import Item
 
 
-class Quotation(models.Model):
+class Quotation(NumberedDocumentMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'پیش‌نویس'),
         ('sent', 'ارسال شده'),
@@ -14,8 +15,11 @@ class Quotation(models.Model):
         ('expired', 'منقضی شده'),
     ]
 
+    document_type = 'quotation'
+    number_field = 'quote_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='quotations', verbose_name='شرکت')
-    quote_number = models.CharField(max_length=100, verbose_name='شماره پیش‌فاکتور')
+    quote_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره پیش‌فاکتور')
     customer = models.ForeignKey(Contact, on_delete=models.PROTECT, related_name='quotations', verbose_name='مشتری')
     date = models.DateField(verbose_name='تاریخ')
     valid_until = models.DateField(verbose_name='اعتبار تا')
@@ -57,7 +61,7 @@ class QuotationItem(models.Model):
         return f"{self.item.name} x {self.quantity}"
 
 
-class SalesOrder(models.Model):
+class SalesOrder(NumberedDocumentMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'پیش‌نویس'),
         ('confirmed', 'تایید شده'),
@@ -66,8 +70,11 @@ class SalesOrder(models.Model):
         ('cancelled', 'لغو شده'),
     ]
 
+    document_type = 'sales_order'
+    number_field = 'order_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='sales_orders', verbose_name='شرکت')
-    order_number = models.CharField(max_length=100, verbose_name='شماره سفارش')
+    order_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره سفارش')
     quotation = models.ForeignKey(Quotation, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='پیش‌فاکتور')
     customer = models.ForeignKey(Contact, on_delete=models.PROTECT, related_name='sales_orders', verbose_name='مشتری')
     date = models.DateField(verbose_name='تاریخ')
@@ -109,7 +116,7 @@ class SalesOrderItem(models.Model):
         return f"{self.item.name} x {self.quantity}"
 
 
-class Invoice(models.Model):
+class Invoice(NumberedDocumentMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'پیش‌نویس'),
         ('sent', 'ارسال شده'),
@@ -118,8 +125,11 @@ class Invoice(models.Model):
         ('cancelled', 'لغو شده'),
     ]
 
+    document_type = 'invoice'
+    number_field = 'invoice_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='invoices', verbose_name='شرکت')
-    invoice_number = models.CharField(max_length=100, verbose_name='شماره فاکتور')
+    invoice_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره فاکتور')
     sales_order = models.ForeignKey(SalesOrder, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='سفارش فروش')
     customer = models.ForeignKey(Contact, on_delete=models.PROTECT, related_name='invoices', verbose_name='مشتری')
     date = models.DateField(verbose_name='تاریخ')
@@ -167,7 +177,7 @@ class InvoiceItem(models.Model):
         return f"{self.item.name} x {self.quantity}"
 
 
-class Payment(models.Model):
+class Payment(NumberedDocumentMixin, models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('cash', 'نقدی'),
         ('card', 'کارت'),
@@ -175,9 +185,12 @@ class Payment(models.Model):
         ('cheque', 'چک'),
     ]
 
+    document_type = 'payment'
+    number_field = 'payment_number'
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='payments', verbose_name='شرکت')
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='payments', verbose_name='فاکتور')
-    payment_number = models.CharField(max_length=100, verbose_name='شماره پرداخت')
+    payment_number = models.CharField(max_length=100, blank=True, default='', verbose_name='شماره پرداخت')
     date = models.DateField(verbose_name='تاریخ')
     amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='مبلغ')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, verbose_name='روش پرداخت')
@@ -1,46 +1,190 @@
 from rest_framework import serializers
+from django.db import transaction
+from django.db.models import ProtectedError
 from .models import Quotation, QuotationItem, SalesOrder, SalesOrderItem, Invoice, InvoiceItem, Payment
+from .services import apply_payment_amounts, recalculate_document_totals, save_document_lines, set_line_total
+
+
+class DocumentLineListSerializer(serializers.ListSerializer):
+    """Creates a list of document lines with one INSERT and one totals update"""
+
+    @transaction.atomic
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        lines = model.objects.bulk_create([set_line_total(model(**attrs)) for attrs in validated_data])
+        document_model = model._meta.get_field(self.child.document_field).related_model
+        recalculate_document_totals(document_model, [getattr(line, f'{self.child.document_field}_id') for line in lines])
+        return lines
+
+
+class DocumentLineSerializer(serializers.ModelSerializer):
+    """
+    Base for line serializers of documents with totals: the line total is
+    computed from quantity, unit price and discount and the document totals
+    are recomputed whenever a line is written
+    """
+    document_field = None
+
+    def validate(self, data):
+        company = self.context['request'].user.active_company
+        document = data.get(self.document_field)
+        if document is not None and (not company or document.company_id != company.id):
+            raise serializers.ValidationError({self.document_field: "Document does not belong to your company"})
+        item = data.get('item')
+        if item is not None and (not company or item.company_id != company.id):
+            raise serializers.ValidationError({'item': "Item does not belong to your company"})
+        return data
+
+    @transaction.atomic
+    def create(self, validated_data):
+        line = set_line_total(self.Meta.model(**validated_data))
+        line.save()
+        document_model = self.Meta.model._meta.get_field(self.document_field).related_model
+        recalculate_document_totals(document_model, [getattr(line, f'{self.document_field}_id')])
+        return line
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        document_ids = [getattr(instance, f'{self.document_field}_id')]
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        set_line_total(instance).save()
+        document_ids.append(getattr(instance, f'{self.document_field}_id'))
+        document_model = self.Meta.model._meta.get_field(self.document_field).related_model
+        recalculate_document_totals(document_model, document_ids)
+        return instance
+
+
+class DocumentLinesMixin:
+    """
+    Writable nested `items` for document serializers. Lines are written in
+    bulk (see save_document_lines) and the document totals recomputed.
+    """
+
+    def validate_items(self, items):
+        line_ids = [item['id'] for item in items if item.get('id') is not None]
+        if len(line_ids) != len(set(line_ids)):
+            raise serializers.ValidationError("Duplicate line ids")
+        known = set(self.instance.items.values_list('pk', flat=True)) if self.instance else set()
+        unknown = set(line_ids) - known
+        if unknown:
+            raise serializers.ValidationError(f"Lines {sorted(unknown)} do not belong to this document")
+        company = self.instance.company if self.instance else self.context['request'].user.active_company
+        for item in items:
+            if item.get('id') is None:
+                missing = [field for field in ('item', 'quantity', 'unit_price') if field not in item]
+                if missing:
+                    raise serializers.ValidationError(f"New lines require {', '.join(missing)}")
+            if item.get('item') is not None and (not company or item['item'].company_id != company.id):
+                raise serializers.ValidationError(f"Item {item['item'].pk} does not belong to your company")
+        return items
+
+    @transaction.atomic
+    def create(self, validated_data):
+        lines_data = validated_data.pop('items', [])
+        document = super().create(validated_data)
+        save_document_lines(document, lines_data)
+        return self._recalculate(document)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        lines_data = validated_data.pop('items', None)
+        document = super().update(instance, validated_data)
+        if lines_data is not None:
+            try:
+                save_document_lines(document, lines_data)
+            except ProtectedError:
+                raise serializers.ValidationError({"items": "Lines referenced by other documents cannot be removed"})
+        return self._recalculate(document)
+
+    def _recalculate(self, document):
+        recalculate_document_totals(type(document), [document.pk])
+        document.refresh_from_db(fields=['subtotal', 'total'] + (['status'] if isinstance(document, Invoice) else []))
+        return document
+
+
+class QuotationLineSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = QuotationItem
+        fields = ['id', 'item', 'description', 'quantity', 'unit_price', 'discount', 'total']
+        read_only_fields = ('total',)
+
+
+class QuotationSerializer(DocumentLinesMixin, serializers.ModelSerializer):
+    items = QuotationLineSerializer(many=True, required=False)
 
-class QuotationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Quotation
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'subtotal', 'total')
+
 
+class QuotationItemSerializer(DocumentLineSerializer):
+    document_field = 'quotation'
 
-class QuotationItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = QuotationItem
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'total')
+        list_serializer_class = DocumentLineListSerializer
+
+
+class SalesOrderLineSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = SalesOrderItem
+        fields = ['id', 'item', 'description', 'quantity', 'unit_price', 'discount', 'total']
+        read_only_fields = ('total',)
 
 
-class SalesOrderSerializer(serializers.ModelSerializer):
+class SalesOrderSerializer(DocumentLinesMixin, serializers.ModelSerializer):
+    items = SalesOrderLineSerializer(many=True, required=False)
+
     class Meta:
         model = SalesOrder
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'subtotal', 'total')
+
 
+class SalesOrderItemSerializer(DocumentLineSerializer):
+    document_field = 'sales_order'
 
-class SalesOrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = SalesOrderItem
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'total')
+        list_serializer_class = DocumentLineListSerializer
+
 
+class InvoiceLineSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = InvoiceItem
+        fields = ['id', 'item', 'description', 'quantity', 'unit_price', 'discount', 'total']
+        read_only_fields = ('total',)
+
+
+class InvoiceSerializer(DocumentLinesMixin, serializers.ModelSerializer):
+    items = InvoiceLineSerializer(many=True, required=False)
 
-class InvoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invoice
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'paid_amount', 'subtotal', 'total')
+
 
+class InvoiceItemSerializer(DocumentLineSerializer):
+    document_field = 'invoice'
 
-class InvoiceItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = InvoiceItem
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'total')
+        list_serializer_class = DocumentLineListSerializer
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -49,4 +193,32 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
 
+    def validate_invoice(self, invoice):
+        company = self.instance.company if self.instance else self.context['request'].user.active_company
+        if not company or invoice.company_id != company.id:
+            raise serializers.ValidationError("Invoice does not belong to your company")
+        if invoice.status in ('draft', 'cancelled'):
+            raise serializers.ValidationError("Payments cannot be recorded against draft or cancelled invoices")
+        return invoice
+
+    def validate_amount(self, amount):
+        if amount <= 0:
+            raise serializers.ValidationError("Payment amount must be positive")
+        return amount
+
+    @transaction.atomic
+    def create(self, validated_data):
+        payment = super().create(validated_data)
+        apply_payment_amounts(payment.company_id, {payment.invoice_id: payment.amount})
+        return payment
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        old_invoice_id, old_amount = instance.invoice_id, instance.amount
+        payment = super().update(instance, validated_data)
+        amounts = {old_invoice_id: -old_amount}
+        amounts[payment.invoice_id] = amounts.get(payment.invoice_id, 0) + payment.amount
+        apply_payment_amounts(payment.company_id, amounts)
+        return payment
+
 
@@ -0,0 +1,284 @@
+"""
+Receivables calculations over sales invoices
+"""
+import hashlib
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Case, CharField, Count, DecimalField, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from inventory.services import consume_reservations, release_reservations, reserve_stock
+from .models import Invoice, Payment, SalesOrderItem
+
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+# Invoices that can still be collected
+RECEIVABLE_STATUSES = ('sent', 'paid', 'overdue')
+
+# Sales orders in these statuses hold stock for their lines
+RESERVING_STATUSES = ('confirmed', 'in_progress')
+SALES_ORDER_RESERVATION_DAYS = 30
+
+AGING_BUCKETS = ('current', 'days_1_30', 'days_31_60', 'days_61_90', 'days_over_90')
+AGING_CACHE_TIMEOUT = 60 * 60
+
+
+def _aging_version(company):
+    """
+    Hash of the count and last change of the company's invoices and
+    payments, read from the database so every worker sees a change at once
+    """
+    invoices = Invoice.objects.filter(company=company).aggregate(count=Count('id'), updated=Max('updated_at'))
+    payments = Payment.objects.filter(company=company).aggregate(count=Count('id'), updated=Max('updated_at'))
+    state = f"{invoices['count']}:{invoices['updated']}:{payments['count']}:{payments['updated']}"
+    return hashlib.sha1(state.encode()).hexdigest()[:20]
+
+
+def compute_receivables_aging(company, as_of):
+    """
+    Outstanding invoice balances per customer split into aging buckets by
+    days past due on `as_of`, in one conditional aggregation query.
+    """
+    balance = ExpressionWrapper(F('total') - F('paid_amount'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    buckets = {
+        'current': Q(due_date__gte=as_of),
+        'days_1_30': Q(due_date__lt=as_of, due_date__gte=as_of - timedelta(days=30)),
+        'days_31_60': Q(due_date__lt=as_of - timedelta(days=30), due_date__gte=as_of - timedelta(days=60)),
+        'days_61_90': Q(due_date__lt=as_of - timedelta(days=60), due_date__gte=as_of - timedelta(days=90)),
+        'days_over_90': Q(due_date__lt=as_of - timedelta(days=90)),
+    }
+    rows = Invoice.objects.filter(
+        company=company,
+        status__in=RECEIVABLE_STATUSES,
+        date__lte=as_of,
+    ).annotate(
+        balance=balance,
+    ).filter(
+        balance__gt=0,
+    ).order_by('customer__name').values('customer_id', 'customer__name').annotate(
+        **{bucket: Sum('balance', filter=condition) for bucket, condition in buckets.items()}
+    )
+
+    customers = []
+    totals = {bucket: ZERO for bucket in AGING_BUCKETS}
+    totals['total'] = ZERO
+    for row in rows:
+        data = {
+            'customer': row['customer_id'],
+            'customer_name': row['customer__name'],
+        }
+        data.update({bucket: row[bucket] or ZERO for bucket in AGING_BUCKETS})
+        data['total'] = sum(data[bucket] for bucket in AGING_BUCKETS)
+        for key in totals:
+            totals[key] += data[key]
+        customers.append(data)
+
+    return {
+        'as_of': as_of,
+        'customers': customers,
+        'totals': totals,
+    }
+
+
+def get_receivables_aging(company, as_of, refresh=False):
+    """
+    Aging report served from a cached snapshot, recomputed when invoices or
+    payments of the company have changed since it was built. Invoice
+    updates that bypass save() set updated_at themselves to take part.
+    """
+    key = f'sales:receivables-aging:{company.id}:{_aging_version(company)}:{as_of.isoformat()}'
+    report = None if refresh else cache.get(key)
+    if report is None:
+        report = compute_receivables_aging(company, as_of)
+        cache.set(key, report, AGING_CACHE_TIMEOUT)
+    return report
+
+
+def invoice_status_expression(paid_amount, today):
+    """
+    Status of an invoice once `paid_amount` has been paid: drafts and
+    cancelled invoices keep their status, fully paid ones become paid and
+    the rest are overdue or sent depending on the due date
+    """
+    return Case(
+        When(status__in=('draft', 'cancelled'), then=F('status')),
+        When(Q(total__gt=0) & Q(total__lte=paid_amount), then=Value('paid')),
+        When(due_date__lt=today, then=Value('overdue')),
+        default=Value('sent'),
+        output_field=CharField(),
+    )
+
+
+def apply_payment_amounts(company_id, amounts):
+    """
+    Add payment amounts to invoices, given as {invoice_id: amount} with
+    negative amounts reversing earlier payments. Invoice rows are locked in
+    id order and each is moved with a single UPDATE using F() expressions.
+    """
+    amounts = {invoice_id: amount for invoice_id, amount in amounts.items() if amount}
+    if not amounts:
+        return
+
+    now = timezone.now()
+    today = timezone.localdate(now)
+    with transaction.atomic():
+        list(Invoice.objects.select_for_update().filter(pk__in=amounts).order_by('pk').values_list('pk', flat=True))
+        for invoice_id, amount in sorted(amounts.items()):
+            paid_amount = F('paid_amount') + Value(amount, output_field=DecimalField(max_digits=12, decimal_places=2))
+            Invoice.objects.filter(pk=invoice_id).update(
+                paid_amount=paid_amount,
+                status=invoice_status_expression(paid_amount, today),
+                updated_at=now,
+            )
+
+
+def refresh_invoice_statuses(invoices):
+    """Re-derive the status of invoices from their current paid amount and due date"""
+    now = timezone.now()
+    return invoices.update(status=invoice_status_expression(F('paid_amount'), timezone.localdate(now)), updated_at=now)
+
+
+def reconcile_invoice_payments(company):
+    """
+    Recompute paid amount and status of every invoice of a company from its
+    payments in one UPDATE. Returns the number of invoices whose paid amount
+    was out of sync.
+    """
+    paid = Coalesce(
+        Subquery(
+            Payment.objects.filter(invoice=OuterRef('pk')).order_by().values('invoice').annotate(
+                total=Sum('amount'),
+            ).values('total'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        Value(ZERO, output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    invoices = Invoice.objects.filter(company=company)
+    drifted = invoices.annotate(paid=paid).exclude(paid_amount=F('paid')).count()
+    now = timezone.now()
+    invoices.update(
+        paid_amount=paid,
+        status=invoice_status_expression(paid, timezone.localdate(now)),
+        updated_at=now,
+    )
+    return drifted
+
+
+def set_line_total(line):
+    """Line total = quantity x unit price - line discount, rounded to cents"""
+    amount = line.quantity * line.unit_price - getattr(line, 'discount', ZERO)
+    line.total = amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    return line
+
+
+def recalculate_document_totals(document_model, document_ids, lines='items'):
+    """
+    Recompute subtotal and total of documents (quotations, orders, invoices,
+    purchase orders) from the totals of their lines with a single UPDATE
+    over an aggregate subquery. Header discount is subtracted and tax and
+    shipping are added where the document has them.
+    """
+    document_ids = [document_id for document_id in set(document_ids) if document_id]
+    if not document_ids:
+        return 0
+
+    relation = document_model._meta.get_field(lines)
+    line_model, document_field = relation.related_model, relation.field.name
+    header_fields = {field.name for field in document_model._meta.concrete_fields}
+
+    subtotal = Coalesce(
+        Subquery(
+            line_model.objects.filter(**{document_field: OuterRef('pk')}).order_by().values(document_field).annotate(
+                subtotal=Sum('total'),
+            ).values('subtotal'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        Value(ZERO, output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    total = subtotal
+    if 'discount' in header_fields:
+        total = total - F('discount')
+    for charge in ('tax', 'shipping'):
+        if charge in header_fields:
+            total = total + F(charge)
+
+    documents = document_model.objects.filter(pk__in=document_ids)
+    changes = {'subtotal': subtotal, 'total': total}
+    if 'updated_at' in header_fields:
+        changes['updated_at'] = timezone.now()
+    updated = documents.update(**changes)
+    if document_model is Invoice:
+        refresh_invoice_statuses(documents)
+    return updated
+
+
+def save_document_lines(document, lines_data, lines='items'):
+    """
+    Write the nested lines of a document in bulk: entries with an `id`
+    update that line, entries without one are created and existing lines
+    missing from `lines_data` are deleted
+    """
+    relation = document._meta.get_field(lines)
+    line_model, document_field = relation.related_model, relation.field.name
+    existing = {line.pk: line for line in line_model.objects.filter(**{document_field: document})}
+
+    created, updated, fields = [], [], {'total'}
+    for data in lines_data:
+        data = dict(data)
+        line_id = data.pop('id', None)
+        if line_id is None:
+            line = line_model(**{document_field: document}, **data)
+            created.append(set_line_total(line))
+        else:
+            line = existing.pop(line_id)
+            for attr, value in data.items():
+                setattr(line, attr, value)
+            fields.update(data)
+            updated.append(set_line_total(line))
+
+    if existing:
+        line_model.objects.filter(pk__in=existing).delete()
+    if updated:
+        line_model.objects.bulk_update(updated, sorted(fields))
+    if created:
+        line_model.objects.bulk_create(created)
+
+    prefetched = getattr(document, '_prefetched_objects_cache', None)
+    if prefetched:
+        prefetched.pop(lines, None)
+
+
+def sync_sales_order_reservations(order, previous_status=None, user=None):
+    """
+    Keep an order's stock reservations in line with its status: confirmed
+    and in-progress orders hold their lines (re-reserved after every edit),
+    draft and cancelled orders hold nothing, and delivering an order takes
+    its lines out of stock. Raises InsufficientStockError when the lines
+    cannot be covered.
+    """
+    with transaction.atomic():
+        if order.status == 'delivered' and previous_status == 'delivered':
+            return
+        release_reservations('sales_order', [order.id])
+        if order.status not in RESERVING_STATUSES and order.status != 'delivered':
+            return
+
+        quantities = dict(
+            SalesOrderItem.objects.filter(sales_order=order).order_by()
+            .values('item_id').annotate(total_quantity=Sum('quantity')).values_list('item_id', 'total_quantity')
+        )
+        expires_at = None
+        if order.status in RESERVING_STATUSES:
+            expires_at = timezone.now() + timedelta(days=SALES_ORDER_RESERVATION_DAYS)
+        reserve_stock(order.company, quantities, 'sales_order', order.id, expires_at)
+        if order.status == 'delivered':
+            consume_reservations(
+                order.company, 'sales_order', order.id, order.order_number, timezone.now(), user,
+                f'Sales order {order.order_number} delivered'
+            )
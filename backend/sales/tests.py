@@ -1,3 +1,151 @@
+import datetime
+from decimal import Decimal
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from accounts.models import User
+from companies.models import Company
+from contacts.models import Contact
+from inventory.models import Item
+from .models import Invoice, InvoiceItem, Payment
+from .services import apply_payment_amounts, get_receivables_aging, reconcile_invoice_payments
 
-# Create your tests here.
+
+class ReceivablesAgingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.customer = Contact.objects.create(company=self.company, name='Buyer')
+        self.as_of = datetime.date(2026, 3, 1)
+        self.invoice = Invoice.objects.create(
+            company=self.company, customer=self.customer, status='sent', total=100,
+            date=datetime.date(2026, 1, 1), due_date=datetime.date(2026, 1, 20),
+        )
+
+    def test_report_follows_payments(self):
+        report = get_receivables_aging(self.company, self.as_of)
+        self.assertEqual(report['totals']['days_31_60'], Decimal('100'))
+
+        # A payment written by another worker: nothing is invalidated locally
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_payment_amounts(self.company.id, {self.invoice.id: Decimal('40')})
+        report = get_receivables_aging(self.company, self.as_of)
+        self.assertEqual(report['totals']['days_31_60'], Decimal('60'))
+
+    def test_report_follows_new_and_deleted_invoices(self):
+        get_receivables_aging(self.company, self.as_of)
+        other = Invoice.objects.create(
+            company=self.company, customer=self.customer, status='sent', total=50,
+            date=datetime.date(2026, 2, 20), due_date=datetime.date(2026, 3, 10),
+        )
+        self.assertEqual(get_receivables_aging(self.company, self.as_of)['totals']['total'], Decimal('150'))
+        self.invoice.delete()
+        self.assertEqual(get_receivables_aging(self.company, self.as_of)['totals']['total'], Decimal('50'))
+        other.delete()
+        self.assertEqual(get_receivables_aging(self.company, self.as_of)['totals']['total'], Decimal('0'))
+
+
+class DocumentTotalsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.user.active_company = self.company
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Contact.objects.create(company=self.company, name='Buyer')
+        self.pen = Item.objects.create(company=self.company, name='Pen', sku='PEN')
+        self.pad = Item.objects.create(company=self.company, name='Pad', sku='PAD')
+        owner = User.objects.create_user('other', password='secret')
+        other = Company.objects.create(owner=owner, name='Other')
+        self.secret = Item.objects.create(company=other, name='Secret', sku='SECRET')
+
+    def create_invoice(self, *lines):
+        return self.client.post('/api/sales/invoices/', {
+            'company': self.company.id, 'customer': self.customer.id, 'date': '2026-01-01', 'due_date': '2026-01-20',
+            'discount': '4', 'tax': '2', 'items': list(lines),
+        }, format='json')
+
+    def test_totals_are_computed_from_lines(self):
+        response = self.create_invoice(
+            {'item': self.pen.id, 'quantity': '2', 'unit_price': '10', 'discount': '1', 'total': '999'},
+            {'item': self.pad.id, 'quantity': '1', 'unit_price': '5'},
+        )
+        self.assertEqual(response.status_code, 201)
+        invoice = Invoice.objects.get(pk=response.json()['id'])
+        self.assertEqual((invoice.subtotal, invoice.total), (Decimal('24'), Decimal('22')))
+
+        line = invoice.items.get(item=self.pad)
+        response = self.client.patch(f'/api/sales/invoice-items/{line.id}/', {'quantity': '3'}, format='json')
+        self.assertEqual(response.json()['total'], '15.00')
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total, Decimal('32'))
+
+    def test_status_follows_update(self):
+        invoice_id = self.create_invoice({'item': self.pen.id, 'quantity': '1', 'unit_price': '10'}).json()['id']
+        response = self.client.patch(f'/api/sales/invoices/{invoice_id}/', {'status': 'sent'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'overdue')
+
+    def test_items_of_another_company_are_rejected(self):
+        response = self.create_invoice({'item': self.secret.id, 'quantity': '1', 'unit_price': '10'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Invoice.objects.exists())
+
+        invoice_id = self.create_invoice({'item': self.pen.id, 'quantity': '1', 'unit_price': '10'}).json()['id']
+        response = self.client.post('/api/sales/invoice-items/', {
+            'invoice': invoice_id, 'item': self.secret.id, 'quantity': '1', 'unit_price': '10',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('item', response.json())
+        self.assertEqual(InvoiceItem.objects.count(), 1)
+
+
+class InvoicePaymentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.company = Company.objects.create(owner=self.user, name='Shop')
+        self.user.active_company = self.company
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        customer = Contact.objects.create(company=self.company, name='Buyer')
+        self.invoice = Invoice.objects.create(
+            company=self.company, customer=customer, status='sent', total=100,
+            date=datetime.date(2026, 1, 1), due_date=datetime.date(2099, 1, 1),
+        )
+
+    def pay(self, amount, invoice=None):
+        return self.client.post('/api/sales/payments/', {
+            'company': self.company.id, 'invoice': (invoice or self.invoice).id, 'date': '2026-01-05',
+            'amount': amount, 'payment_method': 'cash',
+        }, format='json')
+
+    def status(self):
+        self.invoice.refresh_from_db()
+        return self.invoice.paid_amount, self.invoice.status
+
+    def test_payments_move_paid_amount_and_status(self):
+        first = self.pay('40').json()
+        self.assertEqual(self.status(), (Decimal('40'), 'sent'))
+        self.assertEqual(self.pay('60').status_code, 201)
+        self.assertEqual(self.status(), (Decimal('100'), 'paid'))
+
+        self.client.patch(f'/api/sales/payments/{first["id"]}/', {'amount': '30'}, format='json')
+        self.assertEqual(self.status(), (Decimal('90'), 'sent'))
+        self.client.delete(f'/api/sales/payments/{first["id"]}/')
+        self.assertEqual(self.status(), (Decimal('60'), 'sent'))
+
+    def test_draft_invoices_and_negative_amounts_are_rejected(self):
+        self.assertEqual(self.pay('-5').status_code, 400)
+        Invoice.objects.filter(pk=self.invoice.pk).update(status='draft')
+        self.assertEqual(self.pay('5').status_code, 400)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_reconcile_repairs_drift(self):
+        self.pay('100')
+        Invoice.objects.filter(pk=self.invoice.pk).update(paid_amount=0, status='sent')
+        self.assertEqual(reconcile_invoice_payments(self.company), 1)
+        self.assertEqual(self.status(), (Decimal('100'), 'paid'))
+        self.assertEqual(reconcile_invoice_payments(self.company), 0)
@@ -7,6 +7,7 @@ from .views import (
     InvoiceListCreateView, InvoiceDetailView,
     InvoiceItemListCreateView, InvoiceItemDetailView,
     PaymentListCreateView, PaymentDetailView,
+    ReceivablesAgingView,
 )
 
 urlpatterns = [
@@ -24,4 +25,5 @@ urlpatterns = [
     path('invoice-items/<int:pk>/', InvoiceItemDetailView.as_view(), name='invoice-item-detail'),
     path('payments/', PaymentListCreateView.as_view(), name='payment-list-create'),
     path('payments/<int:pk>/', PaymentDetailView.as_view(), name='payment-detail'),
+    path('reports/receivables-aging/', ReceivablesAgingView.as_view(), name='receivables-aging'),
 ]
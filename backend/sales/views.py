@@ -1,6 +1,32 @@
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from .models import Quotation, QuotationItem, SalesOrder, SalesOrderItem, Invoice, InvoiceItem, Payment
 from .serializers import QuotationSerializer, QuotationItemSerializer, SalesOrderSerializer, SalesOrderItemSerializer, InvoiceSerializer, InvoiceItemSerializer, PaymentSerializer
+from .services import apply_payment_amounts, get_receivables_aging, recalculate_document_totals, sync_sales_order_reservations
+from inventory.services import InsufficientStockError, release_reservations
+
+
+def sync_reservations(orders, user, previous_statuses=None):
+    """Update the stock reservations of sales orders, reporting shortages as validation errors"""
+    previous_statuses = previous_statuses or {}
+    try:
+        for order in orders:
+            sync_sales_order_reservations(order, previous_statuses.get(order.id, order.status), user)
+    except InsufficientStockError as e:
+        raise serializers.ValidationError({'non_field_errors': [str(e)]})
+
+
+class BulkCreateMixin:
+    """Accept a JSON array on create to write many rows in one request"""
+
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
 
 
 class QuotationListCreateView(generics.ListCreateAPIView):
@@ -10,7 +36,7 @@ class QuotationListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return Quotation.objects.filter(company=user_company)
+            return Quotation.objects.filter(company=user_company).prefetch_related('items')
         return Quotation.objects.none()
 
     def perform_create(self, serializer):
@@ -26,16 +52,16 @@ class QuotationDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return Quotation.objects.filter(company=user_company)
+            return Quotation.objects.filter(company=user_company).prefetch_related('items')
         return Quotation.objects.none()
 
 
-class QuotationItemListCreateView(generics.ListCreateAPIView):
+class QuotationItemListCreateView(BulkCreateMixin, generics.ListCreateAPIView):
     serializer_class = QuotationItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return QuotationItem.objects.all()
+        return QuotationItem.objects.filter(quotation__company=self.request.user.active_company)
 
 
 class QuotationItemDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -43,7 +69,12 @@ class QuotationItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return QuotationItem.objects.all()
+        return QuotationItem.objects.filter(quotation__company=self.request.user.active_company)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        recalculate_document_totals(Quotation, [instance.quotation_id])
 
 
 class SalesOrderListCreateView(generics.ListCreateAPIView):
@@ -53,13 +84,15 @@ class SalesOrderListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return SalesOrder.objects.filter(company=user_company)
+            return SalesOrder.objects.filter(company=user_company).prefetch_related('items')
         return SalesOrder.objects.none()
 
+    @transaction.atomic
     def perform_create(self, serializer):
         user_company = self.request.user.active_company
         if user_company:
-            serializer.save(company=user_company)
+            order = serializer.save(company=user_company)
+            sync_reservations([order], self.request.user, {order.id: None})
 
 
 class SalesOrderDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -69,16 +102,34 @@ class SalesOrderDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return SalesOrder.objects.filter(company=user_company)
+            return SalesOrder.objects.filter(company=user_company).prefetch_related('items')
         return SalesOrder.objects.none()
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        order = serializer.save()
+        sync_reservations([order], self.request.user, {order.id: previous_status})
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        release_reservations('sales_order', [instance.id])
+        instance.delete()
+
 
-class SalesOrderItemListCreateView(generics.ListCreateAPIView):
+class SalesOrderItemListCreateView(BulkCreateMixin, generics.ListCreateAPIView):
     serializer_class = SalesOrderItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return SalesOrderItem.objects.all()
+        return SalesOrderItem.objects.filter(sales_order__company=self.request.user.active_company)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        lines = serializer.save()
+        lines = lines if isinstance(lines, list) else [lines]
+        orders = SalesOrder.objects.filter(pk__in={line.sales_order_id for line in lines})
+        sync_reservations(orders, self.request.user)
 
 
 class SalesOrderItemDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -86,7 +137,18 @@ class SalesOrderItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return SalesOrderItem.objects.all()
+        return SalesOrderItem.objects.filter(sales_order__company=self.request.user.active_company)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        line = serializer.save()
+        sync_reservations(SalesOrder.objects.filter(pk=line.sales_order_id), self.request.user)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        recalculate_document_totals(SalesOrder, [instance.sales_order_id])
+        sync_reservations(SalesOrder.objects.filter(pk=instance.sales_order_id), self.request.user)
 
 
 class InvoiceListCreateView(generics.ListCreateAPIView):
@@ -96,7 +158,7 @@ class InvoiceListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return Invoice.objects.filter(company=user_company)
+            return Invoice.objects.filter(company=user_company).prefetch_related('items')
         return Invoice.objects.none()
 
     def perform_create(self, serializer):
@@ -112,16 +174,16 @@ class InvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         user_company = self.request.user.active_company
         if user_company:
-            return Invoice.objects.filter(company=user_company)
+            return Invoice.objects.filter(company=user_company).prefetch_related('items')
         return Invoice.objects.none()
 
 
-class InvoiceItemListCreateView(generics.ListCreateAPIView):
+class InvoiceItemListCreateView(BulkCreateMixin, generics.ListCreateAPIView):
     serializer_class = InvoiceItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return InvoiceItem.objects.all()
+        return InvoiceItem.objects.filter(invoice__company=self.request.user.active_company)
 
 
 class InvoiceItemDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -129,7 +191,12 @@ class InvoiceItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return InvoiceItem.objects.all()
+        return InvoiceItem.objects.filter(invoice__company=self.request.user.active_company)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        recalculate_document_totals(Invoice, [instance.invoice_id])
 
 
 class PaymentListCreateView(generics.ListCreateAPIView):
@@ -158,4 +225,35 @@ class PaymentDetailView(generics.RetrieveUpdateDestroyAPIView):
             return Payment.objects.filter(company=user_company)
         return Payment.objects.none()
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        apply_payment_amounts(instance.company_id, {instance.invoice_id: -instance.amount})
+        instance.delete()
+
+
+class ReceivablesAgingView(APIView):
+    """
+    Outstanding invoice balances per customer in aging buckets (current,
+    1-30, 31-60, 61-90 and over 90 days past due) on `as_of` (default: today).
+    `refresh=true` bypasses the cached snapshot.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request):
+        user_company = request.user.active_company
+        if not user_company:
+            return Response({"error": "No active company"}, status=400)
+
+        as_of = request.query_params.get('as_of')
+        if as_of:
+            try:
+                as_of = parse_date(as_of)
+            except ValueError:
+                as_of = None
+            if as_of is None:
+                return Response({"error": "Invalid as_of, expected YYYY-MM-DD"}, status=400)
+        else:
+            as_of = timezone.localdate()
+
+        refresh = request.query_params.get('refresh') in ('1', 'true')
+        return Response(get_receivables_aging(user_company, as_of, refresh=refresh))